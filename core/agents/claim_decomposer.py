@@ -3,10 +3,11 @@ import json
 import os
 from pathlib import Path
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from typing import Annotated, TypedDict
-from core.agents.utils.llm_factory import get_chat_model
+from core.agents.utils.llm_factory import get_chat_model, with_llm_cache
 
 DEFAULT_MODEL = "mistral-nemo"  # Default model to use if not specified in .env
 
@@ -32,10 +33,10 @@ LLM_OUTPUT_FORMAT = {
     }
 }
 
-llm = get_chat_model(
+llm = with_llm_cache(get_chat_model(
     model_name=os.getenv("CLAIM_DECOMPOSER_MODEL", DEFAULT_MODEL),
     format_output=LLM_OUTPUT_FORMAT,
-)
+), "claim_decomposer")
 
 
 """
@@ -65,6 +66,14 @@ def assistant(state: State) -> State:
     return {'messages': response}
 
 
+async def aassistant(state: State) -> State:
+    """
+    Async counterpart of assistant, used when the graph is driven with .ainvoke()
+    """
+    response = await llm.ainvoke(state['messages'])
+    return {'messages': response}
+
+
 def postprocessing(state: State) -> State:
     """
     Postprocesses the LLM response to extract the claims
@@ -87,7 +96,7 @@ builder = StateGraph(State)
 
 # Define nodes
 builder.add_node("preprocessing", preprocessing)
-builder.add_node("assistant", assistant)
+builder.add_node("assistant", RunnableLambda(assistant, afunc=aassistant))
 builder.add_node("postprocessing", postprocessing)
 
 # Define edges
@@ -3,14 +3,21 @@ import json
 import os
 from pathlib import Path
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from typing import Annotated, Literal, TypedDict
-from core.agents.utils.llm_factory import get_chat_model
+from core.agents.utils.llm_factory import get_chat_model, with_cascade, with_llm_cache
 from core.agents.utils.common_types import Evidence
+from core.agents.utils.evidence_compression import compress_evidence
 
 DEFAULT_MODEL = "mistral-nemo"  # Default model to use if not specified in .env
 
+# 'inline' formats the evidence into the system prompt. 'prefix' keeps the system prompt
+# byte-identical for every claim and sends the evidence with the claim instead, so the
+# inference server can reuse the cached prompt prefix across claims and requests.
+REASONING_PROMPT_LAYOUT = os.getenv("REASONING_PROMPT_LAYOUT", "inline")
+
 # Absolute path to this dir. For relative paths like prompts
 DIR = Path(__file__).parent.resolve()
 
@@ -25,6 +32,8 @@ class State(TypedDict):
     evidence: list[Evidence]
     label: Literal["true", "false", "unknown"] | None
     justification: str | None
+    # What compression left out of the evidence, see evidence_compression
+    evidence_audit: list[dict]
 
 
 LLM_OUTPUT_FORMAT = {
@@ -41,27 +50,47 @@ LLM_OUTPUT_FORMAT = {
     "required": ["label", "justification"]
 }
 
-llm = get_chat_model(model_name=os.getenv(
-    "REASONING_AGENT_MODEL", DEFAULT_MODEL), format_output=LLM_OUTPUT_FORMAT)
+llm = with_llm_cache(get_chat_model(model_name=os.getenv(
+    "REASONING_AGENT_MODEL", DEFAULT_MODEL), format_output=LLM_OUTPUT_FORMAT), "reasoning_agent")
+# With REASONING_AGENT_SMALL_MODEL set, a small model answers first and hard claims escalate
+llm = with_cascade(llm, "reasoning_agent", os.getenv("REASONING_AGENT_SMALL_MODEL"), LLM_OUTPUT_FORMAT)
 
 with open(DIR / "prompts/reasoning_agent_system_prompt.txt", "r") as f:
     system_prompt = f.read()
 
+# The same prompt, pointing at the evidence in the human message, for the 'prefix' layout
+static_system_prompt = system_prompt.format(evidence="The evidence is listed with the claim, in the next message.")
+
 # Define agent graph nodes
+def compression(state: State) -> State:
+    """
+    Cuts the evidence down to the token budget before it is put in the prompt.
+    """
+    evidence, audit = compress_evidence(state['claim'], state['evidence'])
+    return {'evidence': evidence, 'evidence_audit': audit}
+
+
 def preprocessing(state: State) -> State:
     """
     Formats the system prompt template with the evidence, then supplies the claim
     as a human message. The working assumption is that putting the evidence in the
     system prompt will help make the model trust it more than the claim.
+
+    With REASONING_PROMPT_LAYOUT='prefix' the system prompt is the same for every claim
+    and the evidence goes in the human message, ahead of the claim.
     """
     # Format system prmopt template: unwind the evidence list to a bullet list
     evidence_str = "\n".join(
         [f"* {ev['name']}: {ev['result']}" for ev in state["evidence"]])
-    formatted_prompt = system_prompt.format(evidence=evidence_str)
 
     # Set system and human messages in the state
-    sys_message = SystemMessage(content=formatted_prompt)
-    claim_message = HumanMessage(content='Claim: ' + state['claim'])
+    if REASONING_PROMPT_LAYOUT == "prefix":
+        sys_message = SystemMessage(content=static_system_prompt)
+        claim_message = HumanMessage(content=f"## EVIDENCE:\n{evidence_str}\n\nClaim: {state['claim']}")
+    else:
+        formatted_prompt = system_prompt.format(evidence=evidence_str)
+        sys_message = SystemMessage(content=formatted_prompt)
+        claim_message = HumanMessage(content='Claim: ' + state['claim'])
 
     return {'messages': [sys_message, claim_message]}
 
@@ -72,6 +101,11 @@ def assistant(state: State) -> State:
     return {"messages": response}
 
 
+async def aassistant(state: State) -> State:
+    response = await llm.ainvoke(state['messages'])
+    return {"messages": response}
+
+
 def postprocessing(state: State) -> State:
     # TODO: reimplement in Pydantic/Langchain
     reasoning = state['messages'][-1].content
@@ -90,11 +124,13 @@ def postprocessing(state: State) -> State:
 
 # Build the graph
 builder = StateGraph(State)
+builder.add_node("compression", compression)
 builder.add_node("preprocessing", preprocessing)
-builder.add_node("assistant", assistant)
+builder.add_node("assistant", RunnableLambda(assistant, afunc=aassistant))
 builder.add_node("postprocessing", postprocessing)
 
-builder.add_edge(START, "preprocessing")
+builder.add_edge(START, "compression")
+builder.add_edge("compression", "preprocessing")
 builder.add_edge("preprocessing", "assistant")
 
 builder.add_edge("assistant", "postprocessing")
@@ -5,18 +5,28 @@ from project root
 """
 
 from dotenv import load_dotenv
+from collections import OrderedDict
+import hashlib
+import asyncio
 import importlib
+import json
 import os
+import threading
+import time
 from pathlib import Path
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from typing import Annotated, TypedDict, Callable
+from langgraph.prebuilt import tools_condition
+from typing import Annotated, Literal, Optional, TypedDict, Callable
 from core.agents.tools.tool_registry import create_tool
-from core.agents.utils.llm_factory import get_chat_model
+from core.agents.utils.llm_factory import get_chat_model, with_llm_cache
 from core.agents.utils.common_types import Evidence
+from core.agents.utils.retrieval_plan import needs_tool_routing, retrieval_calls
+from core.agents.utils.tool_memo import tool_call_key
+from core.agents.utils.tool_node import ConcurrentToolNode
 
 DEFAULT_MODEL = "mistral-nemo"  # Default model to use if not specified in .env
 
@@ -29,6 +39,19 @@ load_dotenv(DIR.parent / '.env', override=True)
 # Import prefix for builtin tools
 MODULE_PREFIX = "core.agents.tools.builtins."
 
+# Maximum number of compiled agents kept by get_agent
+AGENT_CACHE_SIZE = int(os.getenv("RESEARCH_AGENT_CACHE_SIZE", "128"))
+
+# 'agent': the LLM picks the tool calls for every claim. 'retrieval': claims are researched
+# with a fixed retrieval plan, and only go to the LLM if they need math or user tools
+RESEARCH_MODE = os.getenv("RESEARCH_MODE", "agent")
+
+# Most rounds of tool calls per claim
+RESEARCH_MAX_TOOL_ROUNDS = int(os.getenv("RESEARCH_MAX_TOOL_ROUNDS", "5"))
+# Seconds of research per claim; checked after each round of tool calls, and bounding each
+# async model call
+RESEARCH_TIME_BUDGET = float(os.getenv("RESEARCH_TIME_BUDGET", "90"))
+
 def import_builtin(module_name):
     """Dynamically imports a function from a module.
 
@@ -88,6 +111,16 @@ class State(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
     claim: str
     evidence: list[Evidence]
+    # time.monotonic() when research started
+    started_at: float
+    tool_rounds: int
+    # Tool calls answered with the result of an identical earlier call
+    replayed_calls: int
+    # Why research stopped: 'complete' (the model was done), 'max_rounds', 'time_budget'
+    # or 'repeated_calls' (a whole round repeated earlier calls)
+    termination_reason: Optional[str]
+    # 'agent' if the LLM chose the tool calls, 'retrieval' if a retrieval plan did
+    research_mode: str
 
 with open(DIR / 'prompts/research_agent_system_prompt.txt', 'r') as f:
     sys_msg = SystemMessage(content=f.read())
@@ -99,17 +132,154 @@ def preprocessing(state: State):
     following the SystemMessage
     """
     state['messages'] = [sys_msg, HumanMessage(content=state['claim'])]
+    state['started_at'] = time.monotonic()
+    state['tool_rounds'] = 0
+    state['replayed_calls'] = 0
+    state['termination_reason'] = None
+    state['research_mode'] = "agent"
     return state
 
-def get_assistant_node(llm: BaseChatModel) -> Callable:
+def get_assistant_node(llm: BaseChatModel, time_budget: float = None) -> RunnableLambda:
     """
-    Given reference to LLM, returns an assistant node using that LLM
+    Given reference to LLM, returns an assistant node using that LLM.
+    The node has a sync and an async implementation, so the graph can be driven
+    with either .invoke() or .ainvoke() without blocking the event loop.
+
+    The async node gives the model only what is left of time_budget. If it doesn't answer
+    in time, the call is cancelled and research ends with termination_reason 'time_budget'
+    on the evidence gathered so far. A sync call can't be cancelled, so the sync path
+    relies on the check after each round of tool calls.
     """
+    time_budget = time_budget or RESEARCH_TIME_BUDGET
+
     def assistant(state: State) -> State:
         response = llm.invoke(state['messages'])
         return {"messages": response}
-    
-    return assistant
+
+    async def aassistant(state: State) -> State:
+        remaining = time_budget - (time.monotonic() - state.get('started_at', time.monotonic()))
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            response = await asyncio.wait_for(llm.ainvoke(state['messages']), remaining)
+        except asyncio.TimeoutError:
+            # No new message, so the graph goes on to postprocessing
+            print(f"Research on claim '{state['claim'][:60]}' ran out of its {time_budget}s budget")
+            return {"termination_reason": "time_budget"}
+        return {"messages": response}
+
+    return RunnableLambda(assistant, afunc=aassistant, name="assistant")
+
+
+def get_tools_node(tool_node: ConcurrentToolNode, max_rounds: int = None,
+                   time_budget: float = None) -> RunnableLambda:
+    """
+    Given the tools, returns the node running a round of tool calls.
+
+    A call identical to one made earlier for this claim isn't run again: the earlier
+    ToolMessage is replayed (marked with additional_kwargs['replayed']). After each round
+    the node checks the research limits, and sets termination_reason once one is reached:
+        - max_rounds rounds of tool calls were made
+        - more than time_budget seconds have passed
+        - every call of the round was a repeat, so the model is going in circles
+    """
+    max_rounds = max_rounds or RESEARCH_MAX_TOOL_ROUNDS
+    time_budget = time_budget or RESEARCH_TIME_BUDGET
+
+    def plan(state: State) -> tuple[list, list, dict]:
+        """
+        Returns the round's calls, those to run, and replayed answers by call id.
+        """
+        earlier: dict[str, ToolMessage] = {}
+        calls_by_id = {}
+        for message in state['messages'][:-1]:
+            if isinstance(message, AIMessage):
+                for call in message.tool_calls:
+                    calls_by_id[call['id']] = call
+            elif isinstance(message, ToolMessage) and message.status != "error" \
+                    and message.tool_call_id in calls_by_id:
+                earlier.setdefault(tool_call_key(calls_by_id[message.tool_call_id]), message)
+
+        calls = state['messages'][-1].tool_calls
+        to_run, replayed = [], {}
+        for call in calls:
+            previous = earlier.get(tool_call_key(call))
+            if previous is None:
+                to_run.append(call)
+            else:
+                replayed[call['id']] = previous.model_copy(update={
+                    # A new message, not an update of the earlier one
+                    "id": None,
+                    "tool_call_id": call['id'],
+                    "additional_kwargs": {**previous.additional_kwargs, "replayed": True},
+                })
+        return calls, to_run, replayed
+
+    def update(state: State, calls: list, results: list, replayed: dict) -> State:
+        answers = {message.tool_call_id: message for message in results}
+        answers.update(replayed)
+        tool_rounds = state.get('tool_rounds', 0) + 1
+        termination_reason = None
+        if replayed and len(replayed) == len(calls):
+            termination_reason = "repeated_calls"
+        elif tool_rounds >= max_rounds:
+            termination_reason = "max_rounds"
+        elif time.monotonic() - state.get('started_at', time.monotonic()) > time_budget:
+            termination_reason = "time_budget"
+        return {
+            # In the order the model asked for them
+            "messages": [answers[call['id']] for call in calls if call['id'] in answers],
+            "tool_rounds": tool_rounds,
+            "replayed_calls": state.get('replayed_calls', 0) + len(replayed),
+            "termination_reason": termination_reason,
+        }
+
+    def tools(state: State, config: RunnableConfig) -> State:
+        calls, to_run, replayed = plan(state)
+        results = tool_node.invoke(to_run, config)["messages"] if to_run else []
+        return update(state, calls, results, replayed)
+
+    async def atools(state: State, config: RunnableConfig) -> State:
+        calls, to_run, replayed = plan(state)
+        results = (await tool_node.ainvoke(to_run, config))["messages"] if to_run else []
+        return update(state, calls, results, replayed)
+
+    return RunnableLambda(tools, afunc=atools, name="tools")
+
+
+def get_retrieval_node(tool_names: set[str]) -> Callable:
+    """
+    Given the names of the tools, returns the node issuing the claim's planned tool calls,
+    as an AIMessage the tools node answers like one from the assistant.
+    """
+    def retrieval(state: State) -> State:
+        calls = retrieval_calls(state['claim'], tool_names)
+        return {"messages": AIMessage(content="", tool_calls=calls), "research_mode": "retrieval"}
+
+    return retrieval
+
+
+def get_research_router(tool_names: set[str], has_user_tools: bool) -> Callable:
+    """
+    Returns the routing function sending a claim to the retrieval plan, or to the assistant
+    when the plan can't serve it.
+    """
+    def route_research(state: State) -> Literal['retrieval', 'assistant']:
+        if needs_tool_routing(state['claim'], tool_names, has_user_tools):
+            return 'assistant'
+        return 'retrieval'
+
+    return route_research
+
+
+def route_tools(state: State) -> Literal['assistant', 'postprocessing']:
+    """
+    Goes back to the assistant unless a research limit was reached, or the calls came from
+    a retrieval plan (which is complete in one round).
+    """
+    if state.get('termination_reason') or state.get('research_mode') == 'retrieval':
+        return 'postprocessing'
+    return 'assistant'
 
 
 def postprocessing(state: State) -> State:
@@ -128,18 +298,21 @@ def postprocessing(state: State) -> State:
                 for j in range(i + 1, len(state['messages'])):
                     next_message = state['messages'][j]
                     if isinstance(next_message, ToolMessage) and next_message.tool_call_id == tool_call['id']:
-                        # Found the corresponding ToolMessage
+                        # Found the corresponding ToolMessage; a replayed one repeats evidence we have
+                        if next_message.additional_kwargs.get('replayed'):
+                            break
                         evidence_item = Evidence(
                             name=tool_call['name'], args=tool_call['args'], result=next_message.content)
                         evidence.append(evidence_item)
                         break
 
-    return {'evidence': evidence}
+    return {'evidence': evidence, 'termination_reason': state.get('termination_reason') or "complete"}
 
 def create_agent(
         model: str,
         builtin_tools: list[str] = None,
-        user_tool_kwargs: list[dict] = None) -> StateGraph:
+        user_tool_kwargs: list[dict] = None,
+        mode: str = None) -> StateGraph:
     """
     Build the research agent graph.
     Args:
@@ -151,6 +324,7 @@ def create_agent(
             (core.agents.tools.builtins.wikipedia)
         user_tool_kwargs (list[dict]): A list of user-defined tools to use.
             each dict should be kwargs needed for tool_registry.create_tool
+        mode (str): 'agent' or 'retrieval'. Defaults to RESEARCH_MODE
     Returns:
         StateGraph: The compiled state graph for the research agent.
     """
@@ -165,30 +339,135 @@ def create_agent(
     # Instantiate LLM-based objects for the agent (ChatModel, assistant node)
     if not model:
         model = os.getenv("RESEARCH_AGENT_MODEL", DEFAULT_MODEL)
-    llm = get_chat_model(model_name=model).bind_tools(tools)
+    llm = with_llm_cache(get_chat_model(model_name=model), "research_agent").bind_tools(tools)
     assistant = get_assistant_node(llm)
 
     # Build graph
     builder = StateGraph(State)
     builder.add_node("preprocessing", preprocessing)
     builder.add_node("assistant", assistant)
-    builder.add_node("tools", ToolNode(tools))
+    # Runs all tool calls of a step at once, each with a timeout, replaying repeated ones
+    builder.add_node("tools", get_tools_node(ConcurrentToolNode(tools)))
     builder.add_node("postprocessing", postprocessing)
 
     builder.add_edge(START, "preprocessing")
-    builder.add_edge("preprocessing", "assistant")
+    if (mode or RESEARCH_MODE) == "retrieval":
+        tool_names = {tool.name for tool in tools}
+        builder.add_node("retrieval", get_retrieval_node(tool_names))
+        builder.add_conditional_edges(
+            source="preprocessing",
+            path=get_research_router(tool_names, bool(user_defined_tools)),
+            path_map={'retrieval': 'retrieval', 'assistant': 'assistant'}
+        )
+        builder.add_edge("retrieval", "tools")
+    else:
+        builder.add_edge("preprocessing", "assistant")
     builder.add_conditional_edges(
         source="assistant",
         path=tools_condition,
         path_map={'tools': 'tools', '__end__': 'postprocessing'}
     )
-    builder.add_edge("tools", "assistant")
+    builder.add_conditional_edges(
+        source="tools",
+        path=route_tools,
+        path_map={'assistant': 'assistant', 'postprocessing': 'postprocessing'}
+    )
     builder.add_edge("postprocessing", END)
 
     agent = builder.compile()
     return agent
 
 
+"""
+Compiled agent cache
+"""
+# key -> (agent, user_id), least recently used first
+_agent_cache: OrderedDict = OrderedDict()
+_agent_cache_lock = threading.Lock()
+_agent_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def tool_fingerprint(tool_kwargs: dict) -> str:
+    """
+    Hashes a user-defined tool definition (one row of user_info_usertool as passed to create_tool).
+    Any edit to the row produces a new fingerprint, so stale agents are never served.
+    """
+    serialized = json.dumps(tool_kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def agent_cache_key(model: str, builtin_tools: list[str] = None, user_tool_kwargs: list[dict] = None) -> tuple:
+    """
+    Cache key for a compiled agent: (model, sorted builtin names, sorted user tool fingerprints)
+    """
+    return (
+        model,
+        tuple(sorted(builtin_tools or [])),
+        tuple(sorted(tool_fingerprint(kwargs) for kwargs in user_tool_kwargs or [])),
+    )
+
+
+def get_agent(
+        model: str,
+        builtin_tools: list[str] = None,
+        user_tool_kwargs: list[dict] = None,
+        user_id: int = None) -> StateGraph:
+    """
+    Returns a compiled research agent, reusing a previously built one when the model and
+    tool set are unchanged. Agents are kept in a bounded LRU cache (AGENT_CACHE_SIZE).
+    Takes the same arguments as create_agent, plus:
+        user_id (int): Owner of the user-defined tools, so their agents can be dropped
+            with invalidate_agent_cache(user_id) when one of their tools changes.
+    """
+    if not model:
+        model = os.getenv("RESEARCH_AGENT_MODEL", DEFAULT_MODEL)
+    key = agent_cache_key(model, builtin_tools, user_tool_kwargs)
+
+    with _agent_cache_lock:
+        if key in _agent_cache:
+            _agent_cache.move_to_end(key)
+            _agent_cache_stats["hits"] += 1
+            return _agent_cache[key][0]
+        _agent_cache_stats["misses"] += 1
+
+    agent = create_agent(model=model, builtin_tools=builtin_tools or [], user_tool_kwargs=user_tool_kwargs)
+
+    with _agent_cache_lock:
+        _agent_cache[key] = (agent, user_id if user_tool_kwargs else None)
+        _agent_cache.move_to_end(key)
+        while len(_agent_cache) > AGENT_CACHE_SIZE:
+            _agent_cache.popitem(last=False)
+            _agent_cache_stats["evictions"] += 1
+    return agent
+
+
+def invalidate_agent_cache(user_id: int = None) -> int:
+    """
+    Drops cached agents built with a user's tools, or every cached agent if user_id is None.
+    Call this whenever a UserTool is created, changed or deleted.
+
+    Returns:
+        int: The number of agents removed
+    """
+    with _agent_cache_lock:
+        if user_id is None:
+            keys = list(_agent_cache)
+        else:
+            keys = [key for key, (_, owner) in _agent_cache.items() if owner == user_id]
+        for key in keys:
+            del _agent_cache[key]
+        _agent_cache_stats["invalidations"] += len(keys)
+    return len(keys)
+
+
+def agent_cache_info() -> dict:
+    """
+    Returns hit/miss/eviction counters and the current size of the compiled agent cache.
+    """
+    with _agent_cache_lock:
+        return {**_agent_cache_stats, "size": len(_agent_cache), "max_size": AGENT_CACHE_SIZE}
+
+
 def main():
     builtin_tools_wanted = ['wikipedia', 'web_search']
 
@@ -34,5 +34,13 @@ def tool_function(expression: str) -> str:
         return "Invalid expression!"
 
 
+async def atool_function(expression: str) -> str:
+    # Pure computation that returns right away, so there's nothing to await
+    return tool_function.func(expression)
+
+
+tool_function.coroutine = atool_function
+
+
 if __name__ == "__main__":
     print(tool_function("37593 * 67"))
@@ -1,7 +1,33 @@
 from langchain_core.tools import tool
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient, TavilyClient
 from typing import Literal
 import os
+from core.agents.tools.tool_cache import cache_tool_results
+
+SEARCH_OPTIONS = {
+    "max_results": 3,
+    "chunks_per_source": 4,
+    "include_images": False,
+    "exclude_domains": ["wikipedia.org"],
+
+    # Other optional parameters:
+    # include_answer=False, # Can ONLY be set during instantiation
+    # include_raw_content=False, # Can ONLY be set during instantiation
+    # include_image_descriptions=False,
+    # search_depth="basic", # alt: "advanced". Costs 2x more but returns more of the web pages
+    # time_range="day",
+    # include_domains=None,
+}
+
+
+# Seconds results are cached, by topic; news and markets move fast
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "21600"))
+WEB_SEARCH_NEWS_CACHE_TTL = float(os.getenv("WEB_SEARCH_NEWS_CACHE_TTL", "900"))
+
+
+def format_results(response: dict) -> list[dict]:
+    # Filter out metadata, format results for Evidence.results
+    return [{'content': res['content'], 'source': res['url']} for res in response['results']]
 
 
 @tool("web_search", parse_docstring=True)
@@ -32,27 +58,39 @@ def tool_function(query: str, topic: Literal["general", "news", "finance"]) -> l
     client = TavilyClient(api_key=api_key)
 
     try:
-        response = client.search(query,
-                                 topic=topic,
-                                 max_results=3,
-                                 chunks_per_source=4,
-                                 include_images=False,
-                                 exclude_domains=["wikipedia.org"]
-
-                                 # Other optional parameters:
-                                 # include_answer=False, # Can ONLY be set during instantiation
-                                 # include_raw_content=False, # Can ONLY be set during instantiation
-                                 # include_image_descriptions=False,
-                                 # search_depth="basic", # alt: "advanced". Costs 2x more but returns more of the web pages
-                                 # time_range="day",
-                                 # include_domains=None,
-                                 )
+        response = client.search(query, topic=topic, **SEARCH_OPTIONS)
     except Exception as e:
         print(f"Error during Tavily search: {e}")
         return []
 
-    # Filter out metadata, format results for Evidence.results
-    return [{'content': res['content'], 'source': res['url']} for res in response['results']]
+    return format_results(response)
+
+
+async def atool_function(query: str, topic: Literal["general", "news", "finance"]) -> list[dict]:
+    api_key = os.getenv("TAVILY_API_KEY")
+    assert api_key, "TAVILY_API_KEY must be set in the environment variables"
+    client = AsyncTavilyClient(api_key=api_key)
+
+    try:
+        response = await client.search(query, topic=topic, **SEARCH_OPTIONS)
+    except Exception as e:
+        print(f"Error during Tavily search: {e}")
+        return []
+
+    return format_results(response)
+
+
+def cache_ttl(args: dict, result: list[dict]) -> float | None:
+    if not result:
+        # Failed searches also come back empty, so don't keep them
+        return None
+    if args.get("topic") in ("news", "finance"):
+        return WEB_SEARCH_NEWS_CACHE_TTL
+    return WEB_SEARCH_CACHE_TTL
+
+
+tool_function.coroutine = atool_function
+cache_tool_results(tool_function, cache_ttl)
 
 
 if __name__ == "__main__":
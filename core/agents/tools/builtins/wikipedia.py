@@ -1,8 +1,118 @@
 # Queries Wikipedia
+import asyncio
+import os
+import re
 from langchain_core.tools import tool
 import wikipedia
 # from typeguard import check_type
 from core.agents.tools.builtins import tool_registry_globals
+from core.agents.tools.tool_cache import TOOL_CACHE_NEGATIVE_TTL, cache_tool_results
+from core.agents.utils.bm25 import rank
+
+# 'full' returns the whole page, 'passages' the parts of it most relevant to the query
+WIKIPEDIA_MODE = os.getenv("WIKIPEDIA_MODE", "full")
+WIKIPEDIA_TOP_K = int(os.getenv("WIKIPEDIA_TOP_K", "5"))
+# Most characters of page text returned in passage mode
+WIKIPEDIA_CHAR_BUDGET = int(os.getenv("WIKIPEDIA_CHAR_BUDGET", "4000"))
+# Paragraphs longer than this are split at sentence boundaries
+WIKIPEDIA_PASSAGE_CHARS = int(os.getenv("WIKIPEDIA_PASSAGE_CHARS", "1000"))
+# Seconds a page is cached; articles rarely change in ways that matter to a claim
+WIKIPEDIA_CACHE_TTL = float(os.getenv("WIKIPEDIA_CACHE_TTL", "604800"))
+
+# Sections made of links and citations rather than prose
+SKIPPED_SECTIONS = {"See also", "References", "External links", "Further reading",
+                    "Notes", "Bibliography", "Sources", "Citations", "Footnotes"}
+
+# Section headings in page.content look like "== History ==" or "=== Early life ==="
+_HEADING = re.compile(r"^(=+)\s*(.*?)\s*\1\s*$", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_paragraph(paragraph: str, max_chars: int) -> list[str]:
+    """
+    Splits a paragraph into chunks of whole sentences of at most max_chars each
+    (a single longer sentence becomes its own chunk).
+    """
+    if len(paragraph) <= max_chars:
+        return [paragraph]
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_passages(title: str, content: str) -> list[tuple[str, str]]:
+    """
+    Splits page content into (section, passage) pairs, in page order. The section is the
+    heading path, e.g. 'Career > Music', or the page title for the introduction.
+    """
+    passages = []
+    headings: list[str] = []
+    section = title
+    position = 0
+    for match in [*_HEADING.finditer(content), None]:
+        text = content[position:match.start() if match else len(content)]
+        if not any(heading in SKIPPED_SECTIONS for heading in headings):
+            for paragraph in text.split("\n"):
+                paragraph = paragraph.strip()
+                if paragraph:
+                    passages += [(section, chunk) for chunk in chunk_paragraph(paragraph, WIKIPEDIA_PASSAGE_CHARS)]
+        if match:
+            level = len(match.group(1)) - 1
+            headings = headings[:max(level - 1, 0)] + [match.group(2)]
+            section = " > ".join(headings)
+            position = match.end()
+    return passages
+
+
+def select_passages(query: str, title: str, content: str,
+                    top_k: int = WIKIPEDIA_TOP_K, char_budget: int = WIKIPEDIA_CHAR_BUDGET) -> str:
+    """
+    Returns the passages of a page most relevant to the query, ranked with BM25, with
+    their section titles. The opening passage is always included since it summarizes the
+    page; at most top_k passages are returned, within char_budget characters.
+
+    Args:
+        query: The search term the page was found with
+        title: Page title
+        content: Plain text page content, as in WikipediaPage.content
+        top_k: Most passages to return
+        char_budget: Most characters of passage text to return
+    """
+    passages = split_passages(title, content)
+    if not passages:
+        return content[:char_budget]
+
+    ranking = rank(query, [f"{section} {text}" for section, text in passages])
+    # The lead first, then the best matches; passages that don't match at all only fill
+    # up the budget in page order
+    order = [0] + [index for index, score in ranking if score > 0 and index != 0]
+    order += [index for index in range(1, len(passages)) if index not in order]
+
+    chosen, used = [], 0
+    for index in order:
+        if len(chosen) == top_k:
+            break
+        size = len(passages[index][1])
+        if used + size <= char_budget or not chosen:
+            chosen.append(index)
+            used += size
+
+    # Back in page order, so the excerpt reads like the article
+    excerpt, last_section = [], None
+    for index in sorted(chosen):
+        section, text = passages[index]
+        if section != last_section:
+            excerpt.append(f"[{section}]")
+            last_section = section
+        excerpt.append(text[:char_budget])
+    return "\n".join(excerpt)
 
 
 @tool("wikipedia", parse_docstring=True)
@@ -48,7 +158,35 @@ def tool_function(query_str: str) -> str:
         )
     except wikipedia.exceptions.WikipediaException:
         return f"Could not fetch page title {title} from Wikipedia!"
-    return page.content
+    if WIKIPEDIA_MODE == "full":
+        return page.content
+    return select_passages(query_str, page.title, page.content)
+
+
+# The uncached search, for atool_function
+_search = tool_function.func
+
+
+async def atool_function(query_str: str) -> str:
+    # The wikipedia client only does blocking requests, so keep it off the event loop
+    return await asyncio.to_thread(_search, query_str)
+
+
+def cache_ttl(args: dict, result: str) -> float | None:
+    if result.startswith("No page found"):
+        return TOOL_CACHE_NEGATIVE_TTL
+    if result.startswith("Could not"):
+        # Wikipedia errors are usually transient
+        return None
+    return WIKIPEDIA_CACHE_TTL
+
+
+def cache_variant() -> str:
+    return f"{WIKIPEDIA_MODE}:{WIKIPEDIA_TOP_K}:{WIKIPEDIA_CHAR_BUDGET}:{WIKIPEDIA_PASSAGE_CHARS}"
+
+
+tool_function.coroutine = atool_function
+cache_tool_results(tool_function, cache_ttl, cache_variant)
 
 
 if __name__ == "__main__":
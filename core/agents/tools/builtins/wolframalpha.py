@@ -1,8 +1,12 @@
+import asyncio
 import os
 import wolframalpha
 from langchain_core.tools import tool
+from core.agents.tools.tool_cache import TOOL_CACHE_NEGATIVE_TTL, cache_tool_results
 
 WOLFRAM_APP_ID_NAME = "WOLFRAM_APP_ID"
+# Seconds an answer is cached; some are time-sensitive ("population of France")
+WOLFRAM_CACHE_TTL = float(os.getenv("WOLFRAM_CACHE_TTL", "86400"))
 
 
 @tool("wolframalpha", parse_docstring=True)
@@ -45,6 +49,36 @@ def tool_function(query_input: str) -> str:
         return f"No results on Wolfram Alpha for {query_input}!"
 
 
+async def atool_function(query_input: str) -> str:
+    if WOLFRAM_APP_ID_NAME not in os.environ:
+        return "Wolfram Alpha API key not set up!"
+    client = wolframalpha.Client(os.environ[WOLFRAM_APP_ID_NAME])
+    try:
+        # Recent client versions query over async HTTP; older ones only block
+        if hasattr(client, "aquery"):
+            result = await client.aquery(query_input)
+        else:
+            result = await asyncio.to_thread(client.query, query_input)
+    except Exception:
+        return "Unable to query Wolfram Alpha!"
+    try:
+        return str(next(result.results).text)
+    except StopIteration:
+        return f"No results on Wolfram Alpha for {query_input}!"
+
+
+def cache_ttl(args: dict, result: str) -> float | None:
+    if result.startswith("No results on Wolfram Alpha"):
+        return TOOL_CACHE_NEGATIVE_TTL
+    if result in ("Unable to query Wolfram Alpha!", "Wolfram Alpha API key not set up!"):
+        return None
+    return WOLFRAM_CACHE_TTL
+
+
+tool_function.coroutine = atool_function
+cache_tool_results(tool_function, cache_ttl)
+
+
 if __name__ == "__main__":
     a = tool_function("erbwdsfmvoms")
     print(a)
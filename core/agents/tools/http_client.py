@@ -0,0 +1,272 @@
+"""
+Shared HTTP client for user-defined tools.
+
+All tools built by tool_registry.create_tool send their requests through shared keep-alive
+connection pools, instead of opening a new connection per call: one client per event loop
+for async calls (request), and one thread-safe client for sync calls (request_sync). Both:
+
+    - speak HTTP/2 when `h2` is installed (httpx[http2], as in core/requirements.txt),
+      HTTP/1.1 otherwise;
+    - allow at most TOOL_HTTP_MAX_PER_HOST requests in flight per host, so a popular
+      user endpoint can't take every connection;
+    - enforce connect/read timeouts, so a slow endpoint can't hang a research step;
+    - stop reading responses larger than TOOL_HTTP_MAX_RESPONSE_BYTES;
+    - count requests and new vs. reused connections per host (see http_client_stats).
+"""
+import asyncio
+import os
+import threading
+import weakref
+from json import loads
+from typing import Any
+from urllib.parse import urlsplit
+import httpx
+
+try:
+    import h2  # noqa: F401 - only needed so httpx can negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+TOOL_HTTP_MAX_CONNECTIONS = int(os.getenv("TOOL_HTTP_MAX_CONNECTIONS", "100"))
+TOOL_HTTP_MAX_KEEPALIVE = int(os.getenv("TOOL_HTTP_MAX_KEEPALIVE", "20"))
+TOOL_HTTP_MAX_PER_HOST = int(os.getenv("TOOL_HTTP_MAX_PER_HOST", "8"))
+TOOL_HTTP_CONNECT_TIMEOUT = float(os.getenv("TOOL_HTTP_CONNECT_TIMEOUT", "5"))
+TOOL_HTTP_READ_TIMEOUT = float(os.getenv("TOOL_HTTP_READ_TIMEOUT", "20"))
+TOOL_HTTP_MAX_RESPONSE_BYTES = int(os.getenv("TOOL_HTTP_MAX_RESPONSE_BYTES", str(2 * 1024 * 1024)))
+TOOL_HTTP2 = HTTP2_AVAILABLE and os.getenv("TOOL_HTTP2", "true").lower() == "true"
+
+
+class ResponseTooLarge(ValueError):
+    pass
+
+
+class ToolResponse:
+    """
+    A fully read response, exposing the parts of requests.Response that tools use.
+    """
+
+    def __init__(self, status_code: int, headers: httpx.Headers, content: bytes, encoding: str, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return loads(self.content)
+
+    def __repr__(self) -> str:
+        return f"<Response [{self.status_code}]>"
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytes_received = 0
+
+    def as_dict(self) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "bytes_received": self.bytes_received,
+        }
+
+
+# httpx's async pool belongs to the event loop that opened its connections, so there's one
+# client per running loop (in the API that's a single client)
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_host_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+_host_stats: dict[str, HostStats] = {}
+# The sync client and its per-host limits are shared by every thread
+_sync_client: httpx.Client = None
+_sync_host_limits: dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+def client_settings() -> dict:
+    """
+    Settings shared by the sync and async clients.
+    """
+    return {
+        "http2": TOOL_HTTP2,
+        "limits": httpx.Limits(
+            max_connections=TOOL_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=TOOL_HTTP_MAX_KEEPALIVE,
+        ),
+        "timeout": httpx.Timeout(TOOL_HTTP_READ_TIMEOUT, connect=TOOL_HTTP_CONNECT_TIMEOUT),
+        "follow_redirects": True,
+    }
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**client_settings())
+            _clients[loop] = client
+        return client
+
+
+def get_client() -> httpx.Client:
+    """
+    Returns the shared sync client, creating it on first use.
+    """
+    global _sync_client
+    with _lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(**client_settings())
+        return _sync_client
+
+
+def host_state(host: str) -> tuple[asyncio.Semaphore, HostStats]:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        limits = _host_limits.setdefault(loop, {})
+        if host not in limits:
+            limits[host] = asyncio.Semaphore(TOOL_HTTP_MAX_PER_HOST)
+        stats = _host_stats.setdefault(host, HostStats())
+        return limits[host], stats
+
+
+def sync_host_state(host: str) -> tuple[threading.BoundedSemaphore, HostStats]:
+    with _lock:
+        if host not in _sync_host_limits:
+            _sync_host_limits[host] = threading.BoundedSemaphore(TOOL_HTTP_MAX_PER_HOST)
+        stats = _host_stats.setdefault(host, HostStats())
+        return _sync_host_limits[host], stats
+
+
+def request_kwargs(kwargs: dict) -> dict:
+    # httpx would send empty dicts as an empty form/JSON body, requests leaves them out
+    return {**kwargs, "data": kwargs.get("data") or None, "json": kwargs.get("json") or None}
+
+
+def check_declared_size(response: httpx.Response, host: str, max_bytes: int):
+    declared = int(response.headers.get("content-length") or 0)
+    if declared > max_bytes:
+        raise ResponseTooLarge(f"Response from {host} is {declared} bytes, over the {max_bytes} limit.")
+
+
+def add_chunk(body: bytearray, chunk: bytes, host: str, max_bytes: int):
+    body.extend(chunk)
+    if len(body) > max_bytes:
+        raise ResponseTooLarge(f"Response from {host} is over the {max_bytes} byte limit.")
+
+
+async def request(method: str, url: str, max_bytes: int = None, **kwargs) -> ToolResponse:
+    """
+    Sends a request through the shared pool and reads the whole response.
+
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        max_bytes: Largest response body accepted. Defaults to TOOL_HTTP_MAX_RESPONSE_BYTES
+        **kwargs: Passed to httpx (headers, params, data, json...)
+
+    Raises:
+        ResponseTooLarge: If the body is larger than max_bytes
+        httpx.HTTPError: On connection errors and timeouts
+    """
+    max_bytes = max_bytes or TOOL_HTTP_MAX_RESPONSE_BYTES
+    host = urlsplit(url).netloc
+    limit, stats = host_state(host)
+
+    async def trace(event: str, info: dict):
+        # Fired only when the pool has to open a connection instead of reusing one
+        if event == "connection.connect_tcp.complete":
+            stats.new_connections += 1
+
+    async with limit:
+        stats.requests += 1
+        try:
+            async with get_async_client().stream(method, url, extensions={"trace": trace},
+                                                 **request_kwargs(kwargs)) as response:
+                check_declared_size(response, host, max_bytes)
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    add_chunk(body, chunk, host, max_bytes)
+                stats.bytes_received += len(body)
+                return ToolResponse(response.status_code, response.headers, bytes(body),
+                                    response.encoding, str(response.url))
+        except httpx.TimeoutException:
+            stats.timeouts += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+
+
+def request_sync(method: str, url: str, max_bytes: int = None, **kwargs) -> ToolResponse:
+    """
+    Sync version of request, for tools invoked outside an event loop. Uses the shared sync
+    client, with the same limits.
+    """
+    max_bytes = max_bytes or TOOL_HTTP_MAX_RESPONSE_BYTES
+    host = urlsplit(url).netloc
+    limit, stats = sync_host_state(host)
+
+    def count(counter: str, amount: int = 1):
+        # Several threads may be calling the same host
+        with _lock:
+            setattr(stats, counter, getattr(stats, counter) + amount)
+
+    def trace(event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            count("new_connections")
+
+    with limit:
+        count("requests")
+        try:
+            with get_client().stream(method, url, extensions={"trace": trace}, **request_kwargs(kwargs)) as response:
+                check_declared_size(response, host, max_bytes)
+                body = bytearray()
+                for chunk in response.iter_bytes():
+                    add_chunk(body, chunk, host, max_bytes)
+                count("bytes_received", len(body))
+                return ToolResponse(response.status_code, response.headers, bytes(body),
+                                    response.encoding, str(response.url))
+        except httpx.TimeoutException:
+            count("timeouts")
+            raise
+        except Exception:
+            count("errors")
+            raise
+
+
+async def close_async_client():
+    """
+    Closes the shared client of the running event loop, if one was opened.
+    """
+    with _lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def http_client_stats() -> dict:
+    """
+    Returns request and connection reuse counters per host.
+    """
+    with _lock:
+        return {
+            "http2": TOOL_HTTP2,
+            "hosts": {host: stats.as_dict() for host, stats in _host_stats.items()},
+        }
@@ -0,0 +1,263 @@
+"""
+Projection of a tool's target_fields out of a JSON response.
+
+create_tool compiles its target_fields once into a FieldProjection. Each path is checked
+when the tool is created, so a malformed path fails straight away rather than on the
+first call. The paths are merged into a tree. FieldProjection.loads then walks the raw
+response text along that tree:
+
+    - only the values the paths end on are kept; a sibling off the paths is decoded by
+      the C decoder to find where it ends and dropped straight away, so the whole
+      document is never built as Python objects at once;
+    - scanning stops as soon as every requested value has been found.
+
+So a two-field projection near the start of a several-hundred-KB payload decodes just up
+to those two fields, instead of building the whole document with json.loads. This is not
+streaming: the response body itself is read in full first (http_client caps it at
+TOOL_HTTP_MAX_RESPONSE_BYTES), and what is saved is decoding time and object memory.
+Missing keys and indices raise KeyError/IndexError/TypeError, as extract_fields does.
+
+A FieldProjection is shared by every call of its tool, across threads and requests, so
+the state of one loads() call lives in its own _Scan.
+"""
+import json
+import re
+from typing import Any, Iterable
+
+PathElement = str | int
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _Done(Exception):
+    """Raised once every requested value has been found, to stop scanning."""
+
+
+class _Scan:
+    """
+    State of one loads() call: the values found so far, and how many are still missing.
+    """
+    __slots__ = ("results", "remaining")
+
+    def __init__(self, paths: int, values: int):
+        self.results: list = [None] * paths
+        self.remaining = values
+
+    def found(self, count: int):
+        self.remaining -= count
+        if self.remaining <= 0:
+            raise _Done
+
+
+class _Node:
+    """
+    One step of the merged paths. outputs are the positions in the result list of the
+    paths ending here; children are the steps that continue from here.
+    """
+    __slots__ = ("outputs", "children")
+
+    def __init__(self):
+        self.outputs: list[int] = []
+        self.children: dict[PathElement, _Node] = {}
+
+    def count(self) -> int:
+        return len(self.outputs) + sum(child.count() for child in self.children.values())
+
+
+def validate_path(path: Any) -> tuple[PathElement, ...]:
+    """
+    Checks one target_fields path and returns it as a tuple.
+
+    Raises:
+        ValueError: If the path is not a list of keys (str) and indices (int)
+    """
+    if not isinstance(path, (list, tuple)):
+        raise ValueError(f"target_fields path {path!r} must be a list of keys and indices.")
+    for element in path:
+        # bool is an int subclass, but True/False as an index is certainly a mistake
+        if isinstance(element, bool) or not isinstance(element, (str, int)):
+            raise ValueError(
+                f"target_fields path {path!r} has {element!r}; path elements must be str keys or int indices.")
+    return tuple(path)
+
+
+def compile_target_fields(target_fields: Iterable[Any]) -> "FieldProjection":
+    """
+    Validates target_fields and compiles them into a FieldProjection.
+
+    Args:
+        target_fields: List of listpaths, e.g. [['abilities', 0, 'ability', 'name']]
+
+    Raises:
+        ValueError: If target_fields or one of its paths is malformed
+    """
+    if isinstance(target_fields, (str, bytes)) or not isinstance(target_fields, Iterable):
+        raise ValueError("target_fields must be a list of listpaths.")
+    return FieldProjection([validate_path(path) for path in target_fields])
+
+
+def extract_path(obj: Any, path: tuple[PathElement, ...]) -> Any:
+    """
+    Follows a path through an already decoded object.
+    """
+    for element in path:
+        # Attributes only for non-dict objects, so a JSON key like "items" is the key
+        if isinstance(element, str) and not isinstance(obj, dict) and hasattr(obj, element):
+            obj = getattr(obj, element)
+        else:
+            obj = obj[element]
+    return obj
+
+
+class FieldProjection:
+    """
+    Compiled target_fields: extracts the values at each path, in order.
+    """
+
+    def __init__(self, paths: list[tuple[PathElement, ...]]):
+        self.paths = paths
+        self.root = _Node()
+        for position, path in enumerate(paths):
+            node = self.root
+            for element in path:
+                node = node.children.setdefault(element, _Node())
+            node.outputs.append(position)
+        self._size = self.root.count()
+
+    def extract(self, obj: Any) -> list:
+        """
+        Returns the value at each path of an already decoded object.
+        """
+        return [extract_path(obj, path) for path in self.paths]
+
+    def loads(self, document: str | bytes) -> list:
+        """
+        Returns the value at each path of a JSON document, decoding only those values.
+
+        Raises:
+            ValueError: If the document is not valid JSON along the way
+            KeyError, IndexError, TypeError: If a path doesn't exist in the document
+        """
+        if isinstance(document, (bytes, bytearray)):
+            document = document.decode("utf-8-sig")
+        scan = _Scan(len(self.paths), self._size)
+        try:
+            end = self._project(document, _skip_whitespace(document, 0), self.root, scan)
+        except _Done:
+            return scan.results
+        if _skip_whitespace(document, end) != len(document):
+            raise json.JSONDecodeError("Extra data", document, end)
+        return scan.results
+
+    def _fill(self, value: Any, node: _Node, scan: _Scan, path: tuple = ()):
+        # Everything below a decoded value is taken from that value directly
+        for position in node.outputs:
+            scan.results[position] = extract_path(value, path)
+        scan.found(len(node.outputs))
+        for element, child in node.children.items():
+            self._fill(value, child, scan, path + (element,))
+
+    def _project(self, doc: str, pos: int, node: _Node, scan: _Scan) -> int:
+        """
+        Projects the value starting at pos along node; returns the position after it.
+        """
+        opening = doc[pos:pos + 1]
+        if node.outputs or opening not in ("{", "["):
+            value, end = _decode(doc, pos)
+            self._fill(value, node, scan)
+            return end
+        if opening == "{":
+            return self._project_object(doc, pos, node, scan)
+        return self._project_array(doc, pos, node, scan)
+
+    def _project_object(self, doc: str, pos: int, node: _Node, scan: _Scan) -> int:
+        for element in node.children:
+            if isinstance(element, int):
+                # As indexing a dict with an int would
+                raise KeyError(element)
+        wanted = set(node.children)
+        pos = _skip_whitespace(doc, pos + 1)
+        if doc[pos:pos + 1] == "}":
+            return self._missing_keys(wanted, pos + 1)
+        while True:
+            if doc[pos:pos + 1] != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", doc, pos)
+            key, pos = json.decoder.scanstring(doc, pos + 1)
+            pos = _skip_whitespace(doc, pos)
+            if doc[pos:pos + 1] != ":":
+                raise json.JSONDecodeError("Expecting ':' delimiter", doc, pos)
+            pos = _skip_whitespace(doc, pos + 1)
+            if key in wanted:
+                wanted.discard(key)
+                pos = self._project(doc, pos, node.children[key], scan)
+            else:
+                pos = _skip_value(doc, pos)
+            pos = _skip_whitespace(doc, pos)
+            delimiter = doc[pos:pos + 1]
+            if delimiter == "}":
+                return self._missing_keys(wanted, pos + 1)
+            if delimiter != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", doc, pos)
+            pos = _skip_whitespace(doc, pos + 1)
+
+    @staticmethod
+    def _missing_keys(wanted: set, end: int) -> int:
+        if wanted:
+            raise KeyError(next(iter(wanted)))
+        return end
+
+    def _project_array(self, doc: str, pos: int, node: _Node, scan: _Scan) -> int:
+        for element in node.children:
+            if isinstance(element, str):
+                raise TypeError(f"list indices must be integers or slices, not str ({element!r})")
+        # Negative indices are resolved once the length is known, from the element offsets
+        negative = any(element < 0 for element in node.children)
+        offsets = []
+        index = 0
+        pos = _skip_whitespace(doc, pos + 1)
+        if doc[pos:pos + 1] == "]":
+            end = pos + 1
+        else:
+            while True:
+                if negative:
+                    offsets.append(pos)
+                child = node.children.get(index)
+                if child is not None:
+                    pos = self._project(doc, pos, child, scan)
+                else:
+                    pos = _skip_value(doc, pos)
+                index += 1
+                pos = _skip_whitespace(doc, pos)
+                delimiter = doc[pos:pos + 1]
+                if delimiter == "]":
+                    end = pos + 1
+                    break
+                if delimiter != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", doc, pos)
+                pos = _skip_whitespace(doc, pos + 1)
+
+        for element, child in node.children.items():
+            if element >= index or element < -index:
+                raise IndexError("list index out of range")
+            if element < 0:
+                self._project(doc, offsets[element], child, scan)
+        return end
+
+
+def _skip_whitespace(doc: str, pos: int) -> int:
+    return _WHITESPACE.match(doc, pos).end()
+
+
+def _decode(doc: str, pos: int) -> tuple[Any, int]:
+    return _decoder.raw_decode(doc, pos)
+
+
+def _skip_value(doc: str, pos: int) -> int:
+    """
+    Returns the position after the value starting at pos.
+    """
+    # The C decoder steps over a skipped value much faster than any Python scan could;
+    # what it builds is dropped straight away, so at most one skipped sibling is alive
+    # at a time, never the whole document
+    return _decoder.raw_decode(doc, pos)[1]
@@ -0,0 +1,131 @@
+"""
+Cross-request cache of builtin tool results.
+
+The same popular entities are looked up over and over, and Wikipedia, Wolfram Alpha and
+Tavily are slow (the last two also cost quota). Builtin tools wrap their tool_function
+with cache_tool_results, giving a policy that picks the TTL of each result:
+
+    - per tool, and per call where it matters (news searches go stale much sooner
+      than Wikipedia pages);
+    - "nothing found" answers are kept for TOOL_CACHE_NEGATIVE_TTL, so a missing page
+      isn't searched again on every request;
+    - errors are not cached at all.
+
+Entries are keyed by tool name and canonicalized args (see tool_memo.canonicalize) and
+live in a bounded, LRU-evicted core.cache backend: SQLite by default so every worker
+shares it, or memory. Async calls read and write the cache in a thread, so SQLite I/O
+doesn't block the event loop.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+from typing import Any, Callable, Optional
+from langchain_core.tools import StructuredTool
+from core.cache import MISSING, create_cache
+from core.agents.utils.tool_memo import CASE_INSENSITIVE_TOOLS, canonicalize
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "20000"))
+TOOL_CACHE_BACKEND = os.getenv("TOOL_CACHE_BACKEND", "sqlite")
+# Seconds "nothing found" answers are kept
+TOOL_CACHE_NEGATIVE_TTL = float(os.getenv("TOOL_CACHE_NEGATIVE_TTL", "3600"))
+
+# Seconds a result is kept, or None to not cache it
+CachePolicy = Callable[[dict, Any], Optional[float]]
+
+tool_cache = create_cache("tool_results", backend=TOOL_CACHE_BACKEND, max_size=TOOL_CACHE_SIZE, ttl=None)
+
+
+def tool_cache_key(name: str, args: dict, variant: str = "") -> str:
+    """
+    Cache key of a call: '<tool name>:<hash of settings and canonicalized args>', so one
+    tool's entries can be purged by prefix.
+    """
+    canonical = canonicalize(args, fold_case=name in CASE_INSENSITIVE_TOOLS)
+    serialized = json.dumps([variant, canonical], sort_keys=True, default=str)
+    return f"{name}:{hashlib.sha256(serialized.encode()).hexdigest()}"
+
+
+def cache_tool_results(tool: StructuredTool, policy: CachePolicy,
+                       variant: Callable[[], str] = None) -> StructuredTool:
+    """
+    Makes a builtin tool answer from the cache, and store the results it fetches.
+    Both the sync function and the coroutine are wrapped.
+
+    Args:
+        tool: The tool, with its coroutine already attached
+        policy: Returns how many seconds to keep a result given the call args, or None
+            to not cache it
+        variant: Returns the settings that change the tool's output (e.g. passage mode),
+            so results produced under other settings aren't served
+
+    Returns:
+        The same tool object
+    """
+    if not TOOL_CACHE_ENABLED:
+        return tool
+    func, coroutine = tool.func, tool.coroutine
+    signature = inspect.signature(func)
+
+    def call_args(args: tuple, kwargs: dict) -> dict:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return dict(bound.arguments)
+
+    def key_of(arguments: dict) -> str:
+        return tool_cache_key(tool.name, arguments, variant() if variant else "")
+
+    def store(key: str, arguments: dict, result: Any):
+        ttl = policy(arguments, result)
+        if ttl:
+            tool_cache.set(key, result, ttl=ttl)
+
+    @functools.wraps(func)
+    def cached_func(*args, **kwargs):
+        arguments = call_args(args, kwargs)
+        key = key_of(arguments)
+        result = tool_cache.get(key)
+        if result is MISSING:
+            result = func(*args, **kwargs)
+            store(key, arguments, result)
+        return result
+
+    tool.func = cached_func
+
+    if coroutine is not None:
+        @functools.wraps(coroutine)
+        async def cached_coroutine(*args, **kwargs):
+            arguments = call_args(args, kwargs)
+            key = key_of(arguments)
+            result = await asyncio.to_thread(tool_cache.get, key)
+            if result is MISSING:
+                result = await coroutine(*args, **kwargs)
+                await asyncio.to_thread(store, key, arguments, result)
+            return result
+
+        tool.coroutine = cached_coroutine
+    return tool
+
+
+def purge_tool_results(tool_name: str = None) -> int:
+    """
+    Removes cached results of one tool, or of every tool if tool_name is None.
+
+    Returns:
+        The number of entries removed
+    """
+    if tool_name is None:
+        removed = tool_cache.stats()["size"]
+        tool_cache.clear()
+        return removed
+    return tool_cache.delete_prefix(f"{tool_name}:")
+
+
+def tool_cache_stats() -> dict:
+    """
+    Returns hit/miss counters and the size of the tool result cache.
+    """
+    return {"enabled": TOOL_CACHE_ENABLED, "negative_ttl": TOOL_CACHE_NEGATIVE_TTL, **tool_cache.stats()}
@@ -1,7 +1,8 @@
-import requests
 from inspect import Signature, Parameter
 from langchain.tools import StructuredTool
 from typing import Literal
+from core.agents.tools import http_client
+from core.agents.tools.json_projection import compile_target_fields, extract_path
 
 TYPE_MAPPING = {
     "int": int,
@@ -16,24 +17,9 @@ TYPE_MAPPING = {
 
 def extract_fields(obj: dict, listpath_to_field: list):
     """
-    Recursively extracts properties/indices from a list.
+    Extracts properties/indices from an object along a listpath.
     """
-    # Base case:
-    if not listpath_to_field:
-        return obj
-
-    target = listpath_to_field.pop(0)
-    # Case: next field is an index
-    if isinstance(target, int):
-        return extract_fields(obj[target], listpath_to_field)
-
-    # Case: next field is a property
-    if hasattr(obj, target):
-        print(f"{target} is a property of obj")
-        return extract_fields(getattr(obj, target), listpath_to_field)
-
-    # Case: next field is an index or string key
-    return extract_fields(obj[target], listpath_to_field)
+    return extract_path(obj, listpath_to_field)
 
 
 def create_tool(
@@ -73,9 +59,14 @@ def create_tool(
                     'for': 'url_params', 'params', 'headers', 'data', 'json'
                     },
             }
+
+    Raises:
+        ValueError: If target_fields is malformed
     """
+    # Checked and compiled once here, rather than on every call
+    projection = compile_target_fields(target_fields) if target_fields else None
 
-    def api_caller(**kwargs):
+    def build_request(**kwargs) -> dict:
         # Initialize request components
         url_params = {}
         req_headers = headers.copy() if headers else {}
@@ -107,31 +98,40 @@ def create_tool(
         # Format the URL with URL parameters
         url = url_template.format(**url_params)
 
-        # Make the API request
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=req_headers,
-            params=req_params,
-            data=req_data,
-            json=req_json
-        )
+        return {
+            'method': method,
+            'url': url,
+            'headers': req_headers,
+            'params': req_params,
+            'data': req_data,
+            'json': req_json,
+        }
+
+    def handle_response(response):
+        content = getattr(response, 'content', None)
         try:
+            if projection and isinstance(content, (bytes, str)):
+                # Decode only the target fields straight from the body
+                return projection.loads(content)
             response_json = response.json()
         except ValueError:
             print(
                 f"Error: Could not parse response as JSON. Response text: {response.text}")
             return response.text
 
-        if target_fields:
-            return_fields = []
-            for listpath in target_fields:
-                # Make a copy of the listpath to avoid mutating the original
-                return_fields.append(extract_fields(
-                    response_json, listpath[:]))
-            return return_fields
+        if projection:
+            return projection.extract(response_json)
         return response
 
+    def api_caller(**kwargs):
+        # Pooled, size-limited request; see http_client
+        response = http_client.request_sync(**build_request(**kwargs))
+        return handle_response(response)
+
+    async def aapi_caller(**kwargs):
+        response = await http_client.request(**build_request(**kwargs))
+        return handle_response(response)
+
     # Dynamically create the function signature
     parameters = [
         Parameter(
@@ -149,6 +149,11 @@ def create_tool(
         bound_args.apply_defaults()
         return api_caller(**bound_args.arguments)
 
+    async def atool_function(*args, **kwargs):
+        bound_args = custom_signature.bind(*args, **kwargs)
+        bound_args.apply_defaults()
+        return await aapi_caller(**bound_args.arguments)
+
     # Create arguments schema dictionary for LangChain
     args_schema = {
         param_name: {  # Use parameter name as key
@@ -160,6 +165,7 @@ def create_tool(
 
     return StructuredTool.from_function(
         func=tool_function,
+        coroutine=atool_function,
         name=name,
         description=docstring,
         args_schema=args_schema
@@ -0,0 +1,81 @@
+"""
+Okapi BM25 ranking of short texts against a query.
+
+Used to pick the passages of a document that are most relevant to a query, so agents
+see a few relevant paragraphs instead of a whole page.
+"""
+import math
+import re
+from collections import Counter
+
+# Common English words that carry no relevance signal
+STOPWORDS = frozenset("""
+a an and are as at be been but by can did do does for from had has have he her his how
+i if in into is it its of on or our she so than that the their them then there these
+they this to was we were what when where which who whom why will with would you your
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercases text and splits it into words, dropping stopwords.
+    """
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25:
+    """
+    BM25 index over a fixed list of tokenized documents.
+
+    Args:
+        documents: Token lists, e.g. from tokenize
+        k1: Term frequency saturation
+        b: Document length normalization
+    """
+
+    def __init__(self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(documents)
+        # The +1 keeps terms found in most documents from scoring negative
+        self.idf = {
+            term: math.log((total - count + 0.5) / (count + 0.5) + 1)
+            for term, count in document_frequency.items()
+        }
+
+    def scores(self, query: list[str]) -> list[float]:
+        """
+        Returns the score of every document for a tokenized query.
+        """
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            score = 0.0
+            for term in query:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+def rank(query: str, texts: list[str]) -> list[tuple[int, float]]:
+    """
+    Ranks texts against a query.
+
+    Args:
+        query: Free text query
+        texts: Texts to rank
+
+    Returns:
+        (index into texts, score) pairs, best first; ties keep their original order
+    """
+    scores = BM25([tokenize(text) for text in texts]).scores(tokenize(query))
+    return sorted(enumerate(scores), key=lambda pair: -pair[1])
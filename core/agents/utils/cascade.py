@@ -0,0 +1,194 @@
+"""
+Two-tier model cascade for structured-output agents.
+
+Most claims are easy, and a small model labels them as well as a large one, in a fraction
+of the GPU time. A CascadeChatModel asks the small model first and only escalates to the
+large model when the small model's answer can't be trusted:
+
+    - it isn't valid JSON matching the output schema ('invalid');
+    - one of its labels is 'unknown' ('unknown');
+    - its self-reported confidence is under CASCADE_CONFIDENCE_THRESHOLD ('low_confidence').
+
+The small model's schema gets an extra required 'confidence' field (0 to 1) for the last
+check, and its system prompt a line saying what that confidence means (CONFIDENCE_INSTRUCTION);
+agents read their own fields and ignore it. Both tiers run as child runs of the cascade's
+call, with its callbacks and call kwargs. How many calls each tier answered, and
+why calls escalated, are kept per agent (cascade_stats).
+"""
+import json
+import os
+import threading
+from typing import Any, List, Optional
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Small-model answers reporting less confidence than this go to the large model
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.7"))
+
+# Tells the small model what its confidence field is for
+CONFIDENCE_INSTRUCTION = ("Also give 'confidence': the probability, from 0 to 1, that your answer is correct. "
+                          "Give a low value when the evidence is thin, indirect or conflicting.")
+
+# Escalation reasons
+INVALID = "invalid"
+UNKNOWN = "unknown"
+LOW_CONFIDENCE = "low_confidence"
+
+_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def with_confidence(format_output: dict) -> dict:
+    """
+    Returns a copy of an output schema that also asks for a confidence score.
+    """
+    return {
+        **format_output,
+        "properties": {**format_output.get("properties", {}),
+                       "confidence": {"type": "number", "minimum": 0, "maximum": 1}},
+        "required": [*format_output.get("required", []), "confidence"],
+    }
+
+
+def escalation_reason(content: Any, format_output: dict, threshold: float = None) -> Optional[str]:
+    """
+    Checks a small-model answer against its output schema.
+
+    Args:
+        content: The answer's message content
+        format_output: The schema the answer should match, with its confidence field
+        threshold: Lowest acceptable confidence. Defaults to CASCADE_CONFIDENCE_THRESHOLD
+
+    Returns:
+        Why the answer must go to the large model, or None if it can be used
+    """
+    threshold = CASCADE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    try:
+        answer = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return INVALID
+    if not isinstance(answer, dict) or any(field not in answer for field in format_output.get("required", [])):
+        return INVALID
+    for field, schema in format_output.get("properties", {}).items():
+        if field not in answer:
+            continue
+        value = answer[field]
+        if "enum" in schema and value not in schema["enum"]:
+            return INVALID
+        if schema.get("type") == "string" and not isinstance(value, str):
+            return INVALID
+    confidence = answer.get("confidence")
+    if not isinstance(confidence, (int, float)) or isinstance(confidence, bool):
+        return INVALID
+    if any(answer.get(field) == "unknown" for field, schema in format_output.get("properties", {}).items()
+           if "unknown" in schema.get("enum", [])):
+        return UNKNOWN
+    if confidence < threshold:
+        return LOW_CONFIDENCE
+    return None
+
+
+class CascadeChatModel(BaseChatModel):
+    """
+    Chat model answering with small_llm when its answer passes the checks, and with
+    large_llm otherwise.
+    """
+
+    small_llm: BaseChatModel
+    large_llm: BaseChatModel
+    # Schema of the small model's answers, including the confidence field
+    small_format: dict
+    # Name the tier counters are kept under, e.g. the agent's name
+    agent_name: str
+    threshold: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cascade"
+
+    @property
+    def model(self) -> str:
+        # Shown in logs and model listings like any other model name
+        return f"{getattr(self.small_llm, 'model', '?')}->{getattr(self.large_llm, 'model', '?')}"
+
+    def _record(self, reason: Optional[str]):
+        with _stats_lock:
+            stats = _stats.setdefault(self.agent_name, {
+                "small_model": getattr(self.small_llm, "model", None),
+                "large_model": getattr(self.large_llm, "model", None),
+                "calls": 0, "small": 0, "large": 0, "escalations": {INVALID: 0, UNKNOWN: 0, LOW_CONFIDENCE: 0},
+            })
+            stats["calls"] += 1
+            if reason is None:
+                stats["small"] += 1
+            else:
+                stats["large"] += 1
+                stats["escalations"][reason] += 1
+
+    def _check(self, message: BaseMessage) -> Optional[str]:
+        reason = escalation_reason(message.content, self.small_format, self.threshold)
+        if reason is not None:
+            print(f"Cascade {self.agent_name}: escalating to {getattr(self.large_llm, 'model', 'large model')} ({reason})")
+        return reason
+
+    @staticmethod
+    def _small_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+        # The instruction goes at the end of the system prompt, so the prompt's prefix is unchanged
+        if messages and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, str):
+            return [SystemMessage(content=f"{messages[0].content}\n\n{CONFIDENCE_INSTRUCTION}"), *messages[1:]]
+        return [SystemMessage(content=CONFIDENCE_INSTRUCTION), *messages]
+
+    def _config(self, run_manager, tier: str, manager_class=CallbackManager) -> Optional[dict]:
+        """
+        Returns the config running a tier as a child of the cascade's run.
+        """
+        if run_manager is None:
+            return None
+        manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+        manager.set_handlers(run_manager.inheritable_handlers)
+        manager.add_tags(run_manager.inheritable_tags)
+        manager.add_metadata(run_manager.inheritable_metadata)
+        return {"callbacks": manager, "run_name": f"{self.agent_name}_{tier}"}
+
+    @staticmethod
+    def _result(message: BaseMessage, tier: str) -> ChatResult:
+        message = AIMessage(content=message.content, additional_kwargs=message.additional_kwargs,
+                            response_metadata={**message.response_metadata, "cascade_tier": tier},
+                            usage_metadata=getattr(message, "usage_metadata", None))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        small = self.small_llm.invoke(self._small_messages(messages), self._config(run_manager, "small"),
+                                      stop=stop, **kwargs)
+        reason = self._check(small)
+        self._record(reason)
+        if reason is None:
+            return self._result(small, "small")
+        large = self.large_llm.invoke(messages, self._config(run_manager, "large"), stop=stop, **kwargs)
+        return self._result(large, "large")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        small = await self.small_llm.ainvoke(self._small_messages(messages),
+                                             self._config(run_manager, "small", AsyncCallbackManager),
+                                             stop=stop, **kwargs)
+        reason = self._check(small)
+        self._record(reason)
+        if reason is None:
+            return self._result(small, "small")
+        large = await self.large_llm.ainvoke(messages, self._config(run_manager, "large", AsyncCallbackManager),
+                                             stop=stop, **kwargs)
+        return self._result(large, "large")
+
+
+def cascade_stats() -> dict[str, dict]:
+    """
+    Returns, per agent, the calls each tier answered and why calls were escalated.
+    """
+    with _stats_lock:
+        return {
+            agent: {**stats, "escalations": dict(stats["escalations"]),
+                    "escalation_rate": round(stats["large"] / stats["calls"], 3) if stats["calls"] else 0.0}
+            for agent, stats in _stats.items()
+        }
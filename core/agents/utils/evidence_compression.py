@@ -0,0 +1,259 @@
+"""
+Compression of research evidence before it goes into the reasoning prompt.
+
+Tools return whatever their source gives them (Wikipedia passages, web search chunks, raw
+custom tool JSON), and the reasoning agent pastes all of it into its system prompt. The
+compression node bounds that: when a claim's evidence is over EVIDENCE_TOKEN_BUDGET, it
+
+    - splits every result into sentences and ranks them against the claim with BM25. A
+      structured result (web search hits, custom tool JSON) is cut field by field: only its
+      text fields are split, and fields naming the source (EVIDENCE_KEEP_FIELDS, e.g. url
+      and title) are kept whole in every item that keeps any text;
+    - drops sentences that nearly repeat one already kept (word overlap of at least
+      EVIDENCE_DUPLICATE_THRESHOLD), which is common across search results;
+    - keeps the best sentence of each result first, then the best of the rest, until
+      the budget is spent, and puts each result's sentences back in their original order.
+
+Everything dropped is listed in the audit returned alongside the evidence. Evidence under
+the budget is passed through, minus exact duplicates.
+
+Compressors are looked up by name in COMPRESSORS, so another strategy can be plugged in
+and selected with EVIDENCE_COMPRESSION.
+"""
+import json
+import os
+import re
+from typing import Callable
+from core.agents.utils.bm25 import BM25, tokenize
+from core.agents.utils.common_types import Evidence
+from core.agents.utils.tokens import estimate_tokens
+
+# 'extractive' or 'none'
+EVIDENCE_COMPRESSION = os.getenv("EVIDENCE_COMPRESSION", "extractive")
+# Most (estimated) tokens of evidence per claim in the reasoning prompt
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "3000"))
+# Share of words two sentences must have in common to count as the same sentence
+EVIDENCE_DUPLICATE_THRESHOLD = float(os.getenv("EVIDENCE_DUPLICATE_THRESHOLD", "0.8"))
+# Fields of structured results that say where the text came from; never cut
+EVIDENCE_KEEP_FIELDS = {field.strip().lower() for field in
+                        os.getenv("EVIDENCE_KEEP_FIELDS", "url,source,link,title,name,id").split(",")}
+
+# Sentence ends, and line breaks, which separate list items and passages in tool output
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+# Marks text left out between two kept sentences
+GAP = " ... "
+
+
+def result_text(result) -> str:
+    """
+    Returns a tool result as text, the way it will read in the prompt.
+    """
+    if isinstance(result, str):
+        return result
+    try:
+        return json.dumps(result, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(result)
+
+
+def text_fields(result, path: tuple = ()) -> list[tuple[tuple, str]]:
+    """
+    Returns the text compression may cut from a result, as (path, text) pairs: the result
+    itself if it is a string, else every string field of its JSON except EVIDENCE_KEEP_FIELDS.
+    """
+    if isinstance(result, str):
+        return [(path, result)]
+    if isinstance(result, dict):
+        return [field for key, value in result.items() if str(key).lower() not in EVIDENCE_KEEP_FIELDS
+                for field in text_fields(value, path + (key,))]
+    if isinstance(result, (list, tuple)):
+        return [field for i, value in enumerate(result) for field in text_fields(value, path + (i,))]
+    return []
+
+
+# Returned by rebuild() for a part of a result that lost all of its text
+_DROPPED = object()
+
+
+def rebuild(result, texts: dict[tuple, str], path: tuple = ()):
+    """
+    Returns the result with each field in `texts` replaced by its compressed text. Fields
+    left empty are removed, and so are the list items and objects that had text and lost
+    all of it, so a search hit isn't kept as a bare URL. Returns _DROPPED if nothing is left.
+    """
+    below = [text for field, text in texts.items() if field[:len(path)] == path]
+    if not below:
+        return result
+    if not any(below):
+        return _DROPPED
+    if path in texts:
+        return texts[path]
+    if isinstance(result, dict):
+        children = ((key, rebuild(value, texts, path + (key,))) for key, value in result.items())
+        return {key: value for key, value in children if value is not _DROPPED}
+    children = (rebuild(value, texts, path + (i,)) for i, value in enumerate(result))
+    return [value for value in children if value is not _DROPPED]
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in _SENTENCE_SPLIT.split(text) if sentence and sentence.strip()]
+
+
+def overlap(a: set[str], b: set[str]) -> float:
+    """
+    Share of the smaller word set found in the other one.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def no_compression(claim: str, evidence: list[Evidence], budget: int) -> tuple[list[Evidence], list[dict]]:
+    return evidence, []
+
+
+def drop_exact_duplicates(evidence: list[Evidence]) -> tuple[list[Evidence], list[dict]]:
+    kept, audit, seen = [], [], set()
+    for ev in evidence:
+        key = (ev["name"], result_text(ev["result"]))
+        if key in seen:
+            audit.append({"name": ev["name"], "args": ev["args"], "dropped": True, "reason": "duplicate",
+                          "original_tokens": estimate_tokens(key[1]), "kept_tokens": 0, "dropped_sentences": []})
+            continue
+        seen.add(key)
+        kept.append(ev)
+    return kept, audit
+
+
+def extractive_compression(claim: str, evidence: list[Evidence], budget: int) -> tuple[list[Evidence], list[dict]]:
+    """
+    Selects the sentences of the evidence most relevant to the claim, within budget.
+
+    Args:
+        claim: The claim the evidence was gathered for
+        evidence: Evidence from the research agent
+        budget: Most estimated tokens of evidence to keep
+
+    Returns:
+        The compressed evidence, and an audit entry for every result that lost anything
+    """
+    evidence, audit = drop_exact_duplicates(evidence)
+    texts_before = [result_text(ev["result"]) for ev in evidence]
+    if sum(estimate_tokens(text) for text in texts_before) <= budget:
+        return evidence, audit
+
+    fields = [text_fields(ev["result"]) for ev in evidence]
+    # Every sentence of every result, as (result index, field path, sentence)
+    sentences = [(item, path, sentence) for item, item_fields in enumerate(fields)
+                 for path, text in item_fields for sentence in split_sentences(text)]
+    tokens = [tokenize(sentence) for _, _, sentence in sentences]
+    scores = BM25(tokens).scores(tokenize(claim))
+
+    # What a result costs besides its text (keys, kept fields) is charged once the result,
+    # or for a list the item of it, keeps its first sentence
+    def part(i: int) -> tuple:
+        item, path, _ = sentences[i]
+        return (item, path[:1]) if isinstance(evidence[item]["result"], (list, tuple)) else (item, ())
+
+    overhead = {}
+    for item, ev in enumerate(evidence):
+        result = ev["result"]
+        parts = [((position,), value) for position, value in enumerate(result)] \
+            if isinstance(result, (list, tuple)) else [((), result)]
+        for path, value in parts:
+            text_tokens = sum(estimate_tokens(text) for _, text in text_fields(value))
+            overhead[(item, path)] = max(0, estimate_tokens(result_text(value)) - text_tokens)
+
+    by_score = sorted(range(len(sentences)), key=lambda i: -scores[i])
+    # Best sentence of each result first, so no source is crowded out entirely
+    best_of_item = {}
+    for i in by_score:
+        best_of_item.setdefault(sentences[i][0], i)
+    firsts = set(best_of_item.values())
+    order = [i for i in by_score if i in firsts] + [i for i in by_score if i not in firsts]
+
+    kept: set[int] = set()
+    kept_words: list[set[str]] = []
+    charged: set[tuple] = set()
+    reasons: dict[int, str] = {}
+    used = 0
+    for i in order:
+        words = set(tokens[i])
+        if any(overlap(words, other) >= EVIDENCE_DUPLICATE_THRESHOLD for other in kept_words):
+            reasons[i] = "duplicate"
+            continue
+        cost = estimate_tokens(sentences[i][2]) + 1
+        if part(i) not in charged:
+            cost += overhead[part(i)]
+        if used + cost > budget:
+            reasons[i] = "budget"
+            continue
+        kept.add(i)
+        kept_words.append(words)
+        charged.add(part(i))
+        used += cost
+
+    sentences_of_field: dict[tuple, list[int]] = {}
+    for i, (item, path, _) in enumerate(sentences):
+        sentences_of_field.setdefault((item, path), []).append(i)
+
+    compressed = []
+    for item, ev in enumerate(evidence):
+        texts, dropped = {}, []
+        for path, _ in fields[item]:
+            indices = sentences_of_field.get((item, path), [])
+            kept_indices = [i for i in indices if i in kept]
+            dropped += [{"text": sentences[i][2], "reason": reasons[i]} for i in indices if i not in kept]
+            text = ""
+            for position, i in enumerate(kept_indices):
+                if position:
+                    # Sentences that were next to each other stay joined as they were
+                    text += " " if i == kept_indices[position - 1] + 1 else GAP
+                text += sentences[i][2]
+            texts[path] = text
+        result = rebuild(ev["result"], texts) if dropped else ev["result"]
+        if result is not _DROPPED:
+            compressed.append(Evidence(name=ev["name"], args=ev["args"], result=result) if dropped else ev)
+        if dropped:
+            audit.append({
+                "name": ev["name"],
+                "args": ev["args"],
+                "dropped": result is _DROPPED,
+                "reason": "sentences" if result is not _DROPPED else
+                          "duplicate" if all(d["reason"] == "duplicate" for d in dropped) else "budget",
+                "original_tokens": estimate_tokens(texts_before[item]),
+                "kept_tokens": 0 if result is _DROPPED else estimate_tokens(result_text(result)),
+                "dropped_sentences": dropped,
+            })
+    return compressed, audit
+
+
+COMPRESSORS: dict[str, Callable[[str, list[Evidence], int], tuple[list[Evidence], list[dict]]]] = {
+    "none": no_compression,
+    "extractive": extractive_compression,
+}
+
+
+def compress_evidence(claim: str, evidence: list[Evidence], budget: int = None,
+                      method: str = None) -> tuple[list[Evidence], list[dict]]:
+    """
+    Compresses a claim's evidence with the configured compressor.
+
+    Args:
+        claim: The claim the evidence was gathered for
+        evidence: Evidence from the research agent
+        budget: Most estimated tokens to keep. Defaults to EVIDENCE_TOKEN_BUDGET
+        method: Name of a compressor in COMPRESSORS. Defaults to EVIDENCE_COMPRESSION
+
+    Returns:
+        The compressed evidence and the audit of what was dropped
+    """
+    method = method or EVIDENCE_COMPRESSION
+    if method not in COMPRESSORS:
+        raise ValueError(f"Unknown evidence compression '{method}'. Choose one of {sorted(COMPRESSORS)}.")
+    compressed, audit = COMPRESSORS[method](claim, evidence, budget or EVIDENCE_TOKEN_BUDGET)
+    if audit:
+        before = sum(entry["original_tokens"] for entry in audit)
+        after = sum(entry["kept_tokens"] for entry in audit)
+        print(f"Compressed evidence for claim '{claim[:60]}': {len(audit)} result(s) cut from ~{before} to ~{after} tokens")
+    return compressed, audit
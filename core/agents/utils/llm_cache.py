@@ -0,0 +1,127 @@
+"""
+Disk-backed cache of chat model responses.
+
+Every agent runs its model at temperature 0, so the same messages sent to the same model
+with the same output format and bound tools give the same answer. Plugging this cache into
+a chat model (see llm_factory.with_llm_cache) lets repeated calls, e.g. evaluation runs
+or popular queries, skip the model round trip.
+
+LangChain builds the lookup from two strings: the serialized messages, and the call's
+parameters (bound tools, stop words). Some chat models, ChatOllama among them, leave their
+own settings (model name, format schema, temperature...) out of the latter, so each model
+gets a cache view scoped by a fingerprint of those settings. Everything is hashed together
+into the key of a size-bounded SQLite cache shared by all workers.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Optional, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from core.cache import MISSING, SQLiteTTLCache
+
+# Comma-separated agent names to cache responses for ('all' for every agent); empty disables
+LLM_CACHE_AGENTS = os.getenv("LLM_CACHE_AGENTS", "")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "50000"))
+# Responses only change when the model itself is updated; the TTL bounds how long a stale
+# answer can survive an `ollama pull`
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "604800"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+# Model settings that don't change what the model answers, so they stay out of the key
+# (e.g. the same model behind a different Ollama endpoint gives the same answers)
+IGNORED_MODEL_SETTINGS = {
+    "base_url", "client_kwargs", "keep_alive", "disable_streaming", "name", "num_thread", "num_gpu",
+    "http_client", "http_async_client", "openai_api_key", "openai_api_base", "openai_proxy",
+    "max_retries", "request_timeout", "base_urls", "num_ctx", "context_buckets",
+}
+
+
+def model_fingerprint(llm: BaseChatModel) -> str:
+    """
+    Hashes the settings of a chat model that affect its output.
+    """
+    settings = {key: value for key, value in llm.model_dump().items() if key not in IGNORED_MODEL_SETTINGS}
+    settings["_type"] = llm._llm_type
+    serialized = json.dumps(settings, sort_keys=True, default=lambda value: type(value).__name__)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache storing generations in a SQLiteTTLCache.
+    """
+
+    def __init__(self, max_size: int = LLM_CACHE_SIZE, ttl: float | None = LLM_CACHE_TTL,
+                 path: str = None, store: SQLiteTTLCache = None, scope: str = ""):
+        """
+        Args:
+            max_size: Maximum number of responses kept
+            ttl: Time-to-live of a response in seconds
+            path: SQLite file to use. Defaults to CACHE_DB_PATH
+            store: Existing store to share instead of opening a new one
+            scope: Prefix separating the entries of different models
+        """
+        self.store = store or SQLiteTTLCache("llm_responses", max_size=max_size, ttl=ttl, path=path)
+        self.scope = scope
+
+    def for_model(self, llm: BaseChatModel) -> "LLMResponseCache":
+        """
+        Returns a view of this cache that only holds responses from models configured like llm.
+        """
+        return LLMResponseCache(store=self.store, scope=model_fingerprint(llm))
+
+    def key(self, prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{self.scope}\0{llm_string}\0{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        cached = self.store.get(self.key(prompt, llm_string))
+        if cached is MISSING:
+            return None
+        try:
+            return [loads(generation) for generation in cached]
+        except Exception as e:
+            # Written by an incompatible langchain version; treat as a miss and overwrite
+            print(f"Error loading cached LLM response: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self.store.set(self.key(prompt, llm_string), [dumps(generation) for generation in return_val])
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def llm_cache_enabled(agent_name: str) -> bool:
+    """
+    Returns whether responses should be cached for the named agent, per LLM_CACHE_AGENTS.
+    """
+    agents = {name.strip() for name in LLM_CACHE_AGENTS.split(",") if name.strip()}
+    return "all" in agents or agent_name in agents
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Returns the process-wide response cache, creating it on first use.
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(path=LLM_CACHE_PATH)
+    return _llm_cache
+
+
+def llm_cache_stats() -> dict:
+    """
+    Returns hit/miss counters and the size of the response cache.
+    """
+    if _llm_cache is None:
+        return {"enabled_agents": LLM_CACHE_AGENTS, "size": 0}
+    return {"enabled_agents": LLM_CACHE_AGENTS, **_llm_cache.stats()}
@@ -1,9 +1,16 @@
+import json
 import os
+import threading
 from typing import Any, Dict, Optional, Literal, Union
-from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 # from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
+from core.agents.utils.cascade import CascadeChatModel, with_confidence
+from core.agents.utils.llm_cache import get_llm_cache, llm_cache_enabled
+from core.agents.utils.llm_pool import get_backend_pool
+from core.agents.utils.model_scheduler import OLLAMA_MODEL_AFFINITY
+from core.agents.utils.ollama_balancer import BalancedChatOllama, ollama_base_urls
+from core.agents.utils.tokens import OLLAMA_CTX_BUCKETS, ContextSizedChatOllama
 
 # Map model names to their providers
 MODEL_PROVIDERS = {
@@ -29,6 +36,17 @@ MODEL_PROVIDERS = {
     "deepseek-r1:32b": "ollama",
 }
 
+# Models already built, keyed by everything that went into building them. Chat models are
+# stateless between calls, so one instance can serve every agent and request that asks
+# for the same configuration.
+_chat_models: dict[str, BaseChatModel] = {}
+_chat_models_lock = threading.Lock()
+_chat_model_stats = {"hits": 0, "misses": 0}
+
+# 'auto' sizes the context window of each Ollama call to its prompt (see tokens.py);
+# a number fixes it
+OLLAMA_NUM_CTX = os.getenv("OLLAMA_NUM_CTX", "auto")
+
 # Allow explicit provider override
 
 
@@ -39,6 +57,8 @@ def get_chat_model(
 ) -> BaseChatModel:
     """
     Factory function to create the appropriate chat model based on model name or explicit provider.
+    Models are memoized by (provider, model, format, base_url, kwargs), and all models using
+    the same backend share one keep-alive HTTP connection pool.
 
     Args:
         model_name: Name of the model to use
@@ -58,11 +78,48 @@ def get_chat_model(
         print(f"Warning: Unknown model '{model_name}'."
               f"Add this model to MODEL_PROVIDERS explicitly to enable support.")
 
+    # base_url only picks the connection pool for OpenAI; the client resolves the URL itself
+    if model_provider == "openai":
+        base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    elif model_provider == "ollama":
+        # OLLAMA_BASE_URLS lists several hosts to balance over; see ollama_balancer
+        base_url = ",".join(ollama_base_urls())
+    else:
+        raise ValueError(
+            f"Unknown model '{model_name}', can't build an LLM on that model.")
+
+    key = json.dumps([model_provider, model_name, format_output, base_url, kwargs],
+                     sort_keys=True, default=repr)
+    with _chat_models_lock:
+        if key in _chat_models:
+            _chat_model_stats["hits"] += 1
+            return _chat_models[key]
+        _chat_model_stats["misses"] += 1
+
+    llm = build_chat_model(model_provider, model_name, base_url, format_output, **kwargs)
+    with _chat_models_lock:
+        return _chat_models.setdefault(key, llm)
+
+
+def build_chat_model(
+    model_provider: str,
+    model_name: str,
+    base_url: str,
+    format_output: Optional[Dict] = None,
+    **kwargs
+) -> BaseChatModel:
+    """
+    Creates a new chat model wired to the shared connection pool of its backend.
+    For Ollama, base_url may be a comma-separated list of hosts to balance calls over.
+    """
     # Create the appropriate model type
     if model_provider == "openai":
+        pool = get_backend_pool(model_provider, base_url)
         return ChatOpenAI(
             model=model_name,
             temperature=0,
+            http_client=pool.client,
+            http_async_client=pool.async_client,
             model_kwargs={
                 "response_format":
                 {
@@ -79,19 +136,74 @@ def get_chat_model(
     #         **({"response_format": format} if format else {}),
     #         **kwargs
     #     )
-    elif model_provider == "ollama":  # ollama
-        ollama_base_url = os.getenv(
-            "OLLAMA_BASE_URL", "http://localhost:11434")
+    else:  # ollama
+        base_urls = base_url.split(",")
         model_kwargs = {
             "model": model_name,
             "temperature": 0,
-            "base_url": ollama_base_url,
-            "num_ctx": 128000,
+            "base_url": base_urls[0],
+            # With auto sizing this is the largest window a call may get
+            "num_ctx": max(OLLAMA_CTX_BUCKETS) if OLLAMA_NUM_CTX == "auto" else int(OLLAMA_NUM_CTX),
+            "context_buckets": OLLAMA_CTX_BUCKETS if OLLAMA_NUM_CTX == "auto" else None,
             **kwargs
         }
         if format_output:
             model_kwargs["format"] = format_output
-        return ChatOllama(**model_kwargs)
+        # Model affinity schedules calls per host, which the balanced model does for one host too
+        if len(base_urls) > 1 or OLLAMA_MODEL_AFFINITY:
+            return BalancedChatOllama(base_urls=base_urls, **model_kwargs)
 
-    raise ValueError(
-        f"Unknown model '{model_name}', can't build an LLM on that model.")
+        # The model's clients send through the backend's shared pool, unless the caller
+        # asked for custom client settings
+        if not model_kwargs.get("client_kwargs"):
+            model_kwargs["client_kwargs"] = get_backend_pool(model_provider, base_urls[0]).client_kwargs
+        return ContextSizedChatOllama(**model_kwargs)
+
+
+def chat_model_cache_info() -> dict:
+    """
+    Returns hit/miss counters and the number of memoized chat models.
+    """
+    with _chat_models_lock:
+        return {**_chat_model_stats, "size": len(_chat_models)}
+
+
+def with_llm_cache(llm: BaseChatModel, agent_name: str) -> BaseChatModel:
+    """
+    Attaches the shared response cache to a chat model, if LLM_CACHE_AGENTS enables it for
+    this agent. Only temperature-0 models are cached, since their output is reproducible.
+
+    Args:
+        llm: A model returned by get_chat_model
+        agent_name: Name of the agent using the model, e.g. 'reasoning_agent'
+
+    Returns:
+        A copy of the model that reads and writes the cache, or the model unchanged
+    """
+    if not isinstance(llm, BaseChatModel) or not llm_cache_enabled(agent_name):
+        return llm
+    if getattr(llm, "temperature", None) != 0:
+        return llm
+    return llm.model_copy(update={"cache": get_llm_cache().for_model(llm)})
+
+
+def with_cascade(llm: BaseChatModel, agent_name: str, small_model_name: Optional[str],
+                 format_output: Dict) -> BaseChatModel:
+    """
+    Puts a small model in front of an agent's model: the small model answers first, and
+    the call is escalated to llm only when that answer fails the checks in cascade.py.
+
+    Args:
+        llm: The agent's model, as returned by get_chat_model (and with_llm_cache)
+        agent_name: Name of the agent using the model, e.g. 'reasoning_agent'
+        small_model_name: The small model; empty or None disables the cascade
+        format_output: The agent's output schema
+
+    Returns:
+        A CascadeChatModel, or llm unchanged
+    """
+    if not small_model_name or small_model_name == getattr(llm, "model", None):
+        return llm
+    small_format = with_confidence(format_output)
+    small_llm = with_llm_cache(get_chat_model(model_name=small_model_name, format_output=small_format), agent_name)
+    return CascadeChatModel(small_llm=small_llm, large_llm=llm, small_format=small_format, agent_name=agent_name)
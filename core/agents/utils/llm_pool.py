@@ -0,0 +1,139 @@
+"""
+Shared HTTP connection pools for chat model backends.
+
+Every ChatOllama/ChatOpenAI normally opens its own HTTP client, so each new model object
+starts from cold connections. This module keeps one keep-alive pool per backend URL, which
+llm_factory hands to every model talking to that backend, and counts the traffic going
+through each pool.
+
+The connections live in the pool's transport (PooledTransport), which serves both sync and
+async clients. ChatOllama builds its own clients from client_kwargs, so it is given the
+transport rather than ready-made clients; every client built on it shares its connections.
+"""
+import os
+import threading
+import httpx
+from ollama import AsyncClient, Client
+
+# Pool sizing, shared by every model talking to the same backend
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "32"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "16"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "120"))
+# Seconds a backend may go silent (no connection, no next chunk of a streamed answer) before
+# the call fails, which also gets the host ejected by the balancer; 0 waits forever. Leave
+# room for a model load: the first chunk only comes once the model is loaded
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "300")) or None
+# Seconds to wait for a connection to a backend
+LLM_POOL_CONNECT_TIMEOUT = float(os.getenv("LLM_POOL_CONNECT_TIMEOUT", "10"))
+
+_pools: dict[tuple[str, str], "BackendPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class PooledTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    One sync and one async connection pool behind a single transport, counting requests
+    and server errors.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._sync = httpx.HTTPTransport(limits=limits)
+        self._async = httpx.AsyncHTTPTransport(limits=limits)
+
+    def _count(self, response: httpx.Response = None):
+        # Status is known once headers arrive, which for streamed chat responses is before the body
+        with self._lock:
+            self.requests += 1
+            if response is None or response.status_code >= 500:
+                self.errors += 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            response = self._sync.handle_request(request)
+        except Exception:
+            self._count()
+            raise
+        self._count(response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            response = await self._async.handle_async_request(request)
+        except Exception:
+            self._count()
+            raise
+        self._count(response)
+        return response
+
+    def stats(self) -> dict:
+        # httpx doesn't expose its pools publicly, so peek when we can
+        connections = sum(len(getattr(getattr(transport, "_pool", None), "connections", []))
+                          for transport in (self._sync, self._async))
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "open_connections": connections}
+
+    def close(self):
+        self._sync.close()
+
+    async def aclose(self):
+        await self._async.aclose()
+
+
+class BackendPool:
+    """
+    The connection pool of one backend, with a sync and an async client using it.
+    """
+
+    def __init__(self, provider: str, base_url: str):
+        self.provider = provider
+        self.base_url = base_url
+        self.transport = PooledTransport(httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+        ))
+        # What a client needs to send its requests through this pool
+        timeout = httpx.Timeout(LLM_POOL_TIMEOUT, connect=LLM_POOL_CONNECT_TIMEOUT) if LLM_POOL_TIMEOUT else None
+        self.client_kwargs = {"transport": self.transport, "timeout": timeout}
+
+        if provider == "ollama":
+            self.client = Client(host=base_url, **self.client_kwargs)
+            self.async_client = AsyncClient(host=base_url, **self.client_kwargs)
+        else:
+            self.client = httpx.Client(**self.client_kwargs)
+            self.async_client = httpx.AsyncClient(**self.client_kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider,
+            "base_url": self.base_url,
+            **self.transport.stats(),
+            "max_connections": LLM_POOL_MAX_CONNECTIONS,
+        }
+
+
+def get_backend_pool(provider: str, base_url: str) -> BackendPool:
+    """
+    Returns the shared pool for a backend, creating it on first use.
+
+    Args:
+        provider: 'ollama' or 'openai'
+        base_url: URL of the backend, e.g. 'http://localhost:11434'
+    """
+    key = (provider, base_url)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BackendPool(provider, base_url)
+        return _pools[key]
+
+
+def llm_pool_stats() -> list[dict]:
+    """
+    Returns request and connection counters for every backend pool.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
@@ -0,0 +1,255 @@
+"""
+Model-affinity scheduling of calls to an Ollama host.
+
+The agents can each use a different model (CLAIM_DECOMPOSER_MODEL, RESEARCH_AGENT_MODEL,
+REASONING_AGENT_MODEL, VERDICT_AGENT_MODEL). When a host can't hold them all in memory,
+interleaved requests make it unload one model and load another over and over, and every
+swap costs seconds. With OLLAMA_MODEL_AFFINITY on, each host gets a ModelScheduler, which
+runs one model at a time:
+
+    - calls for the active model start right away, up to the host's parallel slots;
+    - calls for other models wait in a queue per model;
+    - once the active model has no more calls, the model whose call has waited longest
+      becomes active;
+    - a call waiting longer than OLLAMA_SWAP_MAX_WAIT seconds stops the active model
+      from taking new calls, so a busy model can't starve the others.
+
+Swaps, the load time Ollama reports for the first call after each swap, and queue wait
+times are kept in stats().
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Optional
+
+OLLAMA_MODEL_AFFINITY = os.getenv("OLLAMA_MODEL_AFFINITY", "false").lower() == "true"
+# Longest a call waits for its model before the active model stops taking new calls
+OLLAMA_SWAP_MAX_WAIT = float(os.getenv("OLLAMA_SWAP_MAX_WAIT", "10"))
+
+
+class _Waiter:
+    """
+    A queued call, woken from any thread when its model's turn comes.
+    """
+
+    def __init__(self, model: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.model = model
+        self.queued_at = time.monotonic()
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> bool:
+        """
+        Returns False if the caller is gone (its event loop closed).
+        """
+        if self.loop is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            return False
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ModelScheduler:
+    """
+    Admits the calls to one host so that it runs one model at a time.
+
+    Args:
+        name: Name shown in the stats, e.g. the host's URL
+        slots: Calls the host runs at once (its OLLAMA_NUM_PARALLEL)
+        max_wait: Starvation bound in seconds. Defaults to OLLAMA_SWAP_MAX_WAIT
+    """
+
+    def __init__(self, name: str, slots: int, max_wait: float = None):
+        self.name = name
+        self.slots = max(1, slots)
+        self.max_wait = OLLAMA_SWAP_MAX_WAIT if max_wait is None else max_wait
+        self.active: Optional[str] = None
+        self.running = 0
+        self._queues: dict[str, deque[_Waiter]] = {}
+        self._lock = threading.Lock()
+        # Set when a call for another model has waited too long: the active model drains
+        self._draining = False
+        # Model swapped in whose first call hasn't finished, so its load time isn't known
+        self._pending_swap: Optional[str] = None
+        self._stats = {"calls": 0, "queued": 0, "swaps": 0, "forced_swaps": 0,
+                       "total_wait_seconds": 0.0, "max_wait_seconds": 0.0, "measured_loads": 0,
+                       "total_load_seconds": 0.0, "max_load_seconds": 0.0, "last_load_seconds": 0.0}
+
+    def _oldest_waiter(self) -> Optional[_Waiter]:
+        heads = [queue[0] for queue in self._queues.values() if queue]
+        return min(heads, key=lambda waiter: waiter.queued_at) if heads else None
+
+    def _check_starvation(self, now: float):
+        if self._draining:
+            return
+        for model, queue in self._queues.items():
+            if model != self.active and queue and now - queue[0].queued_at > self.max_wait:
+                self._draining = True
+                self._stats["forced_swaps"] += 1
+                return
+
+    def _switch(self, model: str):
+        if self.active is not None and model != self.active:
+            self._stats["swaps"] += 1
+            self._pending_swap = model
+        self.active = model
+        self._draining = False
+
+    def _admit(self, waiter: _Waiter, now: float):
+        """Starts a call; the caller holds the lock."""
+        self.running += 1
+        waited = now - waiter.queued_at
+        self._stats["total_wait_seconds"] += waited
+        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def _dispatch(self, now: float) -> list[_Waiter]:
+        """
+        Returns the queued calls that may start now; the caller holds the lock.
+        """
+        self._check_starvation(now)
+        if self.active is None or (self.running == 0 and (self._draining or not self._queues.get(self.active))):
+            oldest = self._oldest_waiter()
+            if oldest is None:
+                self._draining = False
+                return []
+            self._switch(oldest.model)
+        if self._draining:
+            return []
+        queue = self._queues.get(self.active)
+        started = []
+        while queue and self.running < self.slots:
+            waiter = queue.popleft()
+            self._admit(waiter, now)
+            started.append(waiter)
+        return started
+
+    def _wake(self, waiters: list[_Waiter]):
+        for waiter in waiters:
+            if not waiter.wake():
+                self.release(waiter.model)
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """
+        Queues a call, and starts whatever may run now. Returns whether the call started.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            self._queues.setdefault(waiter.model, deque()).append(waiter)
+            started = self._dispatch(waiter.queued_at)
+            if waiter not in started:
+                self._stats["queued"] += 1
+        self._wake([other for other in started if other is not waiter])
+        return waiter in started
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """
+        Takes a call that gave up out of its queue. Returns False if it had already been
+        started, in which case the caller must release it.
+        """
+        with self._lock:
+            queue = self._queues.get(waiter.model)
+            if not queue or waiter not in queue:
+                return False
+            queue.remove(waiter)
+            started = self._dispatch(time.monotonic())
+        self._wake(started)
+        return True
+
+    def release(self, model: str, response: Any = None):
+        """
+        Ends a call, and starts the queued calls that may run next.
+
+        Args:
+            model: The call's model
+            response: The call's final Ollama response, which reports the model's load time
+        """
+        with self._lock:
+            self.running -= 1
+            now = time.monotonic()
+            if self._pending_swap == model:
+                self._pending_swap = None
+                load_duration = response.get("load_duration") if hasattr(response, "get") else None
+                if load_duration:
+                    seconds = load_duration / 1e9
+                    self._stats["measured_loads"] += 1
+                    self._stats["total_load_seconds"] += seconds
+                    self._stats["max_load_seconds"] = max(self._stats["max_load_seconds"], seconds)
+                    self._stats["last_load_seconds"] = seconds
+            started = self._dispatch(now)
+        self._wake(started)
+
+    def acquire(self, model: str):
+        """
+        Blocks until a call to model may start.
+        """
+        waiter = _Waiter(model)
+        if not self._enqueue(waiter):
+            waiter.event.wait()
+
+    async def aacquire(self, model: str):
+        """
+        Waits, without blocking the event loop, until a call to model may start.
+        """
+        waiter = _Waiter(model, asyncio.get_running_loop())
+        if self._enqueue(waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not self._cancel(waiter):
+                self.release(model)
+            raise
+
+    @contextmanager
+    def slot(self, model: str):
+        """
+        Holds a slot for a call to model. Set the slot's 'response' to the call's final
+        response so the model's load time is recorded.
+        """
+        self.acquire(model)
+        call = {"response": None}
+        try:
+            yield call
+        finally:
+            self.release(model, call["response"])
+
+    @asynccontextmanager
+    async def aslot(self, model: str):
+        """
+        Async version of slot.
+        """
+        await self.aacquire(model)
+        call = {"response": None}
+        try:
+            yield call
+        finally:
+            self.release(model, call["response"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            queued = {model: len(queue) for model, queue in self._queues.items() if queue}
+        admitted = stats["calls"] - sum(queued.values())
+        return {
+            "name": self.name,
+            "active_model": self.active,
+            "running": self.running,
+            "waiting": queued,
+            **stats,
+            "average_wait_seconds": round(stats["total_wait_seconds"] / admitted, 3) if admitted else 0.0,
+            "average_load_seconds": round(stats["total_load_seconds"] / stats["measured_loads"], 3)
+                                    if stats["measured_loads"] else 0.0,
+        }
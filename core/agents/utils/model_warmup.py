@@ -0,0 +1,229 @@
+"""
+Model warmup and keep-alive for the Ollama hosts.
+
+A model is only loaded into memory by the first call that uses it, so right after a
+deploy the first requests pay every agent model's load time, and a model left idle for
+OLLAMA_KEEP_ALIVE_SECONDS gets unloaded and pays it again. At startup, ModelWarmup loads
+each model the agents use (agent_models) on every host, with the context window their
+calls will get, since Ollama reloads a model whose num_ctx changes. When num_ctx is sized
+per call, that is the bucket of the largest prompt the model's agents send: their system
+prompt plus a full EVIDENCE_TOKEN_BUDGET, so a full reasoning call doesn't reload it. Afterwards it pings
+the models every OLLAMA_KEEPALIVE_INTERVAL seconds:
+
+    - a model still loaded on a host is pinged with the num_ctx it is loaded with, which
+      resets its keep-alive timer without reloading it;
+    - a model that hasn't warmed on a host yet (the host was down, the load failed) is
+      warmed again;
+    - a model the host unloaded to make room for another isn't reloaded, so the pings
+      never fight a host that can't hold every model at once.
+
+A model is ready once it has warmed on at least one host; readiness() reports it per model
+and host for the /ready endpoint.
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+from core.agents.utils.evidence_compression import EVIDENCE_TOKEN_BUDGET
+from core.agents.utils.llm_factory import MODEL_PROVIDERS, OLLAMA_NUM_CTX
+from core.agents.utils.llm_pool import get_backend_pool
+from core.agents.utils.ollama_balancer import ollama_base_urls
+from core.agents.utils.tokens import (MESSAGE_OVERHEAD_TOKENS, OLLAMA_CTX_BUCKETS, context_bucket, context_sizer,
+                                      estimate_tokens, needed_tokens)
+
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+# Seconds between keep-alive pings; keep it under OLLAMA_KEEP_ALIVE_SECONDS. 0 disables them
+OLLAMA_KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "120"))
+# Longest a model may take to load before its warmup counts as failed (and is retried)
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+# num_ctx models are warmed with when it is sized per call; unset sizes it to the agents' prompts
+OLLAMA_WARMUP_NUM_CTX = int(os.getenv("OLLAMA_WARMUP_NUM_CTX") or 0)
+
+# The agents' model settings, with the system prompt each one sends; the small models only
+# exist when a cascade is configured
+AGENT_MODEL_VARS = {
+    "CLAIM_DECOMPOSER_MODEL": "claim_decomposer",
+    "RESEARCH_AGENT_MODEL": "research_agent",
+    "REASONING_AGENT_MODEL": "reasoning_agent",
+    "REASONING_AGENT_SMALL_MODEL": "reasoning_agent",
+    "VERDICT_AGENT_MODEL": "verdict_agent",
+    "VERDICT_AGENT_SMALL_MODEL": "verdict_agent",
+}
+PROMPTS_DIR = Path(__file__).parents[1] / "prompts"
+# Model the agents fall back to when their setting is unset
+DEFAULT_MODEL = "mistral-nemo"
+
+
+def agent_model(var: str) -> Optional[str]:
+    """
+    Returns the model an agent setting resolves to, or None for an unset small model.
+    """
+    return os.getenv(var) or (None if "_SMALL_" in var else DEFAULT_MODEL)
+
+
+def agent_models(extra: Iterable[str] = ()) -> list[str]:
+    """
+    Returns the distinct Ollama models the agents are configured with.
+
+    Args:
+        extra: Models used besides the agent settings, e.g. one fixed in code
+    """
+    models = []
+    for var in AGENT_MODEL_VARS:
+        model = agent_model(var)
+        if model:
+            models.append(model)
+    models.extend(extra)
+    return [model for model in dict.fromkeys(models) if MODEL_PROVIDERS.get(model) == "ollama"]
+
+
+def agent_prompt_tokens(agent: str) -> int:
+    """
+    Estimates the largest prompt an agent sends: its system prompt, plus evidence (or text
+    to check) up to EVIDENCE_TOKEN_BUDGET.
+    """
+    system_prompt = (PROMPTS_DIR / f"{agent}_system_prompt.txt").read_text()
+    return estimate_tokens(system_prompt) + EVIDENCE_TOKEN_BUDGET + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def warmup_num_ctx(model: str = None) -> int:
+    """
+    Returns the num_ctx the agents' calls to model will get, so warming doesn't lead to a
+    reload: with per-call sizing, the bucket of the largest prompt of the agents using
+    it, or of any agent for a model none of them is configured with.
+    """
+    if OLLAMA_NUM_CTX != "auto":
+        return int(OLLAMA_NUM_CTX)
+    if OLLAMA_WARMUP_NUM_CTX:
+        return OLLAMA_WARMUP_NUM_CTX
+    agents = {agent for var, agent in AGENT_MODEL_VARS.items() if model and agent_model(var) == model}
+    needed = max(needed_tokens(agent_prompt_tokens(agent)) for agent in agents or set(AGENT_MODEL_VARS.values()))
+    return context_bucket(needed, max(OLLAMA_CTX_BUCKETS))
+
+
+class ModelWarmup:
+    """
+    Loads models on Ollama hosts and keeps them loaded.
+
+    Args:
+        models: Models to warm. Defaults to agent_models()
+        base_urls: Hosts to warm them on. Defaults to ollama_base_urls()
+        interval: Seconds between keep-alive pings. Defaults to OLLAMA_KEEPALIVE_INTERVAL
+        timeout: Longest a load may take. Defaults to OLLAMA_WARMUP_TIMEOUT
+    """
+
+    def __init__(self, models: list[str] = None, base_urls: list[str] = None,
+                 interval: float = None, timeout: float = None):
+        self.models = agent_models() if models is None else models
+        self.base_urls = base_urls or ollama_base_urls()
+        self.interval = OLLAMA_KEEPALIVE_INTERVAL if interval is None else interval
+        self.timeout = OLLAMA_WARMUP_TIMEOUT if timeout is None else timeout
+        self.started = False
+        # (host, model) -> state of the model on that host
+        self._status: dict[tuple[str, str], dict] = {
+            (base_url, model): {"warm": False, "loaded": False, "num_ctx": None, "load_seconds": None,
+                                "warmed_at": None, "last_ping": None, "pings": 0, "error": None}
+            for base_url in self.base_urls for model in self.models
+        }
+
+    def _client(self, base_url: str):
+        return get_backend_pool("ollama", base_url).async_client
+
+    async def _load(self, base_url: str, model: str, num_ctx: int):
+        """
+        Sends an empty prompt, which makes Ollama load the model without generating anything.
+        """
+        status = self._status[(base_url, model)]
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self._client(base_url).generate(model=model, prompt="", options={"num_ctx": num_ctx}),
+                self.timeout)
+        except Exception as e:
+            status.update(loaded=False, error=f"{type(e).__name__}: {e}")
+            print(f"Warmup of {model} on {base_url} failed: {status['error']}")
+            return
+        if OLLAMA_NUM_CTX == "auto":
+            # The context sizer keeps the model's calls on the window it is loaded with
+            context_sizer.num_ctx(model, num_ctx)
+        status.update(loaded=True, num_ctx=num_ctx, last_ping=time.time(), pings=status["pings"] + 1, error=None)
+        if not status["warm"]:
+            load_duration = response.get("load_duration") if hasattr(response, "get") else None
+            status.update(warm=True, warmed_at=time.time(),
+                          load_seconds=round(load_duration / 1e9 if load_duration else time.monotonic() - started, 3))
+            print(f"Warmed up {model} on {base_url} (num_ctx {num_ctx}) in {status['load_seconds']}s")
+
+    async def _warm_host(self, base_url: str):
+        # One model at a time, so a host isn't asked to load all of them at once
+        for model in self.models:
+            if not self._status[(base_url, model)]["warm"]:
+                await self._load(base_url, model, warmup_num_ctx(model))
+
+    async def warm(self):
+        """
+        Loads every model not warmed yet, on all hosts at once.
+        """
+        self.started = True
+        await asyncio.gather(*(self._warm_host(base_url) for base_url in self.base_urls))
+
+    async def _loaded_models(self, base_url: str) -> Optional[dict[str, Optional[int]]]:
+        """
+        Returns the models the host has loaded, with their num_ctx if it reports one,
+        or None if the host can't be reached.
+        """
+        try:
+            response = await asyncio.wait_for(self._client(base_url).ps(), self.timeout)
+        except Exception as e:
+            print(f"Keep-alive: can't list the models loaded on {base_url}: {type(e).__name__}: {e}")
+            return None
+        return {model.model or model.name: model.context_length for model in response.models}
+
+    async def _ping_host(self, base_url: str):
+        loaded = await self._loaded_models(base_url)
+        if loaded is None:
+            for model in self.models:
+                self._status[(base_url, model)]["loaded"] = False
+            return
+        for model in self.models:
+            status = self._status[(base_url, model)]
+            if not status["warm"]:
+                await self._load(base_url, model, warmup_num_ctx(model))
+            elif model in loaded:
+                await self._load(base_url, model, loaded[model] or status["num_ctx"] or warmup_num_ctx(model))
+            else:
+                # Unloaded to make room for another model, or after the host restarted
+                status["loaded"] = False
+
+    async def ping(self):
+        """
+        Pings the models each host still has loaded, and warms those not warmed yet.
+        """
+        await asyncio.gather(*(self._ping_host(base_url) for base_url in self.base_urls))
+
+    async def run(self):
+        """
+        Warms the models, then keeps them loaded until cancelled. Meant to run as a
+        background task for the lifetime of the app.
+        """
+        await self.warm()
+        if self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.ping()
+
+    def readiness(self) -> dict:
+        """
+        Returns whether every model has warmed on at least one host, with each model's
+        state per host.
+        """
+        models = {}
+        for model in self.models:
+            hosts = {base_url: dict(self._status[(base_url, model)]) for base_url in self.base_urls}
+            models[model] = {"ready": any(host["warm"] for host in hosts.values()), "hosts": hosts}
+        return {
+            "ready": self.started and all(model["ready"] for model in models.values()),
+            "keepalive_interval": self.interval,
+            "models": models,
+        }
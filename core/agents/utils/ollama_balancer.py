@@ -0,0 +1,317 @@
+"""
+Load balancing of chat calls over several Ollama hosts.
+
+Set OLLAMA_BASE_URLS to a comma-separated list of hosts and llm_factory builds
+BalancedChatOllama models, which pick a host for every call:
+
+    - hosts that recently failed or timed out are ejected for OLLAMA_EJECT_SECONDS;
+    - hosts that already have the model loaded are preferred, so we don't stall on a
+      model swap, as long as they aren't saturated (OLLAMA_BACKEND_CONCURRENCY calls);
+    - among the rest, the host with the fewest calls in flight wins.
+
+A call that fails before producing any output is retried once on another host.
+Which models a host has loaded is learned from successful calls and from the periodic
+health check (run_health_checks), which also brings ejected hosts back.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, List, Mapping, Optional, Union
+import httpx
+from langchain_core.messages import BaseMessage
+from ollama import ResponseError
+from core.agents.utils.llm_pool import BackendPool, get_backend_pool
+from core.agents.utils.model_scheduler import OLLAMA_MODEL_AFFINITY, ModelScheduler
+from core.agents.utils.tokens import OLLAMA_KEEP_ALIVE_SECONDS, ContextSizedChatOllama
+
+# Seconds a failing host is left out of rotation
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+# Calls a host takes at once before an idle host without the model loaded is preferred;
+# match it to OLLAMA_NUM_PARALLEL on the hosts
+OLLAMA_BACKEND_CONCURRENCY = int(os.getenv("OLLAMA_BACKEND_CONCURRENCY", "4"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "5"))
+
+# Errors that mean the host, rather than the request, is at fault
+BACKEND_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+def ollama_base_urls() -> list[str]:
+    """
+    Returns the Ollama hosts listed in OLLAMA_BASE_URLS, or the single OLLAMA_BASE_URL.
+    """
+    base_urls = os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    return [url.strip() for url in base_urls.split(",") if url.strip()]
+
+
+def is_backend_error(error: Exception) -> bool:
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, BACKEND_ERRORS)
+
+
+class Backend:
+    """
+    One Ollama host: its connection pool, load and health.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.pool: BackendPool = get_backend_pool("ollama", base_url)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        # model name -> time until which we assume it stays loaded
+        self.loaded_models: dict[str, float] = {}
+        # Runs one model at a time on the host, if OLLAMA_MODEL_AFFINITY is on
+        self.scheduler = ModelScheduler(base_url, slots=OLLAMA_BACKEND_CONCURRENCY)
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def has_model(self, model: str, now: float) -> bool:
+        return self.loaded_models.get(model, 0) > now
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "base_url": self.base_url,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.is_ejected(now),
+            "loaded_models": sorted(model for model, until in self.loaded_models.items() if until > now),
+            **({"scheduler": self.scheduler.stats()} if OLLAMA_MODEL_AFFINITY else {}),
+        }
+
+
+class OllamaBalancer:
+    """
+    Picks an Ollama host for each call and keeps track of host load and health.
+    """
+
+    def __init__(self, base_urls: list[str]):
+        self.backends = [Backend(base_url) for base_url in base_urls]
+        self._lock = threading.Lock()
+        # Breaks ties between equally good hosts so load spreads evenly
+        self._turn = itertools.count()
+
+    def choose(self, model: str, exclude: tuple[Backend, ...] = ()) -> Optional[Backend]:
+        """
+        Returns the best host for a call to model, or None if every host is excluded.
+        """
+        now = time.monotonic()
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        healthy = [backend for backend in candidates if not backend.is_ejected(now)]
+        if not healthy:
+            # Everything is ejected: try the host that has been out the longest
+            return min(candidates, key=lambda backend: backend.ejected_until)
+
+        turn = next(self._turn)
+        return min(
+            healthy,
+            key=lambda backend: (
+                backend.in_flight >= OLLAMA_BACKEND_CONCURRENCY,
+                not backend.has_model(model, now),
+                backend.in_flight,
+                (self.backends.index(backend) - turn) % len(self.backends),
+            ),
+        )
+
+    @contextmanager
+    def route(self, model: str, exclude: tuple[Backend, ...] = ()):
+        """
+        Picks a host and counts the call against it while it runs. Failures that point
+        at the host eject it; successes mark the model as loaded there.
+        """
+        # With model affinity the call may then wait in the host's scheduler, so it only
+        # counts as load once admitted (see running)
+        counted = not OLLAMA_MODEL_AFFINITY
+        with self._lock:
+            backend = self.choose(model, exclude)
+            if counted:
+                backend.in_flight += 1
+            backend.requests += 1
+        try:
+            yield backend
+        except Exception as e:
+            if is_backend_error(e):
+                self.eject(backend)
+            raise
+        else:
+            with self._lock:
+                backend.failures = 0
+                backend.loaded_models[model] = time.monotonic() + OLLAMA_KEEP_ALIVE_SECONDS
+        finally:
+            if counted:
+                with self._lock:
+                    backend.in_flight -= 1
+
+    @contextmanager
+    def running(self, backend: Backend):
+        """
+        Counts a call against a host while it runs, for calls the host's model scheduler
+        admitted after route picked the host.
+        """
+        with self._lock:
+            backend.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                backend.in_flight -= 1
+
+    def eject(self, backend: Backend):
+        with self._lock:
+            backend.failures += 1
+            backend.ejected_until = time.monotonic() + OLLAMA_EJECT_SECONDS
+        print(f"Ejecting Ollama backend {backend.base_url} for {OLLAMA_EJECT_SECONDS}s")
+
+    async def check_backends(self):
+        """
+        Asks every host which models it has loaded. Hosts that answer are put back in
+        rotation; hosts that don't are ejected.
+        """
+        async def check(backend: Backend):
+            try:
+                response = await asyncio.wait_for(backend.pool.async_client.ps(), OLLAMA_HEALTH_TIMEOUT)
+            except Exception as e:
+                print(f"Health check failed for Ollama backend {backend.base_url}: {e}")
+                self.eject(backend)
+                return
+            until = time.monotonic() + OLLAMA_KEEP_ALIVE_SECONDS
+            with self._lock:
+                backend.ejected_until = 0.0
+                backend.loaded_models = {model.model: until for model in response.models}
+
+        await asyncio.gather(*(check(backend) for backend in self.backends))
+
+    async def run_health_checks(self, interval: float = OLLAMA_HEALTH_INTERVAL):
+        """
+        Runs check_backends every interval seconds until cancelled.
+        """
+        while True:
+            await self.check_backends()
+            await asyncio.sleep(interval)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
+
+
+_balancers: dict[tuple[str, ...], OllamaBalancer] = {}
+_balancers_lock = threading.Lock()
+
+
+def get_ollama_balancer(base_urls: list[str]) -> OllamaBalancer:
+    """
+    Returns the shared balancer for a set of hosts, creating it on first use.
+    """
+    key = tuple(base_urls)
+    with _balancers_lock:
+        if key not in _balancers:
+            _balancers[key] = OllamaBalancer(base_urls)
+        return _balancers[key]
+
+
+def ollama_balancer_stats() -> list[dict]:
+    """
+    Returns load and health of every host behind a balancer.
+    """
+    with _balancers_lock:
+        balancers = list(_balancers.values())
+    return [stats for balancer in balancers for stats in balancer.stats()]
+
+
+class BalancedChatOllama(ContextSizedChatOllama):
+    """
+    ChatOllama that sends each call to a host chosen by the balancer for base_urls.
+    """
+
+    base_urls: list[str]
+
+    @property
+    def balancer(self) -> OllamaBalancer:
+        return get_ollama_balancer(self.base_urls)
+
+    @contextmanager
+    def _model_slot(self, backend: Backend):
+        # Waits for the host to run this model, if model affinity is on
+        if not OLLAMA_MODEL_AFFINITY:
+            yield {}
+            return
+        with backend.scheduler.slot(self.model) as call, self.balancer.running(backend):
+            yield call
+
+    @asynccontextmanager
+    async def _amodel_slot(self, backend: Backend):
+        if not OLLAMA_MODEL_AFFINITY:
+            yield {}
+            return
+        async with backend.scheduler.aslot(self.model) as call:
+            with self.balancer.running(backend):
+                yield call
+
+    def _create_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Union[Mapping[str, Any], str]]:
+        chat_params = self._chat_params(messages, stop, **kwargs)
+        tried = ()
+        while True:
+            started = False
+            try:
+                with self.balancer.route(self.model, exclude=tried) as backend:
+                    tried += (backend,)
+                    with self._model_slot(backend) as call:
+                        if chat_params["stream"]:
+                            for part in backend.pool.client.chat(**chat_params):
+                                started = True
+                                call["response"] = part
+                                yield part
+                        else:
+                            call["response"] = backend.pool.client.chat(**chat_params)
+                            yield call["response"]
+                return
+            except Exception as e:
+                # Retry once elsewhere, unless output already reached the caller
+                if started or len(tried) > 1 or not is_backend_error(e) \
+                        or self.balancer.choose(self.model, exclude=tried) is None:
+                    raise
+
+    async def _acreate_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Union[Mapping[str, Any], str]]:
+        chat_params = self._chat_params(messages, stop, **kwargs)
+        tried = ()
+        while True:
+            started = False
+            try:
+                with self.balancer.route(self.model, exclude=tried) as backend:
+                    tried += (backend,)
+                    async with self._amodel_slot(backend) as call:
+                        if chat_params["stream"]:
+                            async for part in await backend.pool.async_client.chat(**chat_params):
+                                started = True
+                                call["response"] = part
+                                yield part
+                        else:
+                            call["response"] = await backend.pool.async_client.chat(**chat_params)
+                            yield call["response"]
+                return
+            except Exception as e:
+                # Retry once elsewhere, unless output already reached the caller
+                if started or len(tried) > 1 or not is_backend_error(e) \
+                        or self.balancer.choose(self.model, exclude=tried) is None:
+                    raise
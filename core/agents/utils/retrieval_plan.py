@@ -0,0 +1,114 @@
+"""
+Deterministic retrieval plans for the research agent's retrieval-first mode.
+
+Most claims are researched the same way: look the subject up on Wikipedia and search the
+web for the claim. Rather than asking the LLM to write those calls (one call to pick the
+tools, and another to see the results and stop), the plan is derived from the claim text:
+
+    - wikipedia: the first run of capitalized words (the claim's likely subject), or
+      the claim's keywords when there is none;
+    - web_search: the claim itself, with the topic guessed from its wording.
+
+Claims the plan can't serve, such as arithmetic for a calculator or anything needing a
+user-defined tool, are left to the LLM (see needs_tool_routing).
+"""
+import re
+from langchain_core.messages import ToolCall
+from core.agents.utils.bm25 import STOPWORDS, tokenize
+
+# Tools that do arithmetic, and so need the LLM to write the expression
+MATH_TOOLS = {"calculator", "wolframalpha"}
+
+# Words suggesting a claim is about recent events or markets
+NEWS_WORDS = frozenset("""
+today yesterday tonight tomorrow recently recent latest breaking announced announces
+announcement week month current currently newly election elected resigned resigns
+launched launches dies died killed arrested
+""".split())
+FINANCE_WORDS = frozenset("""
+stock stocks shares share market markets nasdaq dow s&p index inflation interest rate
+rates earnings revenue profit profits dividend ipo bitcoin crypto cryptocurrency
+valuation bond bonds treasury fed gdp
+""".split())
+
+# Arithmetic in a claim: an operator between numbers, or words relating quantities
+_NUMBER = re.compile(r"\d[\d,.]*")
+_OPERATOR = re.compile(r"\d\s*[-+*/x×÷^]\s*\d")
+_MATH_WORDS = re.compile(
+    r"%|\b(percent|per cent|twice|triple|double|half|times|sum|total|average|ratio|"
+    r"difference|increase[sd]?|decrease[sd]?|more than|less than|fewer than)\b", re.IGNORECASE)
+_CAPITALIZED_RUN = re.compile(r"\b[A-Z][\w'’.-]*(?:\s+(?:of|the|de|von|van|and|&)?\s*[A-Z][\w'’.-]*)*")
+
+
+def needs_math(claim: str) -> bool:
+    """
+    Whether a claim makes a numeric statement a calculator could check.
+    """
+    numbers = _NUMBER.findall(claim)
+    if not numbers:
+        return False
+    return len(numbers) >= 2 or bool(_OPERATOR.search(claim)) or bool(_MATH_WORDS.search(claim))
+
+
+def needs_tool_routing(claim: str, tool_names: set[str], has_user_tools: bool = False) -> bool:
+    """
+    Whether a claim should be researched by the LLM choosing tools, rather than by a
+    retrieval plan.
+
+    Args:
+        claim: The claim to research
+        tool_names: Names of the tools available
+        has_user_tools: Whether the user supplied their own tools
+
+    Returns:
+        True if the claim needs math and a math tool is available, a user-defined tool
+        may be relevant, or no planned tool is available
+    """
+    if has_user_tools:
+        return True
+    if tool_names & MATH_TOOLS and needs_math(claim):
+        return True
+    return not tool_names & set(PLANNED_TOOLS)
+
+
+def search_topic(claim: str) -> str:
+    """
+    Guesses the web_search topic of a claim: 'finance', 'news' or 'general'.
+    """
+    words = set(re.findall(r"[\w&]+", claim.lower()))
+    if words & FINANCE_WORDS:
+        return "finance"
+    if words & NEWS_WORDS or re.search(r"\b20[2-9]\d\b", claim):
+        return "news"
+    return "general"
+
+
+def subject_query(claim: str) -> str:
+    """
+    The claim's likely subject, for an encyclopedia lookup.
+    """
+    for match in _CAPITALIZED_RUN.finditer(claim):
+        words = match.group().strip(" .'’").split()
+        # Drop a capitalized sentence opener ('The', 'In', ...)
+        while words and words[0].lower() in STOPWORDS:
+            words = words[1:]
+        if words:
+            return re.sub(r"['’]s$", "", " ".join(words))
+    return " ".join(tokenize(claim)) or claim
+
+
+# Tool name -> args of its planned call for a claim
+PLANNED_TOOLS = {
+    "wikipedia": lambda claim: {"query_str": subject_query(claim)},
+    "web_search": lambda claim: {"query": claim.strip(), "topic": search_topic(claim)},
+}
+
+
+def retrieval_calls(claim: str, tool_names: set[str]) -> list[ToolCall]:
+    """
+    Returns the planned tool calls for a claim, for the tools that are available.
+    """
+    return [
+        ToolCall(name=name, args=make_args(claim), id=f"retrieval_{i}", type="tool_call")
+        for i, (name, make_args) in enumerate(PLANNED_TOOLS.items()) if name in tool_names
+    ]
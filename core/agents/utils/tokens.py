@@ -0,0 +1,156 @@
+"""
+Token estimation and context window sizing for chat calls.
+
+Ollama allocates the KV cache for the whole num_ctx of a call, and reloads the model
+whenever num_ctx changes. So rather than asking for the largest window every time, each
+call gets the smallest of a few fixed buckets that fits its messages, and a model stays on
+the bucket it has loaded while it is still loaded (see ContextSizer). A longer prompt moves
+it up to a larger bucket; it only moves back down once Ollama would have unloaded it anyway.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional, Sequence
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_ollama import ChatOllama
+
+# Context window sizes calls are rounded up to
+OLLAMA_CTX_BUCKETS = [int(size) for size in os.getenv("OLLAMA_CTX_BUCKETS", "4096,8192,16384,32768,128000").split(",")]
+# Tokens left for the answer when the model doesn't set num_predict
+OLLAMA_CTX_OUTPUT_RESERVE = int(os.getenv("OLLAMA_CTX_OUTPUT_RESERVE", "1024"))
+# Estimates are rough; a prompt over num_ctx gets silently truncated by Ollama, so err large
+OLLAMA_CTX_MARGIN = float(os.getenv("OLLAMA_CTX_MARGIN", "1.25"))
+# How long Ollama keeps an idle model loaded (its keep_alive, 5 minutes by default)
+OLLAMA_KEEP_ALIVE_SECONDS = float(os.getenv("OLLAMA_KEEP_ALIVE_SECONDS", "300"))
+
+# Chat templates add a few tokens around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of English text, about 4 characters per token.
+    """
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(messages: Sequence[BaseMessage], tools: Any = None, format_output: Any = None) -> int:
+    """
+    Estimates the prompt tokens of a chat call: the messages, their tool calls, and the
+    tool and output schemas, which are also sent to the model.
+    """
+    tokens = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        tokens += estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            tokens += estimate_tokens(json.dumps(tool_calls, default=str))
+    for schema in (tools, format_output):
+        if schema and not isinstance(schema, str):
+            tokens += estimate_tokens(json.dumps(schema, default=str))
+    return tokens
+
+
+def context_bucket(tokens: int, limit: int = None, buckets: Sequence[int] = None) -> int:
+    """
+    Returns the smallest bucket holding tokens, or the largest one (capped at limit)
+    if none does.
+    """
+    buckets = sorted(size for size in (buckets or OLLAMA_CTX_BUCKETS) if not limit or size <= limit) \
+        or [limit]
+    for size in buckets:
+        if size >= tokens:
+            return size
+    return buckets[-1]
+
+
+class ContextSizer:
+    """
+    Picks num_ctx per call, keeping each model on the bucket it was last loaded with
+    while it is still loaded, so a shorter prompt doesn't trigger a reload.
+    """
+
+    def __init__(self, buckets: Sequence[int] = None, keep_alive: float = OLLAMA_KEEP_ALIVE_SECONDS):
+        self.buckets = sorted(buckets or OLLAMA_CTX_BUCKETS)
+        self.keep_alive = keep_alive
+        # model -> (num_ctx it is loaded with, time of its last call)
+        self._loaded: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def num_ctx(self, model: str, needed: int, limit: int = None) -> int:
+        """
+        Returns the num_ctx for a call to model that needs `needed` tokens in total.
+        """
+        size = context_bucket(needed, limit, self.buckets)
+        now = time.monotonic()
+        with self._lock:
+            loaded, last_used = self._loaded.get(model, (0, 0.0))
+            if size < loaded and now - last_used < self.keep_alive:
+                size = loaded
+            self._loaded[model] = (size, now)
+        return size
+
+    def stats(self) -> dict[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            return {model: size for model, (size, last_used) in self._loaded.items()
+                    if now - last_used < self.keep_alive}
+
+
+context_sizer = ContextSizer()
+
+
+def needed_tokens(prompt_tokens: int, num_predict: int = None) -> int:
+    """
+    Total context a call needs: its estimated prompt, with margin, plus room for the answer.
+    """
+    reserve = num_predict if num_predict and num_predict > 0 else OLLAMA_CTX_OUTPUT_RESERVE
+    return math.ceil(prompt_tokens * OLLAMA_CTX_MARGIN) + reserve
+
+
+# (estimated prompt tokens, num_ctx) of the call being made in this context, for logging
+_call_size: ContextVar[Optional[tuple[int, int]]] = ContextVar("call_size", default=None)
+
+
+class ContextSizedChatOllama(ChatOllama):
+    """
+    ChatOllama giving each call the smallest context bucket that fits it, up to num_ctx,
+    and logging the token counts of every call.
+    """
+
+    # Buckets to choose from; None always uses num_ctx
+    context_buckets: Optional[List[int]] = None
+
+    def _chat_params(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any):
+        params = super()._chat_params(messages, stop, **kwargs)
+        # Callers passing their own options chose num_ctx themselves
+        if self.context_buckets and "options" not in kwargs:
+            prompt_tokens = estimate_message_tokens(messages, params.get("tools"), params.get("format"))
+            needed = needed_tokens(prompt_tokens, self.num_predict)
+            num_ctx = context_sizer.num_ctx(self.model, needed, self.num_ctx)
+            params["options"]["num_ctx"] = num_ctx
+            _call_size.set((prompt_tokens, num_ctx))
+        return params
+
+    def _log_usage(self, result: ChatResult):
+        size = _call_size.get()
+        _call_size.set(None)
+        usage = getattr(result.generations[0].message, "usage_metadata", None) or {}
+        estimate = f"~{size[0]} estimated, num_ctx {size[1]}" if size else f"num_ctx {self.num_ctx}"
+        print(f"LLM call {self.model}: {usage.get('input_tokens', '?')} prompt tokens ({estimate}), "
+              f"{usage.get('output_tokens', '?')} output tokens")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = super()._generate(messages, stop, run_manager, **kwargs)
+        self._log_usage(result)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self._log_usage(result)
+        return result
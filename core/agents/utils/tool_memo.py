@@ -0,0 +1,157 @@
+"""
+Request-scoped memo of tool calls.
+
+Claims decomposed from the same text often make the same tool call: the same Wikipedia
+page, the same web search worded slightly differently. One ToolCallMemo is shared by every
+claim of a request (processing.stream_query sets it with use_tool_call_memo), and the
+research agent's tools node runs each distinct call once:
+
+    - calls are keyed by tool name and canonicalized args (keys sorted, whitespace
+      collapsed, and case folded for tools whose lookups ignore case);
+    - a call identical to one already answered gets a copy of that answer;
+    - a call identical to one still running waits for it rather than starting another.
+
+Only successful results are kept, so a failed or timed-out call is tried again by the next
+claim that needs it. Nothing outlives the request.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+from langchain_core.messages import ToolCall, ToolMessage
+
+# Tools whose upstream lookups ignore case, so 'Eiffel Tower' and 'eiffel tower' are one call
+CASE_INSENSITIVE_TOOLS = {"wikipedia", "web_search"}
+
+
+class _Abandoned(Exception):
+    """The call being waited on stopped without a result; run it again."""
+
+
+def canonicalize(value: Any, fold_case: bool = False) -> Any:
+    """
+    Normalizes tool args so trivially different calls compare equal.
+    """
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.casefold() if fold_case else value
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item, fold_case) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item, fold_case) for item in value]
+    return value
+
+
+def tool_call_key(call: ToolCall) -> str:
+    fold_case = call["name"] in CASE_INSENSITIVE_TOOLS
+    return json.dumps([call["name"], canonicalize(call["args"], fold_case)], sort_keys=True, default=str)
+
+
+class ToolCallMemo:
+    """
+    Results and in-flight calls of one request, keyed by tool_call_key.
+    """
+
+    def __init__(self):
+        self._results: dict[str, ToolMessage] = {}
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "reused": 0, "coalesced": 0}
+
+    def _claim(self, key: str) -> tuple[Optional[ToolMessage], Optional[Future], bool]:
+        """
+        Returns (stored result, future to wait on, whether the caller must run the call).
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            if key in self._results:
+                self.stats["reused"] += 1
+                return self._results[key], None, False
+            if key in self._in_flight:
+                self.stats["coalesced"] += 1
+                return None, self._in_flight[key], False
+            future = Future()
+            self._in_flight[key] = future
+            return None, future, True
+
+    def _finish(self, key: str, future: Future, result: Any):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if isinstance(result, ToolMessage) and result.status != "error":
+                self._results[key] = result
+        if future.done():
+            return
+        if isinstance(result, ToolMessage):
+            future.set_result(result)
+        else:
+            # Errors and Commands aren't shared; waiters run the call themselves
+            future.set_exception(_Abandoned())
+
+    @staticmethod
+    def _answer(result: Any, call: ToolCall) -> Any:
+        # The same answer, addressed to this call
+        if isinstance(result, ToolMessage):
+            return result.model_copy(update={"tool_call_id": call["id"]})
+        return result
+
+    def run(self, call: ToolCall, run_call: Callable[[], Any]) -> Any:
+        """
+        Runs a tool call through the memo, blocking while an identical call is in flight.
+        """
+        key = tool_call_key(call)
+        while True:
+            stored, future, owner = self._claim(key)
+            if stored is not None:
+                return self._answer(stored, call)
+            if owner:
+                result = None
+                try:
+                    result = run_call()
+                    return result
+                finally:
+                    self._finish(key, future, result)
+            try:
+                return self._answer(future.result(), call)
+            except _Abandoned:
+                continue
+
+    async def arun(self, call: ToolCall, run_call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of run, waiting on in-flight calls without blocking the event loop.
+        """
+        key = tool_call_key(call)
+        while True:
+            stored, future, owner = self._claim(key)
+            if stored is not None:
+                return self._answer(stored, call)
+            if owner:
+                result = None
+                try:
+                    result = await run_call()
+                    return result
+                finally:
+                    # Also on cancellation (e.g. the call timed out), so waiters don't hang
+                    self._finish(key, future, result)
+            try:
+                # Shielded: a waiter giving up must not cancel the future the owner and
+                # the other waiters share
+                return self._answer(await asyncio.shield(asyncio.wrap_future(future)), call)
+            except _Abandoned:
+                continue
+
+
+_memo: ContextVar[Optional[ToolCallMemo]] = ContextVar("tool_call_memo", default=None)
+
+
+def use_tool_call_memo(memo: Optional[ToolCallMemo]):
+    """
+    Makes memo the tool call memo for the current context (e.g. one claim's task) and
+    everything it starts.
+    """
+    _memo.set(memo)
+
+
+def current_tool_call_memo() -> Optional[ToolCallMemo]:
+    return _memo.get()
@@ -0,0 +1,84 @@
+"""
+Tools node for the research agent.
+
+When the model asks for several tools in one step, they run at the same time, so the step
+takes as long as the slowest tool rather than the sum of all of them. Each call gets
+TOOL_CALL_TIMEOUT seconds; a call that runs over is answered with an error ToolMessage,
+so one slow API can't hang the whole research step. Results come back in the order the
+model requested them, regardless of which finished first. Within a request, identical
+calls from different claims are run once (see tool_memo).
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import Literal
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
+from core.agents.utils.tool_memo import current_tool_call_memo
+
+# Seconds a single tool call may take
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# Runs sync tool calls so we can stop waiting on them; a timed-out call keeps its thread
+# until it returns, so leave headroom over the number of calls expected at once
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_THREADS", "32")),
+                               thread_name_prefix="tool-call")
+
+
+def timeout_message(call: ToolCall, timeout: float) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {call['name']} did not respond within {timeout:g} seconds.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+class ConcurrentToolNode(ToolNode):
+    """
+    ToolNode running one step's tool calls concurrently, each with a timeout.
+
+    ToolNode already fans the calls of a step out (a thread per call when invoked
+    synchronously, asyncio.gather when invoked asynchronously) and keeps them in order;
+    this adds the per-call timeout on both paths, and the request's tool call memo.
+    """
+
+    def __init__(self, tools: list, *, timeout: float = TOOL_CALL_TIMEOUT, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.timeout = timeout
+
+    def _run_one(
+        self,
+        call: ToolCall,
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        run = partial(super()._run_one, call, input_type, config)
+        memo = current_tool_call_memo()
+        if memo is not None:
+            run = partial(memo.run, call, run)
+        # Copy the context so callbacks/tracing still see this run
+        context = contextvars.copy_context()
+        future = _executor.submit(context.run, run)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            print(f"Tool call {call['name']} timed out after {self.timeout}s")
+            return timeout_message(call, self.timeout)
+
+    async def _arun_one(
+        self,
+        call: ToolCall,
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        run = partial(super()._arun_one, call, input_type, config)
+        memo = current_tool_call_memo()
+        try:
+            return await asyncio.wait_for(memo.arun(call, run) if memo is not None else run(), self.timeout)
+        except asyncio.TimeoutError:
+            print(f"Tool call {call['name']} timed out after {self.timeout}s")
+            return timeout_message(call, self.timeout)
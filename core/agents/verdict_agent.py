@@ -3,10 +3,11 @@ import json
 import os
 from pathlib import Path
 from langchain_core.messages import SystemMessage, BaseMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from typing import Annotated, TypedDict
-from core.agents.utils.llm_factory import get_chat_model
+from core.agents.utils.llm_factory import get_chat_model, with_cascade, with_llm_cache
 
 DEFAULT_MODEL = "mistral-nemo"  # Default model to use if not specified in .env
 
@@ -30,8 +31,10 @@ LLM_OUTPUT_FORMAT = {
     "required": ["final_label", "final_justification"]
 }
 
-llm = get_chat_model(model_name=os.getenv(
-    "VERDICT_AGENT_MODEL", DEFAULT_MODEL), format_output=LLM_OUTPUT_FORMAT)
+llm = with_llm_cache(get_chat_model(model_name=os.getenv(
+    "VERDICT_AGENT_MODEL", DEFAULT_MODEL), format_output=LLM_OUTPUT_FORMAT), "verdict_agent")
+# With VERDICT_AGENT_SMALL_MODEL set, a small model answers first and hard claims escalate
+llm = with_cascade(llm, "verdict_agent", os.getenv("VERDICT_AGENT_SMALL_MODEL"), LLM_OUTPUT_FORMAT)
 
 
 class State(TypedDict):
@@ -71,6 +74,11 @@ def verdict_node(state: State) -> dict:
     return {"messages": response}
 
 
+async def averdict_node(state: State) -> dict:
+    response = await llm.ainvoke(state['messages'])
+    return {"messages": response}
+
+
 def postprocessing_node(state: State) -> dict:
     response = state['messages'][-1]
 
@@ -95,7 +103,7 @@ def postprocessing_node(state: State) -> dict:
 builder = StateGraph(State)
 
 builder.add_node("prompt_prep", prompt_prep_node)
-builder.add_node("verdict", verdict_node)
+builder.add_node("verdict", RunnableLambda(verdict_node, afunc=averdict_node))
 builder.add_node("postprocessing", postprocessing_node)
 
 builder.add_edge(START, "prompt_prep")
@@ -1,19 +1,68 @@
+import asyncio
 import os
 import datetime
-import pymysql
+from contextlib import asynccontextmanager
 import json
 from typing import Any, Optional, Dict, List, Union, Literal
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from processing import process_query, get_user_tool_params
+from processing import RESEARCH_MODEL, process_query, stream_query, get_user_tool_params
+from core.agents.research_agent import agent_cache_info, invalidate_agent_cache
+from core.agents.utils.cascade import cascade_stats
+from core.agents.utils.llm_cache import llm_cache_stats
+from core.agents.utils.llm_factory import chat_model_cache_info
+from core.agents.utils.llm_pool import llm_pool_stats
+from core.agents.tools.http_client import close_async_client, http_client_stats
+from core.agents.utils.model_warmup import OLLAMA_WARMUP, ModelWarmup, agent_models
+from core.agents.utils.ollama_balancer import get_ollama_balancer, ollama_balancer_stats, ollama_base_urls
+from core.agents.utils.tokens import context_sizer
+from core.db import get_connection, init_pool, close_pool
+from core.verdict_cache import purge_verdicts, verdict_cache_stats
+from core.agents.tools.tool_cache import purge_tool_results, tool_cache_stats
 
 # Import middlewares from the new location
-from core.middlewares.auth import APIKeyMiddleware, DB_CONFIG
+from core.middlewares.auth import APIKeyMiddleware, api_key_cache, invalidate_api_key
 from core.middlewares.rate_limit import RateLimitMiddleware
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the shared database pool at startup and closes it at shutdown. With several
+    Ollama hosts configured, also health-checks them in the background. Unless OLLAMA_WARMUP
+    is off, loads the agents' models and keeps them loaded in the background (see /ready).
+    """
+    try:
+        await init_pool()
+    except Exception as e:
+        # Keep serving /health; handlers retry creating the pool on first use
+        print(f"Error creating database pool: {e}")
+
+    health_checks = None
+    if len(base_urls := ollama_base_urls()) > 1:
+        health_checks = asyncio.create_task(get_ollama_balancer(base_urls).run_health_checks())
+
+    app.state.model_warmup = None
+    warmup = None
+    if OLLAMA_WARMUP:
+        # The research agent's model is fixed in processing, not read from its setting
+        app.state.model_warmup = ModelWarmup(agent_models(extra=[RESEARCH_MODEL]), base_urls)
+        warmup = asyncio.create_task(app.state.model_warmup.run())
+
+    yield
+
+    if health_checks:
+        health_checks.cancel()
+    if warmup:
+        warmup.cancel()
+    await close_async_client()
+    await close_pool()
+
+
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -38,6 +87,12 @@ async def get_current_user(request: Request) -> dict[str, Any]:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
+
+async def get_staff_user(user: dict[str, Any] = Depends(get_current_user)) -> dict[str, Any]:
+    if not user.get("is_staff"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 # API Key models
 
 
@@ -85,6 +140,20 @@ class CustomToolResponse(BaseModel):
 async def health():
     return {"status": "ok"}
 
+
+@app.get("/ready")
+async def ready(request: Request):
+    """
+    Reports whether the agents' models are loaded, unlike /health, which only says the API
+    is up. Answers 503 until every model has warmed on at least one Ollama host.
+    """
+    warmup = getattr(request.app.state, "model_warmup", None)
+    if warmup is None:
+        return {"status": "ready", "warmup": "disabled"}
+    readiness = warmup.readiness()
+    body = {"status": "ready" if readiness["ready"] else "warming_up", **readiness}
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
+
 @app.get("/tools/builtins")
 async def get_builtin_tools():
     """
@@ -103,10 +172,13 @@ async def get_builtin_tools():
     return {"tools": tools}
 
 
-@app.post("/query")
-async def query(request: Request, user: dict[str, Any] = Depends(get_current_user)):
-    # User is authenticated at this point
+async def parse_query_request(request: Request, user: dict[str, Any]) -> tuple[str, list[str], list[dict]]:
+    """
+    Validates a /query request body and resolves the tools to use.
 
+    Returns:
+        A tuple of (text, builtin tool names, user tool kwargs)
+    """
     # Parse the request body
     req = await request.json()
 
@@ -141,11 +213,87 @@ async def query(request: Request, user: dict[str, Any] = Depends(get_current_use
     user_tool_kwargs = await get_user_tool_params(user["id"], tools) if user else []
     
     print(f"User tool parameters: {user_tool_kwargs}")
-    
-    verdict_results = await process_query(text, builtin_tools=tools, user_tool_kwargs=user_tool_kwargs)
+
+    return text, tools, user_tool_kwargs
+
+
+@app.post("/query")
+async def query(request: Request, user: dict[str, Any] = Depends(get_current_user)):
+    # User is authenticated at this point
+    text, tools, user_tool_kwargs = await parse_query_request(request, user)
+
+    verdict_results = await process_query(text, builtin_tools=tools, user_tool_kwargs=user_tool_kwargs,
+                                          user_id=user["id"])
     return verdict_results
 
 
+@app.post("/query/stream")
+async def query_stream(request: Request, user: dict[str, Any] = Depends(get_current_user)):
+    """
+    Same input as /query, but streams progress as server-sent events:
+    'claims', then 'evidence' and 'analysis' per claim as they finish, then 'verdict'.
+    If the pipeline fails midway, an 'error' event is sent instead of the verdict.
+    Disconnecting early cancels any work still in flight.
+    """
+    text, tools, user_tool_kwargs = await parse_query_request(request, user)
+
+    async def event_stream():
+        try:
+            async for event in stream_query(text, builtin_tools=tools, user_tool_kwargs=user_tool_kwargs,
+                                            user_id=user["id"]):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/admin/cache/stats")
+async def get_cache_stats(user: dict[str, Any] = Depends(get_staff_user)):
+    """
+    Reports size and hit ratio of the server-side caches, and the LLM connection pools. Staff only.
+    """
+    return {
+        # The verdict and tool caches may be SQLite files; keep their I/O off the event loop
+        "verdicts": await asyncio.to_thread(verdict_cache_stats),
+        "tool_results": await asyncio.to_thread(tool_cache_stats),
+        "research_agents": agent_cache_info(),
+        "api_keys": await asyncio.to_thread(api_key_cache.stats),
+        "llm_responses": llm_cache_stats(),
+        "llm_models": chat_model_cache_info(),
+        "llm_pools": llm_pool_stats(),
+        # Calls answered by each tier of the reasoning/verdict cascades, and why they escalated
+        "llm_cascades": cascade_stats(),
+        "ollama_backends": ollama_balancer_stats(),
+        "tool_http": http_client_stats(),
+        # num_ctx each model was last called with, while Ollama likely still has it loaded
+        "ollama_num_ctx": context_sizer.stats(),
+    }
+
+
+@app.delete("/admin/cache/verdicts")
+async def purge_verdict_cache(claim: Optional[str] = None, user: dict[str, Any] = Depends(get_staff_user)):
+    """
+    Removes cached verdicts for one claim, or all of them if no claim is given. Staff only.
+    """
+    removed = await asyncio.to_thread(purge_verdicts, claim)
+    return {"message": "Verdict cache purged", "removed": removed}
+
+
+@app.delete("/admin/cache/tools")
+async def purge_tool_cache(tool: Optional[str] = None, user: dict[str, Any] = Depends(get_staff_user)):
+    """
+    Removes cached results of one builtin tool, or of all of them if no tool is given. Staff only.
+    """
+    removed = await asyncio.to_thread(purge_tool_results, tool)
+    return {"message": "Tool cache purged", "removed": removed}
+
+
 @app.get("/user")
 async def get_user(user: dict[str, Any] = Depends(get_current_user)):
     """
@@ -166,18 +314,16 @@ async def create_api_key(api_key: APIKeyCreate, user: dict[str, Any] = Depends(g
     Limited to 3 API keys per user.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Check if the user already has 3 or more API keys
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT COUNT(*) FROM user_info_apikey 
                 WHERE user_id = %s
                 """,
                 (user["id"],)
             )
-            key_count = cursor.fetchone()[0]
+            key_count = (await cursor.fetchone())[0]
 
             if key_count >= 3:
                 raise HTTPException(
@@ -190,7 +336,7 @@ async def create_api_key(api_key: APIKeyCreate, user: dict[str, Any] = Depends(g
             key = uuid.uuid4().hex
 
             # Insert the new API key
-            cursor.execute(
+            await cursor.execute(
                 """
                 INSERT INTO user_info_apikey (user_id, name, `key`, created_at, is_active) 
                 VALUES (%s, %s, %s, %s, %s)
@@ -198,10 +344,10 @@ async def create_api_key(api_key: APIKeyCreate, user: dict[str, Any] = Depends(g
                 (user["id"], api_key.name, key, datetime.datetime.now(), True)
             )
             api_key_id = cursor.lastrowid
-            connection.commit()
+            await connection.commit()
 
             # Get the newly created API key
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id, name, `key`, created_at, last_used_at, is_active 
                 FROM user_info_apikey 
@@ -209,7 +355,7 @@ async def create_api_key(api_key: APIKeyCreate, user: dict[str, Any] = Depends(g
                 """,
                 (api_key_id,)
             )
-            row = cursor.fetchone()
+            row = await cursor.fetchone()
 
             return {
                 "id": row[0],
@@ -222,9 +368,6 @@ async def create_api_key(api_key: APIKeyCreate, user: dict[str, Any] = Depends(g
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error creating API key: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 
 @app.get("/api-keys")
@@ -233,11 +376,9 @@ async def list_api_keys(user: dict[str, Any] = Depends(get_current_user)):
     Lists all API keys for the authenticated user.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Get all API keys for the user
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id, name, `key`, created_at, last_used_at, is_active 
                 FROM user_info_apikey 
@@ -245,7 +386,7 @@ async def list_api_keys(user: dict[str, Any] = Depends(get_current_user)):
                 """,
                 (user["id"],)
             )
-            rows = cursor.fetchall()
+            rows = await cursor.fetchall()
 
             return [
                 {
@@ -261,9 +402,6 @@ async def list_api_keys(user: dict[str, Any] = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error listing API keys: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 
 @app.delete("/api-keys/{api_key_id}")
@@ -272,27 +410,28 @@ async def delete_api_key(api_key_id: int, user: dict[str, Any] = Depends(get_cur
     Deletes an API key for the authenticated user.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Check if the API key belongs to the user
-            cursor.execute(
+            await cursor.execute(
                 """
-                SELECT id FROM user_info_apikey 
+                SELECT id, `key` FROM user_info_apikey 
                 WHERE id = %s AND user_id = %s
                 """,
                 (api_key_id, user["id"])
             )
-            if not cursor.fetchone():
+            row = await cursor.fetchone()
+            if not row:
                 raise HTTPException(
                     status_code=404, detail="API key not found")
 
             # Delete the API key
-            cursor.execute(
+            await cursor.execute(
                 "DELETE FROM user_info_apikey WHERE id = %s",
                 (api_key_id,)
             )
-            connection.commit()
+            await connection.commit()
+            # Stop accepting the key right away rather than when its cache entry expires
+            await asyncio.to_thread(invalidate_api_key, row[1])
 
             return {"message": "API key deleted successfully"}
     except HTTPException:
@@ -300,9 +439,6 @@ async def delete_api_key(api_key_id: int, user: dict[str, Any] = Depends(get_cur
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error deleting API key: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 @app.post("/tools/preferences")
 async def set_tool_preferences(request: Request, user: dict[str, Any] = Depends(get_current_user)):
@@ -320,12 +456,13 @@ async def set_tool_preferences(request: Request, user: dict[str, Any] = Depends(
         raise HTTPException(status_code=400, detail="'tools' must be a list.")
 
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
+            # Both updates apply together or not at all
+            await connection.begin()
+
             # Set is_preferred to True for the specified tools
             if preferred_tool_names:
-                cursor.execute(
+                await cursor.execute(
                     """
                     UPDATE user_info_usertool
                     SET is_preferred = TRUE
@@ -335,7 +472,7 @@ async def set_tool_preferences(request: Request, user: dict[str, Any] = Depends(
                 )
 
             # Set is_preferred to False for all other tools
-            cursor.execute(
+            await cursor.execute(
                 """
                 UPDATE user_info_usertool
                 SET is_preferred = FALSE
@@ -344,7 +481,8 @@ async def set_tool_preferences(request: Request, user: dict[str, Any] = Depends(
                 [user["id"], tuple(preferred_tool_names)]
             )
 
-            connection.commit()
+            await connection.commit()
+        invalidate_agent_cache(user["id"])
 
         return {"message": "Tool preferences updated successfully."}
 
@@ -352,9 +490,6 @@ async def set_tool_preferences(request: Request, user: dict[str, Any] = Depends(
         raise HTTPException(
             status_code=500, detail=f"Error updating tool preferences: {str(e)}"
         )
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 
 @app.post("/tools/custom", response_model=CustomToolResponse)
@@ -364,18 +499,16 @@ async def create_custom_tool(tool: CustomToolCreate, user: dict[str, Any] = Depe
     This endpoint allows users to define tools programmatically through the API.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Check if a tool with the same name already exists for this user
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id FROM user_info_usertool 
                 WHERE user_id = %s AND name = %s
                 """,
                 (user["id"], tool.name)
             )
-            if cursor.fetchone():
+            if await cursor.fetchone():
                 raise HTTPException(
                     status_code=400,
                     detail=f"A tool with the name '{tool.name}' already exists."
@@ -393,7 +526,7 @@ async def create_custom_tool(tool: CustomToolCreate, user: dict[str, Any] = Depe
                 )
 
             # Insert the new tool
-            cursor.execute(
+            await cursor.execute(
                 """
                 INSERT INTO user_info_usertool (
                     user_id, name, description, created_at, updated_at, is_active,
@@ -415,10 +548,11 @@ async def create_custom_tool(tool: CustomToolCreate, user: dict[str, Any] = Depe
                 )
             )
             tool_id = cursor.lastrowid
-            connection.commit()
+            await connection.commit()
+            invalidate_agent_cache(user["id"])
 
             # Get the newly created tool
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id, name, description, method, url_template, created_at, is_active
                 FROM user_info_usertool 
@@ -426,7 +560,7 @@ async def create_custom_tool(tool: CustomToolCreate, user: dict[str, Any] = Depe
                 """,
                 (tool_id,)
             )
-            row = cursor.fetchone()
+            row = await cursor.fetchone()
 
             return {
                 "id": row[0],
@@ -442,9 +576,6 @@ async def create_custom_tool(tool: CustomToolCreate, user: dict[str, Any] = Depe
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error creating custom tool: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 
 @app.get("/tools/custom")
@@ -453,11 +584,9 @@ async def list_custom_tools(user: dict[str, Any] = Depends(get_current_user)):
     Lists all custom tools for the authenticated user.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Get all custom tools for the user
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id, name, description, method, url_template, created_at, is_active
                 FROM user_info_usertool 
@@ -466,7 +595,7 @@ async def list_custom_tools(user: dict[str, Any] = Depends(get_current_user)):
                 """,
                 (user["id"],)
             )
-            rows = cursor.fetchall()
+            rows = await cursor.fetchall()
 
             return [
                 {
@@ -483,9 +612,6 @@ async def list_custom_tools(user: dict[str, Any] = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error listing custom tools: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 
 @app.delete("/tools/custom/{tool_id}")
@@ -494,27 +620,26 @@ async def delete_custom_tool(tool_id: int, user: dict[str, Any] = Depends(get_cu
     Deletes a custom tool for the authenticated user.
     """
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Check if the tool belongs to the user
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT id FROM user_info_usertool 
                 WHERE id = %s AND user_id = %s
                 """,
                 (tool_id, user["id"])
             )
-            if not cursor.fetchone():
+            if not await cursor.fetchone():
                 raise HTTPException(
                     status_code=404, detail="Custom tool not found")
 
             # Delete the tool
-            cursor.execute(
+            await cursor.execute(
                 "DELETE FROM user_info_usertool WHERE id = %s",
                 (tool_id,)
             )
-            connection.commit()
+            await connection.commit()
+            invalidate_agent_cache(user["id"])
 
             return {"message": "Custom tool deleted successfully"}
     except HTTPException:
@@ -522,9 +647,6 @@ async def delete_custom_tool(tool_id: int, user: dict[str, Any] = Depends(get_cu
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error deleting custom tool: {str(e)}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
 
 if __name__ == "__main__":
     import uvicorn
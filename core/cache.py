@@ -0,0 +1,286 @@
+"""
+Key-value caches with per-entry TTLs and bounded size.
+
+Two interchangeable backends are provided:
+    - TTLCache: in-process, LRU-evicted. Fastest, but private to one worker.
+    - SQLiteTTLCache: a SQLite file shared by every worker on the host (point CACHE_DB_PATH
+      at /dev/shm for a memory-backed file). Values must be JSON-serializable.
+
+Both expose get/set/delete/delete_prefix/clear/stats, so callers pick a backend with create_cache()
+and don't need to care which one they got.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+# Returned by get() on a miss, so that None can be cached (e.g. negative caching)
+MISSING = object()
+
+# Default file for the SQLite backend
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "/tmp/newsagent_cache.sqlite3")
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache. Entries expire after their TTL, and the least recently
+    used entry is evicted once max_size is reached.
+    """
+
+    # Only takes an in-process lock, so async code can call it on the event loop
+    blocking = False
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = 60):
+        """
+        Args:
+            max_size: Maximum number of entries kept
+            ttl: Default time-to-live in seconds; None means entries never expire
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def set(self, key: str, value: Any, ttl: float | None = MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": "memory",
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+class SQLiteConnections:
+    """
+    Connections to one SQLite file, one per thread since sqlite3 connections can't be
+    shared across threads safely. Connections use WAL, so readers don't block the writer,
+    and wait up to timeout seconds for another process's write lock.
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening it on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+class SQLiteTTLCache:
+    """
+    Cache stored in a SQLite file, so several worker processes share the same entries.
+    Several caches can live in one file, separated by namespace. Hit/miss counters are
+    per process.
+    """
+
+    # Does file I/O and may wait on another worker's write lock; async code should call it
+    # in a thread
+    blocking = True
+
+    def __init__(self, namespace: str, max_size: int = 10000, ttl: float | None = 60,
+                 path: str = None):
+        """
+        Args:
+            namespace: Name separating this cache's entries from other caches in the file
+            max_size: Maximum number of entries kept in this namespace
+            ttl: Default time-to-live in seconds; None means entries never expire
+            path: SQLite file to use. Defaults to CACHE_DB_PATH
+        """
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path or CACHE_DB_PATH
+        self._connections = SQLiteConnections(self.path)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._connection() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count(hit=False)
+            return default
+        connection.execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        self._count(hit=True)
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float | None = MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        connection = self._connection()
+        connection.execute(
+            """
+            INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (self.namespace, key, json.dumps(value, default=str), expires_at, now),
+        )
+        self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        """
+        Drops expired entries, then least recently used ones until we're within max_size.
+        """
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        overflow = connection.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0] - self.max_size
+        if overflow > 0:
+            connection.execute(
+                """
+                DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (self.namespace, self.namespace, overflow),
+            )
+            with self._lock:
+                self._evictions += overflow
+
+    def delete(self, key: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+        return cursor.rowcount > 0
+
+    def delete_prefix(self, prefix: str) -> int:
+        # substr() rather than LIKE, so '%' and '_' in the prefix are matched literally
+        cursor = self._connection().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND substr(key, 1, ?) = ?",
+            (self.namespace, len(prefix), prefix),
+        )
+        return cursor.rowcount
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> dict:
+        size = self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": "sqlite",
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "size": size,
+                "max_size": self.max_size,
+            }
+
+
+def create_cache(namespace: str, backend: str = "memory", max_size: int = 1024,
+                 ttl: float | None = 60, path: str = None) -> TTLCache | SQLiteTTLCache:
+    """
+    Builds a cache with the requested backend.
+
+    Args:
+        namespace: Name of the cache, used to separate entries in a shared SQLite file
+        backend: 'memory' for a per-process cache, 'sqlite' for one shared by all workers
+        max_size: Maximum number of entries kept
+        ttl: Default time-to-live in seconds; None means entries never expire
+        path: SQLite file for the 'sqlite' backend. Defaults to CACHE_DB_PATH
+    """
+    if backend == "memory":
+        return TTLCache(max_size=max_size, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteTTLCache(namespace, max_size=max_size, ttl=ttl, path=path)
+    raise ValueError(f"Unknown cache backend '{backend}', expected 'memory' or 'sqlite'.")
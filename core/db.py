@@ -0,0 +1,103 @@
+"""
+Database access for the FastAPI application.
+
+This module owns a single async MySQL connection pool shared by the request handlers,
+the middlewares and the query pipeline. The pool is created at app startup and closed
+at shutdown (see the lifespan in app.py), and lazily created on first use otherwise.
+"""
+import asyncio
+import os
+import aiomysql
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+# Database connection settings - directly configured without Django dependency
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "fakenews_user"),
+    "password": os.getenv("DB_PASSWORD", "password"),
+    "database": os.getenv("DB_NAME", "fakenews_db"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+}
+
+# Pool sizing. Connections idle for longer than DB_POOL_RECYCLE seconds are replaced
+# before reuse, so we never hand out one MySQL's wait_timeout has already dropped.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+_pool: aiomysql.Pool | None = None
+_pool_lock = asyncio.Lock()
+
+
+async def init_pool() -> aiomysql.Pool:
+    """
+    Creates the shared connection pool if it doesn't exist yet.
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await aiomysql.create_pool(
+                minsize=DB_POOL_MIN_SIZE,
+                maxsize=DB_POOL_MAX_SIZE,
+                pool_recycle=DB_POOL_RECYCLE,
+                # Autocommit so connections go back to the pool outside a transaction;
+                # aiomysql closes connections that are released mid-transaction.
+                autocommit=True,
+                host=DB_CONFIG["host"],
+                user=DB_CONFIG["user"],
+                password=DB_CONFIG["password"],
+                db=DB_CONFIG["database"],
+                port=DB_CONFIG["port"],
+            )
+    return _pool
+
+
+async def close_pool():
+    """
+    Closes every connection in the shared pool and waits for them to finish.
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            await _pool.wait_closed()
+            _pool = None
+
+
+@asynccontextmanager
+async def get_connection() -> AsyncIterator[aiomysql.Connection]:
+    """
+    Borrows a connection from the shared pool.
+
+    Connections idle past DB_POOL_RECYCLE are already replaced by the pool, so a healthy
+    connection is handed out without a round trip. If a query fails with an
+    OperationalError anyway (the server restarted, or dropped the connection early), the
+    connection is reconnected, or closed if that fails, before it goes back to the pool,
+    so only that one query fails.
+
+    Usage:
+        async with get_connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(...)
+    """
+    pool = _pool or await init_pool()
+    async with pool.acquire() as connection:
+        try:
+            yield connection
+        except aiomysql.OperationalError:
+            try:
+                await connection.ping(reconnect=True)
+            except aiomysql.OperationalError:
+                # A closed connection is dropped by the pool when released
+                connection.close()
+            raise
+
+
+def pool_stats() -> dict:
+    """
+    Returns the current size of the shared pool.
+    """
+    if _pool is None:
+        return {"size": 0, "free": 0, "min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE}
+    return {"size": _pool.size, "free": _pool.freesize, "min_size": _pool.minsize, "max_size": _pool.maxsize}
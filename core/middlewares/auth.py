@@ -3,20 +3,43 @@ Authentication middleware for the FastAPI application.
 
 This module contains middleware for handling API key authentication.
 """
+import asyncio
+import hashlib
 import os
-import pymysql
 from typing import Optional, Dict, Any
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
+from core.cache import MISSING, create_cache
+from core.db import get_connection
 
-# Database connection settings - directly configured without Django dependency
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "user": os.getenv("DB_USER", "fakenews_user"),
-    "password": os.getenv("DB_PASSWORD", "password"),
-    "database": os.getenv("DB_NAME", "fakenews_db"),
-    "port": int(os.getenv("DB_PORT", "3306")),
-}
+# Cache of API key -> user, so authenticated requests normally skip the database.
+# Unknown keys are cached too (as None), for a shorter time.
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "60"))
+API_KEY_NEGATIVE_CACHE_TTL = float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", "10"))
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+# 'memory' (per worker) or 'sqlite' (shared by all workers on the host)
+API_KEY_CACHE_BACKEND = os.getenv("API_KEY_CACHE_BACKEND", "memory")
+
+api_key_cache = create_cache(
+    "api_keys",
+    backend=API_KEY_CACHE_BACKEND,
+    max_size=API_KEY_CACHE_SIZE,
+    ttl=API_KEY_CACHE_TTL,
+)
+
+
+def api_key_cache_key(api_key: str) -> str:
+    """
+    Keys are hashed so raw API keys never end up in a shared cache file.
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def invalidate_api_key(api_key: str):
+    """
+    Drops a key from the authentication cache. Call this when a key is deleted or deactivated.
+    """
+    api_key_cache.delete(api_key_cache_key(api_key))
 
 
 class APIKeyMiddleware(BaseHTTPMiddleware):
@@ -42,7 +65,7 @@ class APIKeyMiddleware(BaseHTTPMiddleware):
 
     async def get_user_from_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
         """
-        Get the user associated with the API key.
+        Get the user associated with the API key, from the cache when possible.
         
         Args:
             api_key: The API key to validate
@@ -51,33 +74,62 @@ class APIKeyMiddleware(BaseHTTPMiddleware):
             A dictionary containing user information if the API key is valid,
             None otherwise.
         """
+        cache_key = api_key_cache_key(api_key)
+        user = await self.call_cache(api_key_cache.get, cache_key)
+        if user is not MISSING:
+            return user
+
         try:
-            # Connect directly to MySQL database
-            connection = pymysql.connect(**DB_CONFIG)
-            with connection.cursor() as cursor:
-                # Get the user associated with the API key
-                cursor.execute(
-                    """
-                    SELECT au.id, au.username, au.email 
-                    FROM auth_user au
-                    JOIN user_info_apikey uak ON uak.user_id = au.id
-                    WHERE uak.key = %s AND uak.is_active = 1
-                    """,
-                    (api_key,)
-                )
-                user_row = cursor.fetchone()
-
-                if user_row:
-                    return {
-                        "id": user_row[0],
-                        "username": user_row[1],
-                        "email": user_row[2]
-                    }
-
-                return None
+            user = await self.fetch_user_from_api_key(api_key)
         except Exception as e:
+            # Don't cache failures: the key may well be valid once the database is back
             print(f"Error getting user from API key: {e}")
             return None
-        finally:
-            if 'connection' in locals() and connection:
-                connection.close()
+
+        await self.call_cache(api_key_cache.set, cache_key, user,
+                              ttl=API_KEY_CACHE_TTL if user else API_KEY_NEGATIVE_CACHE_TTL)
+        return user
+
+    @staticmethod
+    async def call_cache(method, *args, **kwargs):
+        """
+        Calls a cache method, in a thread if the backend blocks (SQLite), so auth lookups
+        don't stall the other requests on the event loop.
+        """
+        if api_key_cache.blocking:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def fetch_user_from_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the user associated with the API key in the database.
+
+        Args:
+            api_key: The API key to validate
+
+        Returns:
+            A dictionary containing user information if the API key is valid,
+            None otherwise.
+        """
+        async with get_connection() as connection, connection.cursor() as cursor:
+            # Get the user associated with the API key
+            await cursor.execute(
+                """
+                SELECT au.id, au.username, au.email, au.is_staff
+                FROM auth_user au
+                JOIN user_info_apikey uak ON uak.user_id = au.id
+                WHERE uak.key = %s AND uak.is_active = 1
+                """,
+                (api_key,)
+            )
+            user_row = await cursor.fetchone()
+
+            if user_row:
+                return {
+                    "id": user_row[0],
+                    "username": user_row[1],
+                    "email": user_row[2],
+                    "is_staff": bool(user_row[3])
+                }
+
+            return None
@@ -2,12 +2,206 @@
 Rate limiting middleware for the FastAPI application.
 
 This module contains middleware for implementing rate limiting on API endpoints.
+
+Limits are enforced with a sliding-window counter: each key keeps only the request counts of
+the current and previous fixed windows, and the previous count is weighted by how much of it
+still overlaps the sliding window. That is constant memory and O(1) work per request.
+
+Counters live behind a store, so they can be kept per process (MemoryRateLimitStore) or shared
+by every worker on the host through a SQLite file (SQLiteRateLimitStore).
 """
+import asyncio
+import hashlib
+import math
+import os
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from core.cache import SQLiteConnections
+
+# 'memory' (per worker) or 'sqlite' (shared by all workers on the host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# SQLite file for the shared store; put it on /dev/shm to keep it in memory
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "/tmp/newsagent_rate_limit.sqlite3")
+
+
+def sliding_window(window_start: float, current: int, previous: int, limit: int,
+                   window: float, now: float) -> tuple[bool, int, float]:
+    """
+    Decides whether one more request fits in the sliding window.
+
+    Args:
+        window_start: Start time of the current fixed window
+        current: Requests counted in the current fixed window
+        previous: Requests counted in the previous fixed window
+        limit: Maximum number of requests per window
+        window: Window length in seconds
+        now: Current time
+
+    Returns:
+        A tuple of (allowed, remaining, seconds until another request would be allowed)
+    """
+    elapsed = (now - window_start) / window
+    estimated = previous * (1 - elapsed) + current
+
+    if estimated + 1 <= limit:
+        return True, max(0, math.floor(limit - estimated - 1)), 0.0
+
+    # Time until enough of the previous window has slid out for one more request
+    if previous and current + 1 <= limit:
+        fraction = 1 - (limit - current - 1) / previous
+        return False, 0, max(0.0, window_start + fraction * window - now)
+    # Otherwise wait for the next window, where today's count becomes the weighted one
+    fraction = max(0.0, 1 - (limit - 1) / current) if current else 0.0
+    return False, 0, max(0.0, window_start + window + fraction * window - now)
+
+
+def roll_window(window_index: int, current: int, previous: int, now_index: int) -> tuple[int, int]:
+    """
+    Shifts stored counts forward to the fixed window containing now.
+
+    Returns:
+        A tuple of (current, previous) counts relative to now_index
+    """
+    if now_index == window_index:
+        return current, previous
+    if now_index == window_index + 1:
+        return 0, current
+    return 0, 0
+
+
+class MemoryRateLimitStore:
+    """
+    Per-process store. Keys idle for two windows no longer affect any decision and are
+    evicted; max_keys bounds memory even under a flood of distinct keys.
+    """
+
+    # hit() only takes an in-process lock, so it runs on the event loop
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [window_index, current, previous, last_seen], least recently seen first
+        self._counters: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> tuple[bool, int, float]:
+        """
+        Counts a request for key if it fits within limit requests per window.
+
+        Returns:
+            A tuple of (allowed, remaining, seconds until another request would be allowed)
+        """
+        now_index = int(now // window)
+        with self._lock:
+            window_index, current, previous, _ = self._counters.get(key, (now_index, 0, 0, now))
+            current, previous = roll_window(window_index, current, previous, now_index)
+
+            allowed, remaining, retry_after = sliding_window(
+                now_index * window, current, previous, limit, window, now)
+            if allowed:
+                current += 1
+
+            self._counters[key] = [now_index, current, previous, now]
+            self._counters.move_to_end(key)
+            self._evict(window, now)
+        return allowed, remaining, retry_after
+
+    def _evict(self, window: float, now: float):
+        while self._counters:
+            oldest_key, (_, _, _, last_seen) = next(iter(self._counters.items()))
+            if len(self._counters) <= self.max_keys and last_seen > now - 2 * window:
+                break
+            del self._counters[oldest_key]
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteRateLimitStore:
+    """
+    Store kept in a SQLite file, so every worker process on the host shares the same counters
+    and the limit holds no matter how many uvicorn workers are running.
+    """
+
+    # Idle keys are swept every this many requests
+    SWEEP_EVERY = 1000
+    # hit() may wait on another worker's write lock, so the middleware runs it in a thread
+    blocking = True
+
+    def __init__(self, path: str = None):
+        self.path = path or RATE_LIMIT_DB_PATH
+        self._connections = SQLiteConnections(self.path)
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._connections.get().execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_index INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                last_seen REAL NOT NULL
+            )
+            """
+        )
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> tuple[bool, int, float]:
+        """
+        Counts a request for key if it fits within limit requests per window.
+
+        Returns:
+            A tuple of (allowed, remaining, seconds until another request would be allowed)
+        """
+        now_index = int(now // window)
+        connection = self._connections.get()
+        # IMMEDIATE takes the write lock up front, so concurrent workers can't both read
+        # the same count and each let one request through
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            window_index, current, previous = row or (now_index, 0, 0)
+            current, previous = roll_window(window_index, current, previous, now_index)
+
+            allowed, remaining, retry_after = sliding_window(
+                now_index * window, current, previous, limit, window, now)
+            if allowed:
+                current += 1
+
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, now_index, current, previous, now),
+            )
+            with self._lock:
+                self._requests += 1
+                sweep = self._requests % self.SWEEP_EVERY == 0
+            if sweep:
+                connection.execute("DELETE FROM rate_limits WHERE last_seen <= ?", (now - 2 * window,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, remaining, retry_after
+
+
+def create_rate_limit_store(backend: str = None):
+    """
+    Builds the store named by backend ('memory' or 'sqlite'), defaulting to RATE_LIMIT_BACKEND.
+    """
+    backend = backend or RATE_LIMIT_BACKEND
+    if backend == "memory":
+        return MemoryRateLimitStore()
+    if backend == "sqlite":
+        return SQLiteRateLimitStore()
+    raise ValueError(f"Unknown rate limit backend '{backend}', expected 'memory' or 'sqlite'.")
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -18,17 +212,19 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     number of requests per minute per API key.
     """
 
-    def __init__(self, app, requests_per_minute=40):
+    def __init__(self, app, requests_per_minute=40, store=None):
         """
         Initialize the rate limit middleware.
 
         Args:
             app: The FastAPI application
             requests_per_minute: Maximum number of requests allowed per minute
+            store: Where request counters are kept. Defaults to the RATE_LIMIT_BACKEND store
         """
         super().__init__(app)
         self.requests_per_minute = requests_per_minute
-        self.request_history = defaultdict(list)
+        self.window = 60
+        self.store = store or create_rate_limit_store()
 
     async def dispatch(self, request: Request, call_next):
         """
@@ -42,7 +238,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             The response, potentially with rate limit headers or a 429 status code
         """
         # Skip rate limiting for non-query endpoints
-        if not request.url.path.endswith('/query'):
+        if not request.url.path.rstrip('/').endswith(('/query', '/query/stream')):
             return await call_next(request)
 
         # Get the API key from the header
@@ -50,39 +246,34 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         if not api_key:
             return await call_next(request)
 
-        # Check rate limit
-        current_time = time.time()
-        # Remove requests older than 1 minute
-        self.request_history[api_key] = [
-            timestamp for timestamp in self.request_history[api_key]
-            if current_time - timestamp < 60
-        ]
+        # Check rate limit. Keys are hashed so raw API keys never end up in a shared store.
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        hit_args = (key, self.requests_per_minute, self.window, time.time())
+        if getattr(self.store, "blocking", False):
+            allowed, remaining, retry_after = await asyncio.to_thread(self.store.hit, *hit_args)
+        else:
+            allowed, remaining, retry_after = self.store.hit(*hit_args)
 
         # Check if the user has exceeded the rate limit
-        if len(self.request_history[api_key]) >= self.requests_per_minute:
-            # Calculate time until reset
-            oldest_request = self.request_history[api_key][0]
-            seconds_until_reset = 60 - (current_time - oldest_request)
+        if not allowed:
+            seconds_until_reset = math.ceil(retry_after)
 
             return JSONResponse(
                 status_code=429,
                 content={
-                    "detail": f"Rate limit exceeded. Try again in {int(seconds_until_reset)} seconds.",
+                    "detail": f"Rate limit exceeded. Try again in {seconds_until_reset} seconds.",
                     "rate_limit": {
                         "limit": self.requests_per_minute,
                         "remaining": 0,
-                        "reset_after_seconds": int(seconds_until_reset)
+                        "reset_after_seconds": seconds_until_reset
                     }
-                }
+                },
+                headers={"Retry-After": str(seconds_until_reset)},
             )
 
-        # Add the current request to the history
-        self.request_history[api_key].append(current_time)
-
         # Add rate limit headers to the response
         response = await call_next(request)
         response.headers["X-Rate-Limit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-Rate-Limit-Remaining"] = str(
-            self.requests_per_minute - len(self.request_history[api_key]))
+        response.headers["X-Rate-Limit-Remaining"] = str(remaining)
 
         return response
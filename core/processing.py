@@ -1,11 +1,25 @@
-import pymysql
-from typing import Any
-from core.middlewares.auth import DB_CONFIG
+import asyncio
+import os
+from typing import Any, AsyncIterator
+from langchain_core.messages import AIMessage, ToolMessage
+from core.db import get_connection
 from core.agents.claim_decomposer import claim_decomposer
-from core.agents.research_agent import create_agent as create_research_agent
-from core.agents.reasoning_agent import reasoning_agent
+from core.agents.research_agent import get_agent as get_research_agent
+from core.agents import research_agent as research_module
+from core.agents.reasoning_agent import reasoning_agent, llm as reasoning_llm
+from core.agents import reasoning_agent as reasoning_module
 from core.agents.verdict_agent import verdict_agent
+from core.agents.tools.builtins import wikipedia as wikipedia_module
+from core.agents.utils import evidence_compression
 from core.agents.utils.common_types import Analysis, Evidence
+from core.agents.utils.tool_memo import ToolCallMemo, use_tool_call_memo
+from core.verdict_cache import cache_verdict, get_cached_verdict
+
+# Model used by the research agent for every query
+RESEARCH_MODEL = "mistral-nemo"
+
+# Maximum number of claims researched/reasoned about at the same time within one query
+CLAIM_CONCURRENCY = int(os.getenv("CLAIM_CONCURRENCY", "4"))
 
 
 async def get_user_tool_params(user_id: int, tools: list[str]) -> list[dict[str, Any]]:
@@ -25,12 +39,10 @@ async def get_user_tool_params(user_id: int, tools: list[str]) -> list[dict[str,
         return user_tool_params
         
     try:
-        # Connect directly to MySQL database
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
+        async with get_connection() as connection, connection.cursor() as cursor:
             # Get all active user tools for this user that match the selected tools
             placeholders = ', '.join(['%s'] * len(tools))
-            cursor.execute(
+            await cursor.execute(
                 f"""
                 SELECT name, description, method, url_template, headers, default_params, 
                        data, json_payload, docstring, target_fields, param_mapping, is_preferred
@@ -39,7 +51,7 @@ async def get_user_tool_params(user_id: int, tools: list[str]) -> list[dict[str,
                 """,
                 (user_id, *tools)
             )
-            rows = cursor.fetchall()
+            rows = await cursor.fetchall()
             
             # Store the parameters for each user tool
             for row in rows:
@@ -59,9 +71,6 @@ async def get_user_tool_params(user_id: int, tools: list[str]) -> list[dict[str,
                 })
     except Exception as e:
         print(f"Error retrieving user tool parameters: {e}")
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
             
     return user_tool_params
 
@@ -96,56 +105,207 @@ def create_analyses(claims: list[str], labels: list[str],
     ]
 
 
-async def process_query(text: str, builtin_tools: list, user_tool_kwargs: list = []) -> dict:
+async def research_claim(claim: str, research_agent, on_evidence) -> dict:
+    """
+    Runs the research agent on a single claim, streaming graph updates so that each piece of
+    evidence is reported as soon as its ToolMessage arrives.
 
-    # Try constructing research agent
-    research_agent = create_research_agent(
-        model="mistral-nemo",
-        builtin_tools=builtin_tools,
-        user_tool_kwargs=user_tool_kwargs,
-    )
+    Args:
+        claim: The claim to research
+        research_agent: The compiled research agent graph
+        on_evidence: Async callback receiving each Evidence item as it is produced
+
+    Returns:
+        The research result state ({'claim', 'evidence'}) to feed the reasoning agent, plus
+        the research agent's 'termination_reason'
+    """
+    tool_calls = {}
+    evidence = []
+    termination_reason = None
+    async for update in research_agent.astream(
+        {"claim": claim},
+        config={"run_name": "research_agent"},
+        stream_mode="updates",
+    ):
+        for node_update in update.values():
+            if not node_update:
+                continue
+            messages = node_update.get("messages", [])
+            if not isinstance(messages, list):
+                messages = [messages]
+            for message in messages:
+                if isinstance(message, AIMessage):
+                    for tool_call in message.tool_calls:
+                        tool_calls[tool_call['id']] = tool_call
+                elif isinstance(message, ToolMessage) and message.tool_call_id in tool_calls \
+                        and not message.additional_kwargs.get("replayed"):
+                    tool_call = tool_calls[message.tool_call_id]
+                    await on_evidence(Evidence(
+                        name=tool_call['name'], args=tool_call['args'], result=message.content))
+            if "evidence" in node_update:
+                evidence = node_update["evidence"]
+                termination_reason = node_update.get("termination_reason")
+
+    if termination_reason != "complete":
+        print(f"Research on claim '{claim[:60]}' stopped early: {termination_reason}")
+    return {"claim": claim, "evidence": evidence, "termination_reason": termination_reason}
+
+
+async def stream_query(text: str, builtin_tools: list, user_tool_kwargs: list = [],
+                       max_concurrency: int = None, user_id: int = None) -> AsyncIterator[dict]:
+    """
+    Runs the full pipeline on a piece of text, yielding events as work finishes:
+
+        {'event': 'claims', 'data': {'claims': [...]}}
+        {'event': 'evidence', 'data': {'index': int, 'claim': str, 'evidence': Evidence}}
+        {'event': 'analysis', 'data': {'index': int, 'cached': bool, **Analysis, 'evidence_audit': [...]}}
+        {'event': 'verdict', 'data': {'final_label', 'final_justification', 'analyses'}}
+
+    Each claim's research -> reasoning chain runs independently, so end-to-end latency tracks
+    the slowest claim rather than the sum of all claims. Claims already analysed with the same
+    builtin tools and models are answered from the verdict cache without building any agent.
+    Closing the generator early cancels any claims still in flight. 'evidence_audit' lists
+    what evidence compression left out of the reasoning prompt; cached analyses have none.
+
+    Args:
+        text: The text to fact-check
+        builtin_tools: Names of the builtin tools to make available to the research agent
+        user_tool_kwargs: kwargs for tool_registry.create_tool, one dict per user-defined tool
+        max_concurrency: Maximum number of claims processed at the same time.
+            Defaults to CLAIM_CONCURRENCY; 1 processes claims one after another.
+        user_id: Owner of the user-defined tools, used to scope the compiled agent cache
+    """
+
+    # Results for claims researched with builtin tools only can be shared across requests;
+    # anything involving user-defined tools is private to that user
+    use_verdict_cache = not user_tool_kwargs
+    # ChatOllama names its model 'model', ChatOpenAI 'model_name'
+    models = {"research": RESEARCH_MODEL,
+              "reasoning": getattr(reasoning_llm, "model", None) or getattr(reasoning_llm, "model_name", None)}
+    # Settings that change the evidence or the answers are part of the key too; their
+    # defaults are left out so existing cache keys stay valid
+    if reasoning_module.REASONING_PROMPT_LAYOUT != "inline":
+        models["reasoning_layout"] = reasoning_module.REASONING_PROMPT_LAYOUT
+    if research_module.RESEARCH_MODE != "agent":
+        models["research_mode"] = research_module.RESEARCH_MODE
+    if wikipedia_module.WIKIPEDIA_MODE != "full":
+        models["wikipedia_mode"] = wikipedia_module.WIKIPEDIA_MODE
+    if evidence_compression.EVIDENCE_COMPRESSION != "extractive":
+        models["evidence_compression"] = evidence_compression.EVIDENCE_COMPRESSION
 
     # Claims decomposer
     initial_state = {"text": text}
-    result = claim_decomposer.invoke(
+    result = await claim_decomposer.ainvoke(
         initial_state,
         config={"run_name": "claim_decomposer", }
     )
     claims = result["claims"]
+    yield {"event": "claims", "data": {"claims": claims}}
 
-    research_results = [research_agent.invoke(
-        {"claim": claim},
-        config={"run_name": "research_agent"}
-    ) for claim in claims]
-    delete_messages(research_results)
+    # Fan out: research -> reasoning per claim. Claim tasks push their events onto a queue,
+    # which we drain here until every claim has finished.
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or CLAIM_CONCURRENCY))
+    done = object()
+    # Identical tool calls from different claims of this request run once
+    tool_call_memo = ToolCallMemo()
+
+    async def process_claim(index: int, claim: str) -> Analysis:
+        # Each claim runs in its own task, so this only reaches this request's agents
+        use_tool_call_memo(tool_call_memo)
+
+        async def on_evidence(evidence: Evidence):
+            await queue.put({"event": "evidence",
+                             "data": {"index": index, "claim": claim, "evidence": evidence}})
+
+        # The verdict cache may be a SQLite file; keep its I/O off the event loop
+        cached = await asyncio.to_thread(get_cached_verdict, claim, builtin_tools, models) \
+            if use_verdict_cache else None
+        if cached is not None:
+            for evidence in cached["evidence"]:
+                await on_evidence(evidence)
+            analysis = create_analyses([claim], [cached["label"]], [cached["justification"]],
+                                       [cached["evidence"]])[0]
+            await queue.put({"event": "analysis",
+                             "data": {"index": index, "cached": True, **analysis, "evidence_audit": []}})
+            return analysis
+
+        async with semaphore:
+            # Get the research agent, compiling it only if this model/tool set hasn't been seen
+            research_agent = get_research_agent(
+                model=RESEARCH_MODEL,
+                builtin_tools=builtin_tools,
+                user_tool_kwargs=user_tool_kwargs,
+                user_id=user_id,
+            )
+            research_result = await research_claim(claim, research_agent, on_evidence)
+            reasoning_result = await reasoning_agent.ainvoke(
+                {"claim": claim, "evidence": research_result["evidence"]},
+                config={"run_name": "reasoning_agent"}
+            )
+        delete_messages([reasoning_result])
+
+        # Research cut short and 'unknown' labels are worth retrying, not serving for a day
+        if use_verdict_cache and research_result["termination_reason"] == "complete" \
+                and reasoning_result["label"] != "unknown":
+            await asyncio.to_thread(cache_verdict, claim, builtin_tools, models, research_result["evidence"],
+                                    reasoning_result["label"], reasoning_result["justification"])
+
+        analysis = create_analyses([claim], [reasoning_result["label"]], [reasoning_result["justification"]],
+                                   [research_result["evidence"]])[0]
+        await queue.put({"event": "analysis", "data": {"index": index, "cached": False, **analysis,
+                                                       "evidence_audit": reasoning_result.get("evidence_audit", [])}})
+        return analysis
 
-    reasoning_results = [reasoning_agent.invoke(
-        state,
-        config={"run_name": "reasoning_agent"}
-    ) for state in research_results]
-    delete_messages(reasoning_results)
+    tasks = [asyncio.create_task(process_claim(i, claim)) for i, claim in enumerate(claims)]
+
+    async def join_claims() -> list[Analysis]:
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            await queue.put(done)
+
+    joiner = asyncio.create_task(join_claims())
+    try:
+        while (event := await queue.get()) is not done:
+            yield event
+        analyses = await joiner
+        if tool_call_memo.stats["reused"] or tool_call_memo.stats["coalesced"]:
+            print(f"Tool calls for this query: {tool_call_memo.stats}")
+    finally:
+        # Client went away or a claim failed: don't leave work running in the background
+        for task in [*tasks, joiner]:
+            task.cancel()
 
     # Process reasoning results with verdict_agent
-    verdict_results = verdict_agent.invoke({
+    verdict_results = await verdict_agent.ainvoke({
         "claims": claims,
-        "labels": [r["label"] for r in reasoning_results],
-        "justifications": [r["justification"] for r in reasoning_results],
+        "labels": [analysis["label"] for analysis in analyses],
+        "justifications": [analysis["justification"] for analysis in analyses],
         "messages": []
     }, config={"run_name": "verdict_agent"})
 
     # Clean up messages in verdict_results
     delete_messages([verdict_results])
-    verdict_results['evidence'] = [res['evidence'] for res in research_results]
-    verdict_results['claims'] = claims
-
-    analyses = create_analyses(verdict_results['claims'], verdict_results['labels'],
-                               verdict_results['justifications'], verdict_results['evidence'])
 
     results = {
         "final_label": verdict_results['final_label'],
         "final_justification": verdict_results['final_justification'],
         "analyses": analyses,
     }
+    yield {"event": "verdict", "data": results}
+
+
+async def process_query(text: str, builtin_tools: list, user_tool_kwargs: list = [],
+                        max_concurrency: int = None, user_id: int = None) -> dict:
+    """
+    Runs the full pipeline on a piece of text and returns only the final verdict.
+    See stream_query for the arguments.
+    """
+    results = None
+    async for event in stream_query(text, builtin_tools, user_tool_kwargs, max_concurrency, user_id):
+        if event["event"] == "verdict":
+            results = event["data"]
     return results
 
 
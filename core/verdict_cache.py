@@ -0,0 +1,119 @@
+"""
+Cross-request cache of per-claim results.
+
+The same claims come in over and over, and researching and reasoning about one is by far
+the most expensive part of a query. Once a claim has been analysed, its evidence, label and
+justification are stored here, keyed by the normalized claim text, the builtin tools it was
+researched with and the models involved, so any later request for the same claim with the
+same setup skips straight to the verdict.
+
+Only queries restricted to builtin tools are cached: user-defined tools can return
+anything, and their results must not leak between users.
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Optional
+from core.cache import MISSING, create_cache
+from core.agents.utils.common_types import Evidence
+
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() == "true"
+VERDICT_CACHE_TTL = int(os.getenv("VERDICT_CACHE_TTL", "86400"))
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "100000"))
+# SQLite by default so cached verdicts are shared by all workers and survive restarts
+VERDICT_CACHE_BACKEND = os.getenv("VERDICT_CACHE_BACKEND", "sqlite")
+
+verdict_cache = create_cache(
+    "verdicts",
+    backend=VERDICT_CACHE_BACKEND,
+    max_size=VERDICT_CACHE_SIZE,
+    ttl=VERDICT_CACHE_TTL,
+)
+
+
+def normalize_claim(claim: str) -> str:
+    """
+    Reduces a claim to a canonical form, so trivially different spellings of the same
+    claim (case, spacing, unicode forms, trailing punctuation) share a cache entry.
+    """
+    claim = unicodedata.normalize("NFKC", claim).casefold()
+    claim = re.sub(r"\s+", " ", claim).strip()
+    return claim.rstrip(" .!?")
+
+
+def claim_key_prefix(claim: str) -> str:
+    """
+    Returns the part of the cache key shared by every entry for this claim.
+    """
+    return hashlib.sha256(normalize_claim(claim).encode()).hexdigest() + ":"
+
+
+def verdict_cache_key(claim: str, builtin_tools: list[str], models: dict[str, str]) -> str:
+    """
+    Builds the cache key for a claim researched with builtin_tools by the given models.
+
+    Args:
+        claim: The claim text
+        builtin_tools: Names of the builtin tools available to the research agent
+        models: Model name per agent, e.g. {'research': ..., 'reasoning': ...}
+    """
+    setup = json.dumps({"tools": sorted(set(builtin_tools)), "models": models}, sort_keys=True)
+    return claim_key_prefix(claim) + hashlib.sha256(setup.encode()).hexdigest()
+
+
+def get_cached_verdict(claim: str, builtin_tools: list[str], models: dict[str, str]) -> Optional[dict]:
+    """
+    Looks up a previous result for this claim.
+
+    Returns:
+        A dict with 'evidence', 'label' and 'justification', or None on a miss
+    """
+    if not VERDICT_CACHE_ENABLED:
+        return None
+    try:
+        cached = verdict_cache.get(verdict_cache_key(claim, builtin_tools, models))
+    except Exception as e:
+        print(f"Error reading verdict cache: {e}")
+        return None
+    return None if cached is MISSING else cached
+
+
+def cache_verdict(claim: str, builtin_tools: list[str], models: dict[str, str],
+                  evidence: list[Evidence], label: str, justification: str):
+    """
+    Stores the result of researching and reasoning about a claim.
+    """
+    if not VERDICT_CACHE_ENABLED:
+        return
+    try:
+        verdict_cache.set(verdict_cache_key(claim, builtin_tools, models), {
+            "evidence": evidence,
+            "label": label,
+            "justification": justification,
+        })
+    except Exception as e:
+        print(f"Error writing verdict cache: {e}")
+
+
+def purge_verdicts(claim: str = None) -> int:
+    """
+    Removes cached results for one claim (under any tool set or model), or for every
+    claim if none is given.
+
+    Returns:
+        The number of entries removed
+    """
+    if claim is None:
+        removed = verdict_cache.stats()["size"]
+        verdict_cache.clear()
+        return removed
+    return verdict_cache.delete_prefix(claim_key_prefix(claim))
+
+
+def verdict_cache_stats() -> dict:
+    """
+    Returns hit/miss counters and the size of the verdict cache.
+    """
+    return {"enabled": VERDICT_CACHE_ENABLED, "ttl": VERDICT_CACHE_TTL, **verdict_cache.stats()}
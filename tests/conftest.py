@@ -26,3 +26,14 @@ def setup_environment():
     
     # Restore original directory after test completes
     os.chdir(original_dir)
+
+
+@pytest.fixture(autouse=True)
+def isolated_tool_cache(monkeypatch):
+    """
+    Gives every test an empty, in-memory tool result cache, so mocked tool results don't
+    leak into other tests or into the shared SQLite cache.
+    """
+    from core.agents.tools import tool_cache
+    monkeypatch.setattr(tool_cache, "tool_cache", tool_cache.create_cache("tool_results", backend="memory"))
+    yield
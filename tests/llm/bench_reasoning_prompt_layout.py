@@ -0,0 +1,68 @@
+"""
+Benchmarks reasoning latency with the 'inline' and 'prefix' prompt layouts
+(REASONING_PROMPT_LAYOUT in core/agents/reasoning_agent.py) against a running Ollama.
+
+With 'prefix', the system prompt is byte-identical for every claim, so Ollama can reuse the
+KV cache of that prefix and only evaluates the tokens after it. prompt_eval_count counts
+the prompt tokens Ollama actually evaluated, so it drops when the prefix is reused.
+
+From the repo root:
+python -m tests.llm.bench_reasoning_prompt_layout [-n 20] [--layouts inline prefix]
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import core.agents.reasoning_agent as reasoning_agent
+
+DATA = Path(__file__).parent.parent / "langsmith" / "test_data"
+
+
+def load_states(limit: int) -> list[dict]:
+    cases = []
+    for name in ("reasoning_agent_direct_evidence.json", "reasoning_agent_indirect_evidence.json"):
+        with open(DATA / name) as f:
+            cases += [case["inputs"] for case in json.load(f)]
+    return cases[:limit]
+
+
+def run_layout(layout: str, states: list[dict]) -> dict:
+    reasoning_agent.REASONING_PROMPT_LAYOUT = layout
+    latencies, evaluated, prompt_seconds = [], [], []
+    for state in states:
+        messages = reasoning_agent.preprocessing({**state, "messages": []})["messages"]
+        start = time.perf_counter()
+        response = reasoning_agent.llm.invoke(messages)
+        latencies.append(time.perf_counter() - start)
+        metadata = response.response_metadata
+        evaluated.append(metadata.get("prompt_eval_count") or 0)
+        prompt_seconds.append((metadata.get("prompt_eval_duration") or 0) / 1e9)
+    return {
+        "layout": layout,
+        "calls": len(states),
+        "latency_p50": statistics.median(latencies),
+        "latency_mean": statistics.mean(latencies),
+        "prompt_tokens_evaluated_mean": statistics.mean(evaluated),
+        "prompt_eval_seconds_mean": statistics.mean(prompt_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reasoning prompt layouts")
+    parser.add_argument("-n", type=int, default=20, help="Number of claims per layout")
+    parser.add_argument("--layouts", nargs="+", default=["inline", "prefix"])
+    args = parser.parse_args()
+
+    states = load_states(args.n)
+    # Warm the model up so the first layout doesn't pay for loading it
+    run_layout(args.layouts[0], states[:1])
+    for layout in args.layouts:
+        result = run_layout(layout, states)
+        print(", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# app.py imports its siblings as top-level modules, like uvicorn running from core/
+sys.path.insert(0, str(Path(__file__).parents[2] / "core"))
+import app as api  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    api.app.dependency_overrides[api.get_staff_user] = lambda: {"id": 1, "is_staff": True}
+    yield TestClient(api.app)
+    api.app.dependency_overrides.clear()
+
+
+def loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def recording(calls: list, result):
+    """
+    Stands in for a cache function, recording whether it was called on the event loop.
+    """
+    def func(*args):
+        calls.append(loop_running())
+        return result
+    return func
+
+
+def test_verdict_cache_io_runs_off_the_event_loop(client, monkeypatch):
+    on_loop = []
+    monkeypatch.setattr(api, "purge_verdicts", recording(on_loop, 3))
+    monkeypatch.setattr(api, "verdict_cache_stats", recording(on_loop, {"size": 0}))
+
+    assert client.delete("/admin/cache/verdicts", params={"claim": "x"}).json()["removed"] == 3
+    assert client.get("/admin/cache/stats").json()["verdicts"] == {"size": 0}
+
+    assert on_loop == [False, False]
+
+
+def test_tool_cache_io_runs_off_the_event_loop(client, monkeypatch):
+    on_loop = []
+    monkeypatch.setattr(api, "purge_tool_results", recording(on_loop, 5))
+    monkeypatch.setattr(api, "tool_cache_stats", recording(on_loop, {"size": 0}))
+
+    assert client.delete("/admin/cache/tools", params={"tool": "wikipedia"}).json()["removed"] == 5
+    assert client.get("/admin/cache/stats").json()["tool_results"] == {"size": 0}
+
+    assert on_loop == [False, False]
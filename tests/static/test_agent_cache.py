@@ -0,0 +1,146 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import core.agents.research_agent as research_agent
+
+# app.py imports its siblings as top-level modules, like uvicorn running from core/
+sys.path.insert(0, str(Path(__file__).parents[2] / "core"))
+import app as api  # noqa: E402
+
+
+def user_tool(name: str, url: str = "https://example.com/{q}") -> dict:
+    return {"name": name, "method": "GET", "url_template": url, "param_mapping": {"q": {"type": "str"}}}
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """
+    Replaces agent compilation with a stub, returning the list of agents built.
+    """
+    built = []
+
+    def create_agent(model, builtin_tools, user_tool_kwargs):
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(research_agent, "create_agent", create_agent)
+    research_agent.invalidate_agent_cache()
+    monkeypatch.setattr(research_agent, "_agent_cache_stats",
+                        {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+    yield built
+    research_agent.invalidate_agent_cache()
+
+
+def test_same_model_and_tools_reuse_the_agent(builds):
+    first = research_agent.get_agent("mistral-nemo", ["wikipedia", "web_search"])
+    # Tool order doesn't matter
+    assert research_agent.get_agent("mistral-nemo", ["web_search", "wikipedia"]) is first
+    assert research_agent.get_agent("llama3", ["wikipedia", "web_search"]) is not first
+    # Editing a user tool changes its fingerprint, so the old agent isn't served
+    with_tool = research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("pokeapi")], user_id=1)
+    edited = research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("pokeapi", "https://x/{q}")], user_id=1)
+    assert edited is not with_tool
+
+    info = research_agent.agent_cache_info()
+    assert (info["hits"], info["misses"], info["size"]) == (1, 4, 4)
+
+
+def test_cache_is_a_bounded_lru(builds, monkeypatch):
+    monkeypatch.setattr(research_agent, "AGENT_CACHE_SIZE", 2)
+    a = research_agent.get_agent("mistral-nemo", ["a"])
+    research_agent.get_agent("mistral-nemo", ["b"])
+    # Using a makes b the least recently used
+    assert research_agent.get_agent("mistral-nemo", ["a"]) is a
+    research_agent.get_agent("mistral-nemo", ["c"])
+
+    assert research_agent.agent_cache_info()["evictions"] == 1
+    assert research_agent.get_agent("mistral-nemo", ["a"]) is a
+    research_agent.get_agent("mistral-nemo", ["b"])
+    assert len(builds) == 4
+
+
+def test_invalidation_is_scoped_to_the_user(builds):
+    shared = research_agent.get_agent("mistral-nemo", ["wikipedia"], user_id=1)
+    mine = research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("pokeapi")], user_id=1)
+    theirs = research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("weather")], user_id=2)
+
+    assert research_agent.invalidate_agent_cache(1) == 1
+
+    # Agents without user tools belong to nobody and survive
+    assert research_agent.get_agent("mistral-nemo", ["wikipedia"], user_id=1) is shared
+    assert research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("weather")], user_id=2) is theirs
+    assert research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("pokeapi")], user_id=1) is not mine
+
+
+class FakeCursor:
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.lastrowid = 7
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        pass
+
+    async def fetchone(self):
+        return self.rows.pop(0)
+
+
+class FakeConnection:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A client for user 1, whose queries get `rows` as their fetchone() results in turn.
+    """
+    rows = []
+
+    @asynccontextmanager
+    async def get_connection():
+        yield FakeConnection(rows)
+
+    monkeypatch.setattr(api, "get_connection", get_connection)
+    api.app.dependency_overrides[api.get_current_user] = lambda: {"id": 1, "is_staff": False}
+    yield TestClient(api.app), rows
+    api.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("request_args, rows", [
+    (("post", "/tools/custom", {"json": {"name": "pokeapi", "method": "GET", "url_template": "https://x/{q}",
+                                         "param_mapping": {"q": {"type": "str", "for": "url_params"}}}}),
+     [None, (7, "pokeapi", "", "GET", "https://x/{q}", "2025-01-01T00:00:00", 1)]),
+    (("delete", "/tools/custom/7", {}), [(7,)]),
+    (("post", "/tools/preferences", {"json": {"tools": ["pokeapi"]}}), []),
+])
+def test_tool_changes_invalidate_the_users_agents(builds, client, request_args, rows):
+    client, fetched = client
+    fetched.extend(rows)
+    research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("pokeapi")], user_id=1)
+    theirs = research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("weather")], user_id=2)
+
+    method, path, kwargs = request_args
+    response = getattr(client, method)(path, **kwargs)
+
+    assert response.status_code == 200, response.text
+    assert research_agent.agent_cache_info()["invalidations"] == 1
+    assert research_agent.get_agent("mistral-nemo", ["wikipedia"], [user_tool("weather")], user_id=2) is theirs
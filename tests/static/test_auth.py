@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from core.cache import create_cache
+from core.middlewares import auth
+from core.middlewares.auth import APIKeyMiddleware
+
+USER = {"id": 1, "username": "tester", "email": "t@example.com", "is_staff": False}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    An app behind APIKeyMiddleware, where only the key 'valid' belongs to a user.
+    """
+    lookups = []
+
+    async def fetch_user_from_api_key(self, api_key):
+        lookups.append(api_key)
+        return USER if api_key == "valid" else None
+
+    monkeypatch.setattr(APIKeyMiddleware, "fetch_user_from_api_key", fetch_user_from_api_key)
+    app = FastAPI()
+    app.add_middleware(APIKeyMiddleware)
+
+    @app.get("/me")
+    async def me(request: Request):
+        return {"user": request.state.user, "thread": threading.current_thread().name}
+
+    return app, lookups
+
+
+def test_users_are_cached(app, monkeypatch):
+    monkeypatch.setattr(auth, "api_key_cache", create_cache("api_keys", backend="memory"))
+    app, lookups = app
+    client = TestClient(app)
+
+    for key in ("valid", "valid", "bogus", "bogus"):
+        client.get("/me", headers={"X-API-Key": key})
+
+    assert client.get("/me", headers={"X-API-Key": "valid"}).json()["user"] == USER
+    assert lookups == ["valid", "bogus"]
+
+
+def test_sqlite_cache_is_used_off_the_event_loop(app, monkeypatch, tmp_path):
+    cache = create_cache("api_keys", backend="sqlite", path=str(tmp_path / "cache.sqlite3"))
+    threads = []
+
+    class RecordingCache:
+        blocking = True
+
+        def get(self, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return cache.get(*args, **kwargs)
+
+        def set(self, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            cache.set(*args, **kwargs)
+
+    monkeypatch.setattr(auth, "api_key_cache", RecordingCache())
+    app, lookups = app
+    client = TestClient(app)
+
+    first = client.get("/me", headers={"X-API-Key": "valid"}).json()
+    second = client.get("/me", headers={"X-API-Key": "valid"}).json()
+
+    assert first["user"] == second["user"] == USER and lookups == ["valid"]
+    # get and set, then get, none of them on the event loop's thread
+    assert len(threads) == 3 and first["thread"] not in threads
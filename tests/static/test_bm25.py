@@ -0,0 +1,27 @@
+from core.agents.utils.bm25 import BM25, rank, tokenize
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("The Eiffel Tower is in Paris!") == ["eiffel", "tower", "paris"]
+
+
+def test_rank_prefers_matching_texts():
+    texts = [
+        "The weather in Lisbon is mild.",
+        "Pikachu stores electricity in its cheeks.",
+        "Electricity prices rose in 2022.",
+    ]
+    ranking = rank("pikachu electricity", texts)
+    assert ranking[0][0] == 1
+    assert ranking[-1] == (0, 0.0)
+
+
+def test_rare_terms_weigh_more():
+    index = BM25([["cat", "dog"], ["cat"], ["cat", "fish"]])
+    dog, cat = index.scores(["dog"])[0], index.scores(["cat"])[0]
+    assert dog > cat > 0
+
+
+def test_empty_inputs():
+    assert BM25([]).scores(["a"]) == []
+    assert rank("", ["text"]) == [(0, 0.0)]
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from core.cache import MISSING, SQLiteTTLCache, TTLCache, create_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    return create_cache(
+        "test", backend=request.param, max_size=3, ttl=60, path=str(tmp_path / "cache.sqlite3")
+    )
+
+
+def test_get_returns_missing_for_unknown_key(cache):
+    assert cache.get("nope") is MISSING
+    assert cache.get("nope", default=None) is None
+
+
+def test_set_then_get(cache):
+    cache.set("a", {"id": 1, "tags": ["x"]})
+    assert cache.get("a") == {"id": 1, "tags": ["x"]}
+
+
+def test_none_can_be_cached(cache):
+    cache.set("negative", None)
+    assert cache.get("negative") is None
+
+
+def test_entries_expire(cache):
+    cache.set("short", "value", ttl=0.01)
+    time.sleep(0.05)
+    assert cache.get("short") is MISSING
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in ["a", "b", "c"]:
+        cache.set(key, key)
+        time.sleep(0.001)
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a") == "a"
+    time.sleep(0.001)
+    cache.set("d", "d")
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == "a"
+    assert cache.stats()["size"] == 3
+
+
+def test_delete_and_clear(cache):
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.delete("a") is True
+    assert cache.delete("a") is False
+    cache.clear()
+    assert cache.get("b") is MISSING
+
+
+def test_delete_prefix(cache):
+    cache.set("claim1:tools1", 1)
+    cache.set("claim1:tools2", 2)
+    cache.set("claim2:tools1", 3)
+    assert cache.delete_prefix("claim1:") == 2
+    assert cache.get("claim1:tools2") is MISSING
+    assert cache.get("claim2:tools1") == 3
+
+
+def test_stats_count_hits_and_misses(cache):
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    writer = SQLiteTTLCache("shared", path=path)
+    reader = SQLiteTTLCache("shared", path=path)
+    other_namespace = SQLiteTTLCache("other", path=path)
+    writer.set("key", [1, 2, 3])
+    assert reader.get("key") == [1, 2, 3]
+    assert other_namespace.get("key") is MISSING
+
+
+def test_create_cache_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        create_cache("test", backend="redis")
+
+
+def test_memory_cache_without_ttl_never_expires():
+    cache = TTLCache(max_size=2, ttl=None)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
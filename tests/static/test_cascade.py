@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from core.agents.utils import cascade
+from core.agents.utils.llm_factory import with_cascade
+
+FORMAT = {
+    "type": "object",
+    "properties": {
+        "label": {"type": "string", "enum": ["true", "false", "unknown"]},
+        "justification": {"type": "string"},
+    },
+    "required": ["label", "justification"],
+}
+SMALL_FORMAT = cascade.with_confidence(FORMAT)
+
+
+def answer(label: str, confidence: float = 0.9) -> str:
+    return json.dumps({"label": label, "justification": "because", "confidence": confidence})
+
+
+def test_escalation_reasons():
+    assert cascade.escalation_reason(answer("true"), SMALL_FORMAT, 0.7) is None
+    assert cascade.escalation_reason("not json", SMALL_FORMAT, 0.7) == cascade.INVALID
+    assert cascade.escalation_reason(json.dumps({"label": "true"}), SMALL_FORMAT, 0.7) == cascade.INVALID
+    assert cascade.escalation_reason(answer("maybe"), SMALL_FORMAT, 0.7) == cascade.INVALID
+    assert cascade.escalation_reason(answer("unknown"), SMALL_FORMAT, 0.7) == cascade.UNKNOWN
+    assert cascade.escalation_reason(answer("false", 0.4), SMALL_FORMAT, 0.7) == cascade.LOW_CONFIDENCE
+
+
+def test_cascade_escalates_only_untrusted_answers():
+    small = FakeListChatModel(responses=[answer("true"), answer("unknown"), answer("false", 0.2)])
+    large = FakeListChatModel(responses=[answer("false"), answer("true")])
+    llm = cascade.CascadeChatModel(small_llm=small, large_llm=large, small_format=SMALL_FORMAT,
+                                   agent_name="test_cascade", threshold=0.7)
+
+    first = llm.invoke("claim one")
+    second = asyncio.run(llm.ainvoke("claim two"))
+    third = llm.invoke("claim three")
+
+    assert json.loads(first.content)["label"] == "true"
+    assert first.response_metadata["cascade_tier"] == "small"
+    assert json.loads(second.content)["label"] == "false"
+    assert second.response_metadata["cascade_tier"] == "large"
+    assert third.response_metadata["cascade_tier"] == "large"
+    stats = cascade.cascade_stats()["test_cascade"]
+    assert (stats["calls"], stats["small"], stats["large"]) == (3, 1, 2)
+    assert stats["escalations"] == {cascade.INVALID: 0, cascade.UNKNOWN: 1, cascade.LOW_CONFIDENCE: 1}
+
+
+class RecordingModel(FakeListChatModel):
+    """
+    FakeListChatModel keeping the messages and kwargs of each call.
+    """
+
+    calls: list = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append((messages, kwargs))
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+
+class RunRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.runs = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self.runs.append((run_id, parent_run_id, kwargs.get("name")))
+
+
+def test_tiers_run_as_children_with_the_callers_kwargs():
+    small = RecordingModel(responses=[answer("false", 0.2)], calls=[])
+    large = RecordingModel(responses=[answer("true")], calls=[])
+    llm = cascade.CascadeChatModel(small_llm=small, large_llm=large, small_format=SMALL_FORMAT,
+                                   agent_name="test_children", threshold=0.7).bind(options={"seed": 1})
+    recorder = RunRecorder()
+    messages = [SystemMessage(content="You check claims."), HumanMessage(content="Claim: x")]
+
+    asyncio.run(llm.ainvoke(messages, config={"callbacks": [recorder]}))
+
+    (cascade_run, _, _), *tiers = recorder.runs
+    assert [(parent, name) for _, parent, name in tiers] == \
+        [(cascade_run, "test_children_small"), (cascade_run, "test_children_large")]
+    assert small.calls[0][1] == large.calls[0][1] == {"options": {"seed": 1}}
+    # Only the small model is told what its confidence means
+    assert small.calls[0][0][0].content.endswith(cascade.CONFIDENCE_INSTRUCTION)
+    assert large.calls[0][0] == messages
+
+
+def test_no_small_model_keeps_the_model():
+    llm = FakeListChatModel(responses=["x"])
+    assert with_cascade(llm, "reasoning_agent", None, FORMAT) is llm
+    assert with_cascade(llm, "reasoning_agent", "", FORMAT) is llm
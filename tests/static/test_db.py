@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiomysql
+import pytest
+
+from core import db
+
+
+class FakeConnection:
+    def __init__(self, ping_fails: bool = False):
+        self.ping_fails = ping_fails
+        self.pings = 0
+        self.closed = False
+
+    async def ping(self, reconnect: bool = False):
+        self.pings += 1
+        if self.ping_fails:
+            raise aiomysql.OperationalError(2003, "Can't connect to MySQL server")
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(db, "_pool", FakePool(connection))
+    return connection
+
+
+def test_healthy_borrow_has_no_round_trip(connection):
+    async def borrow():
+        async with db.get_connection() as borrowed:
+            return borrowed
+
+    assert asyncio.run(borrow()) is connection
+    assert connection.pings == 0
+
+
+def test_operational_error_reconnects(connection):
+    async def borrow():
+        async with db.get_connection():
+            raise aiomysql.OperationalError(2013, "Lost connection to MySQL server during query")
+
+    with pytest.raises(aiomysql.OperationalError):
+        asyncio.run(borrow())
+    assert connection.pings == 1
+    assert not connection.closed
+
+
+def test_connection_that_cant_reconnect_is_closed(connection):
+    connection.ping_fails = True
+
+    async def borrow():
+        async with db.get_connection():
+            raise aiomysql.OperationalError(2013, "Lost connection to MySQL server during query")
+
+    with pytest.raises(aiomysql.OperationalError, match="Lost connection"):
+        asyncio.run(borrow())
+    assert connection.closed
+
+
+def test_other_errors_leave_the_connection_alone(connection):
+    async def borrow():
+        async with db.get_connection():
+            raise ValueError("bad row")
+
+    with pytest.raises(ValueError):
+        asyncio.run(borrow())
+    assert connection.pings == 0 and not connection.closed
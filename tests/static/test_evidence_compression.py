@@ -0,0 +1,94 @@
+import pytest
+
+from core.agents.utils.common_types import Evidence
+from core.agents.utils.evidence_compression import compress_evidence, estimate_tokens, result_text
+
+CLAIM = "The Eiffel Tower is located in Paris"
+
+WORDS = "gardening soil compost roses tulips watering pruning seeds shade mulch clay worms ferns hedges".split()
+# Forty unrelated sentences that don't repeat each other
+FILLER = " ".join(f"Note {i} covers {WORDS[i % 14]}, {WORDS[(i * 3 + 1) % 14]} and {WORDS[(i * 5 + 2) % 14]} in "
+                  f"chapter {i * 7}." for i in range(40))
+
+
+def evidence(name: str, result) -> Evidence:
+    return Evidence(name=name, args={"query": name}, result=result)
+
+
+def test_small_evidence_passes_through_without_exact_duplicates():
+    items = [evidence("wikipedia", "The Eiffel Tower is in Paris."), evidence("wikipedia", "The Eiffel Tower is in Paris."),
+             evidence("web_search", [{"content": "Paris, France", "source": "https://example.com"}])]
+
+    compressed, audit = compress_evidence(CLAIM, items, budget=1000)
+
+    assert compressed == [items[0], items[2]]
+    assert [(entry["reason"], entry["dropped"]) for entry in audit] == [("duplicate", True)]
+
+
+def test_large_evidence_is_cut_to_budget_keeping_relevant_sentences():
+    items = [
+        evidence("wikipedia", FILLER + " The Eiffel Tower is a wrought-iron tower located in Paris. " + FILLER),
+        evidence("web_search", "Located in Paris, the Eiffel Tower is a wrought-iron tower. " + FILLER),
+    ]
+
+    compressed, audit = compress_evidence(CLAIM, items, budget=60)
+
+    text = " ".join(result_text(ev["result"]) for ev in compressed)
+    assert sum(estimate_tokens(result_text(ev["result"])) for ev in compressed) <= 60
+    assert "The Eiffel Tower is a wrought-iron tower located in Paris." in text
+    # The second source says the same thing in other words, so it is dropped as a near duplicate
+    assert [entry["name"] for entry in audit] == ["wikipedia", "web_search"]
+    assert audit[0]["reason"] == "sentences"
+    reasons = {sentence["reason"] for entry in audit for sentence in entry["dropped_sentences"]}
+    assert reasons == {"budget", "duplicate"}
+
+
+def test_every_source_keeps_its_best_sentence():
+    items = [evidence(f"tool_{i}", f"Eiffel fact {i} from Paris. " + FILLER) for i in range(3)]
+
+    compressed, _ = compress_evidence(CLAIM, items, budget=80)
+
+    assert [ev["name"] for ev in compressed] == ["tool_0", "tool_1", "tool_2"]
+    assert all(ev["result"].startswith("Eiffel fact") for ev in compressed)
+
+
+def test_structured_results_are_cut_per_field_keeping_their_source():
+    hits = [{"content": FILLER + " The Eiffel Tower is located in Paris.", "source": "https://example.com/eiffel"},
+            {"content": FILLER.replace("Note", "Entry"), "source": "https://example.com/garden"}]
+    items = [evidence("web_search", hits),
+             evidence("pokeapi", {"name": "eiffel", "stats": {"height": 330, "summary": FILLER}})]
+
+    compressed, audit = compress_evidence(CLAIM, items, budget=80)
+
+    search = compressed[0]["result"]
+    # Still a list of hits, each with its URL, minus the hit that lost all its content
+    assert isinstance(search, list) and all(set(hit) == {"content", "source"} for hit in search)
+    assert search[0]["source"] == "https://example.com/eiffel"
+    assert "The Eiffel Tower is located in Paris." in search[0]["content"]
+    assert "https://example.com/garden" not in [hit["source"] for hit in search]
+    assert [entry["reason"] for entry in audit] == ["sentences", "sentences"]
+    # The custom tool's JSON keeps its shape and its non-text fields
+    tool = compressed[1]["result"]
+    assert tool["name"] == "eiffel" and tool["stats"]["height"] == 330
+    assert len(tool["stats"]["summary"]) < len(FILLER)
+
+
+def test_none_and_unknown_methods():
+    items = [evidence("wikipedia", FILLER)]
+    assert compress_evidence(CLAIM, items, budget=10, method="none") == (items, [])
+    with pytest.raises(ValueError):
+        compress_evidence(CLAIM, items, method="abstractive")
+
+
+def test_reasoning_agent_compresses_before_prompting(monkeypatch):
+    import core.agents.reasoning_agent as reasoning_agent
+
+    monkeypatch.setattr("core.agents.utils.evidence_compression.EVIDENCE_TOKEN_BUDGET", 30)
+    state = {"claim": CLAIM, "evidence": [evidence("wikipedia", FILLER + " The Eiffel Tower is in Paris.")]}
+
+    update = reasoning_agent.compression(state)
+    prompt = reasoning_agent.preprocessing({**state, **update})["messages"][0].content
+
+    assert "The Eiffel Tower is in Paris." in prompt
+    assert "Note 39" not in prompt
+    assert update["evidence_audit"][0]["kept_tokens"] <= 30
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from core.agents.tools import http_client
+from core.agents.tools.tool_registry import create_tool
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        if request.url.path == "/big":
+            return httpx.Response(200, content=b"x" * 100)
+        return httpx.Response(200, json={"outer": {"inner": 42}, "echo": request.content.decode()})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "get_async_client", lambda: client)
+    sync_client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "get_client", lambda: sync_client)
+    return sent
+
+
+def test_async_tool_uses_shared_client(transport):
+    tool = create_tool(
+        name="async_tool",
+        method="POST",
+        url_template="https://api.example.com/items/{item}",
+        headers={"Accept": "application/json"},
+        param_mapping={"item": {"type": "str", "for": "url_params"}, "name": {"type": "str", "for": "json"}},
+        target_fields=[["outer", "inner"], ["echo"]],
+    )
+
+    result = asyncio.run(tool.ainvoke({"item": "abc", "name": "alice"}))
+
+    assert result[0] == 42
+    assert json.loads(result[1]) == {"name": "alice"}
+    assert str(transport[0].url) == "https://api.example.com/items/abc"
+    assert transport[0].headers["accept"] == "application/json"
+    assert http_client.http_client_stats()["hosts"]["api.example.com"]["requests"] >= 1
+
+
+def test_empty_body_is_not_sent(transport):
+    tool = create_tool(name="get_tool", method="GET", url_template="https://api.example.com/data")
+    asyncio.run(tool.ainvoke({}))
+    assert transport[0].content == b""
+
+
+def test_oversized_response_is_rejected(transport, monkeypatch):
+    monkeypatch.setattr(http_client, "TOOL_HTTP_MAX_RESPONSE_BYTES", 10)
+    tool = create_tool(name="big_tool", method="GET", url_template="https://api.example.com/big")
+    with pytest.raises(http_client.ResponseTooLarge):
+        asyncio.run(tool.ainvoke({}))
+
+
+def test_sync_tool_uses_shared_client(transport):
+    tool = create_tool(
+        name="sync_tool",
+        method="POST",
+        url_template="https://sync.example.com/items/{item}",
+        param_mapping={"item": {"type": "str", "for": "url_params"}, "name": {"type": "str", "for": "json"}},
+        target_fields=[["outer", "inner"], ["echo"]],
+    )
+
+    result = tool.invoke({"item": "abc", "name": "alice"})
+
+    assert result[0] == 42
+    assert json.loads(result[1]) == {"name": "alice"}
+    assert http_client.http_client_stats()["hosts"]["sync.example.com"]["requests"] >= 1
+
+
+def test_sync_empty_body_is_not_sent(transport):
+    tool = create_tool(name="sync_get_tool", method="GET", url_template="https://api.example.com/data")
+    tool.invoke({})
+    assert transport[0].content == b""
+
+
+def test_sync_oversized_response_is_rejected(transport, monkeypatch):
+    monkeypatch.setattr(http_client, "TOOL_HTTP_MAX_RESPONSE_BYTES", 10)
+    tool = create_tool(name="sync_big_tool", method="GET", url_template="https://api.example.com/big")
+    with pytest.raises(http_client.ResponseTooLarge):
+        tool.invoke({})
@@ -0,0 +1,97 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.agents.tools.json_projection import compile_target_fields
+from core.agents.tools.tool_registry import create_tool
+
+DOCUMENT = {
+    "abilities": [
+        {"ability": {"name": "static", "url": "https://pokeapi.co/ability/9/"}, "slot": 1},
+        {"ability": {"name": "lightning-rod", "url": "https://pokeapi.co/ability/31/"}, "slot": 3},
+    ],
+    "moves": [{"move": {"name": f"move-{i}"}, "details": [{"level": i, "note": "a \"quoted\" ]}"}]} for i in range(50)],
+    "name": "pikachu",
+    "items": [],
+    "stats": [{"base_stat": 35}, {"base_stat": 55}, {"base_stat": 90}],
+}
+
+
+@pytest.mark.parametrize("paths", [
+    [["abilities", 0, "ability", "name"], ["abilities", 1, "ability", "name"]],
+    [["name"], ["stats", -1, "base_stat"]],
+    [["moves", 49, "details", 0, "note"]],
+    [["abilities", 0], ["abilities", 0, "slot"]],
+    [["items"]],
+    [[]],
+])
+def test_loads_matches_full_decode(paths):
+    projection = compile_target_fields(paths)
+    expected = projection.extract(json.loads(json.dumps(DOCUMENT)))
+    assert projection.loads(json.dumps(DOCUMENT, indent=2).encode()) == expected
+
+
+@pytest.mark.parametrize("path, error", [
+    (["missing"], KeyError),
+    (["abilities", 0, "missing"], KeyError),
+    (["name", 10], IndexError),
+    (["abilities", 5], IndexError),
+    (["abilities", "first"], TypeError),
+    (["stats", 0, 0], KeyError),
+])
+def test_missing_paths_raise(path, error):
+    with pytest.raises(error):
+        compile_target_fields([path]).loads(json.dumps(DOCUMENT))
+
+
+def test_invalid_json_raises_value_error():
+    with pytest.raises(ValueError):
+        compile_target_fields([["a"]]).loads(b'{"b": [1, 2,, 3], "a": 1}')
+
+
+@pytest.mark.parametrize("target_fields", [
+    "name",
+    [["abilities", 0.5]],
+    [["abilities", True]],
+    ["name"],
+    [[["nested"]]],
+])
+def test_create_tool_rejects_malformed_target_fields(target_fields):
+    with pytest.raises(ValueError):
+        create_tool(name="bad_tool", method="GET", url_template="https://api.com", target_fields=target_fields)
+
+
+def test_create_tool_projects_response_body(monkeypatch):
+    class MockResponse:
+        content = json.dumps(DOCUMENT).encode()
+
+        def json(self):
+            raise AssertionError("the body should be projected, not fully decoded")
+
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", lambda *args, **kwargs: MockResponse())
+
+    tool = create_tool(
+        name="pokemon_tool",
+        method="GET",
+        url_template="https://pokeapi.co/api/v2/pokemon/pikachu",
+        target_fields=[["abilities", 0, "ability", "name"], ["name"]],
+    )
+
+    assert tool.invoke({}) == ["static", "pikachu"]
+
+
+def test_projection_is_safe_to_share_between_threads():
+    projection = compile_target_fields([["id"], ["items", 1, "name"], ["tail"]])
+    documents = [
+        (json.dumps({"id": i, "items": [{"name": "a"}, {"name": f"item {i}"}],
+                     "filler": ["x" * 50] * (i % 7 * 200), "tail": i * 2}), [i, f"item {i}", i * 2])
+        for i in range(200)
+    ]
+
+    def project(document_expected):
+        document, expected = document_expected
+        return projection.loads(document) == expected
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(project, documents * 5))
@@ -0,0 +1,71 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langchain_ollama import ChatOllama
+
+from core.agents.utils import llm_cache, llm_factory
+from core.agents.utils.llm_cache import LLMResponseCache
+
+
+@tool
+def lookup(query: str) -> str:
+    """Looks something up."""
+    return query
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = LLMResponseCache(max_size=10, path=str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_llm_cache", cache)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_AGENTS", "reasoning_agent")
+    return cache
+
+
+@pytest.fixture
+def generate():
+    calls = []
+
+    def fake_generate(self, messages, stop=None, run_manager=None, **kwargs):
+        calls.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"answer {len(calls)}"))])
+
+    with patch.object(ChatOllama, "_generate", fake_generate):
+        yield calls
+
+
+def test_cache_is_only_attached_to_enabled_agents(cache):
+    llm = llm_factory.get_chat_model(model_name="mistral-nemo")
+    assert llm_factory.with_llm_cache(llm, "reasoning_agent").cache.store is cache.store
+    assert llm_factory.with_llm_cache(llm, "verdict_agent") is llm
+    assert isinstance(llm_factory.with_llm_cache(llm, "reasoning_agent"), ChatOllama)
+
+
+def test_identical_calls_are_answered_from_cache(cache, generate):
+    llm = llm_factory.with_llm_cache(llm_factory.get_chat_model(model_name="mistral-nemo"), "reasoning_agent")
+    messages = [HumanMessage(content="Is the earth round?")]
+
+    assert llm.invoke(messages).content == "answer 1"
+    assert llm.invoke(messages).content == "answer 1"
+    assert asyncio.run(llm.ainvoke(messages)).content == "answer 1"
+    assert len(generate) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_messages_format_and_tools_are_part_of_the_key(cache, generate):
+    plain = llm_factory.with_llm_cache(llm_factory.get_chat_model(model_name="mistral-nemo"), "reasoning_agent")
+    formatted = llm_factory.with_llm_cache(
+        llm_factory.get_chat_model(model_name="mistral-nemo", format_output={"type": "array"}), "reasoning_agent")
+
+    other_model = llm_factory.with_llm_cache(llm_factory.get_chat_model(model_name="llama3"), "reasoning_agent")
+    messages = [HumanMessage(content="Is the earth round?")]
+
+    plain.invoke(messages)
+    plain.invoke([HumanMessage(content="Is the sky blue?")])
+    formatted.invoke(messages)
+    other_model.invoke(messages)
+    plain.bind_tools([lookup]).invoke(messages)
+    assert len(generate) == 5
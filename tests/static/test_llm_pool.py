@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from core.agents.utils import llm_factory, llm_pool
+from core.agents.utils.ollama_balancer import OllamaBalancer
+from core.agents.utils.llm_factory import get_chat_model
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/hang":
+            # Answers the connection, then never the request, like a stuck generation
+            time.sleep(2)
+        status = 503 if self.path == "/fail" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(llm_pool, "_pools", {})
+    monkeypatch.setattr(llm_factory, "_chat_models", {})
+    monkeypatch.setattr(llm_factory, "_chat_model_stats", {"hits": 0, "misses": 0})
+    monkeypatch.setattr(llm_factory, "ollama_base_urls", lambda: ["http://ollama:11434"])
+    monkeypatch.setattr(llm_factory, "OLLAMA_MODEL_AFFINITY", False)
+
+
+def test_get_chat_model_memoizes():
+    first = get_chat_model("mistral-nemo", format_output={"type": "object"})
+    assert get_chat_model("mistral-nemo", format_output={"type": "object"}) is first
+    assert get_chat_model("mistral-nemo") is not first
+    assert llm_factory.chat_model_cache_info()["hits"] == 1
+
+
+def test_models_on_one_backend_share_its_pool():
+    reasoning = get_chat_model("mistral-nemo", format_output={"type": "object", "properties": {"label": {}}})
+    verdict = get_chat_model("llama3", format_output={"type": "object", "properties": {"final_label": {}}})
+
+    pool = llm_pool.get_backend_pool("ollama", "http://ollama:11434")
+    assert reasoning.client_kwargs["transport"] is pool.transport
+    assert verdict.client_kwargs["transport"] is pool.transport
+    assert len(llm_pool.llm_pool_stats()) == 1
+
+
+def test_custom_client_settings_skip_the_pool():
+    llm = get_chat_model("mistral-nemo", client_kwargs={"verify": False})
+    assert llm.client_kwargs == {"verify": False}
+
+
+def test_sync_and_async_clients_share_the_transport(server):
+    pool = llm_pool.get_backend_pool("openai", server)
+
+    assert pool.client.get(f"{server}/ok").status_code == 200
+
+    async def fetch():
+        return (await pool.async_client.get(f"{server}/fail")).status_code
+
+    assert asyncio.run(fetch()) == 503
+    stats = pool.stats()
+    assert (stats["requests"], stats["errors"]) == (2, 1)
+    # The sync connection was kept alive for reuse
+    assert stats["open_connections"] >= 1
+
+
+def test_hung_backend_times_out_and_is_ejected(server, monkeypatch):
+    monkeypatch.setattr(llm_pool, "LLM_POOL_TIMEOUT", 0.2)
+    balancer = OllamaBalancer([server])
+
+    with pytest.raises(httpx.ReadTimeout):
+        with balancer.route("mistral-nemo") as backend:
+            with httpx.Client(base_url=server, **backend.pool.client_kwargs) as client:
+                client.get("/hang")
+
+    assert backend.is_ejected(time.monotonic())
+    assert backend.pool.stats()["errors"] == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+from core.agents.utils.model_scheduler import ModelScheduler
+
+
+async def call(scheduler: ModelScheduler, model: str, log: list, duration: float = 0.02, load: int = None):
+    async with scheduler.aslot(model) as slot:
+        log.append(model)
+        await asyncio.sleep(duration)
+        slot["response"] = {"done": True, "load_duration": load}
+
+
+def test_drains_one_model_before_swapping():
+    scheduler = ModelScheduler("host", slots=2, max_wait=10)
+    log = []
+
+    async def run():
+        # a, b, a, b... arriving together run as all a's, then all b's
+        await asyncio.gather(*(call(scheduler, model, log, load=2_000_000_000 if model == "b" else None)
+                               for model in ["a", "b"] * 3))
+
+    asyncio.run(run())
+
+    assert log == ["a", "a", "a", "b", "b", "b"]
+    stats = scheduler.stats()
+    assert stats["swaps"] == 1
+    assert stats["forced_swaps"] == 0
+    assert stats["last_load_seconds"] == 2.0
+    assert stats["running"] == 0 and stats["waiting"] == {}
+
+
+def test_waiting_model_is_not_starved():
+    scheduler = ModelScheduler("host", slots=1, max_wait=0.05)
+    log = []
+
+    async def keep_calling(model: str, count: int):
+        for _ in range(count):
+            asyncio.create_task(call(scheduler, model, log))
+            await asyncio.sleep(0.01)
+
+    async def run():
+        feeder = asyncio.create_task(keep_calling("a", 30))
+        await asyncio.sleep(0.005)
+        await call(scheduler, "b", log)
+        feeder.cancel()
+
+    asyncio.run(run())
+
+    # b got in once it had waited past the bound, well before a's stream of calls ended
+    assert log.index("b") < 8
+    assert scheduler.stats()["forced_swaps"] >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = ModelScheduler("host", slots=1, max_wait=10)
+    log = []
+
+    async def run():
+        running = asyncio.create_task(call(scheduler, "a", log, duration=0.05))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(call(scheduler, "b", log))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await running
+        await call(scheduler, "a", log)
+
+    asyncio.run(run())
+
+    assert log == ["a", "a"]
+    assert scheduler.stats()["swaps"] == 0
+
+
+def test_sync_slots():
+    scheduler = ModelScheduler("host", slots=1, max_wait=10)
+    with scheduler.slot("a"):
+        assert scheduler.stats()["running"] == 1
+    with scheduler.slot("b"):
+        assert scheduler.stats()["active_model"] == "b"
+    assert scheduler.stats()["swaps"] == 1
@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+from core.agents.utils import model_warmup
+from core.agents.utils.common_types import Evidence
+from core.agents.utils.model_warmup import ModelWarmup
+from core.agents.utils.tokens import OLLAMA_CTX_BUCKETS, ContextSizer, estimate_message_tokens, needed_tokens
+
+
+class FakeClient:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.loaded = {}
+        self.calls = []
+
+    async def generate(self, model: str, prompt: str, options: dict):
+        self.calls.append((model, options["num_ctx"]))
+        if self.fail:
+            raise ConnectionError("host down")
+        self.loaded[model] = options["num_ctx"]
+        return {"done": True, "load_duration": 1_500_000_000}
+
+    async def ps(self):
+        if self.fail:
+            raise ConnectionError("host down")
+        return SimpleNamespace(models=[SimpleNamespace(model=model, name=model, context_length=num_ctx)
+                                       for model, num_ctx in self.loaded.items()])
+
+
+def make_warmup(monkeypatch, clients: dict, models: list[str]) -> ModelWarmup:
+    warmup = ModelWarmup(models, list(clients), interval=0, timeout=1)
+    monkeypatch.setattr(warmup, "_client", clients.get)
+    monkeypatch.setattr(model_warmup, "OLLAMA_NUM_CTX", "4096")
+    return warmup
+
+
+def test_agent_models(monkeypatch):
+    for var in model_warmup.AGENT_MODEL_VARS:
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("REASONING_AGENT_MODEL", "llama3")
+    monkeypatch.setenv("VERDICT_AGENT_SMALL_MODEL", "phi3")
+    monkeypatch.setenv("CLAIM_DECOMPOSER_MODEL", "gpt-4o-mini")
+
+    # Distinct Ollama models only; unset agents use the default model
+    assert model_warmup.agent_models(extra=["mistral-nemo", "qwq"]) == ["mistral-nemo", "llama3", "phi3", "qwq"]
+
+
+def test_ready_once_warmed_on_one_host(monkeypatch):
+    up, down = FakeClient(), FakeClient(fail=True)
+    warmup = make_warmup(monkeypatch, {"http://a": up, "http://b": down}, ["llama3", "phi3"])
+    assert not warmup.readiness()["ready"]
+
+    asyncio.run(warmup.run())
+
+    readiness = warmup.readiness()
+    assert readiness["ready"]
+    assert up.calls == [("llama3", 4096), ("phi3", 4096)]
+    hosts = readiness["models"]["llama3"]["hosts"]
+    assert hosts["http://a"]["warm"] and hosts["http://a"]["load_seconds"] == 1.5
+    assert not hosts["http://b"]["warm"] and "host down" in hosts["http://b"]["error"]
+
+
+def test_not_ready_until_every_model_warmed(monkeypatch):
+    client = FakeClient(fail=True)
+    warmup = make_warmup(monkeypatch, {"http://a": client}, ["llama3"])
+    asyncio.run(warmup.warm())
+    assert not warmup.readiness()["ready"]
+
+    # The next keep-alive round retries the warmup
+    client.fail = False
+    asyncio.run(warmup.ping())
+    assert warmup.readiness()["ready"]
+
+
+def test_ping_keeps_loaded_models_only(monkeypatch):
+    client = FakeClient()
+    warmup = make_warmup(monkeypatch, {"http://a": client}, ["llama3", "phi3"])
+    asyncio.run(warmup.warm())
+    # The host grew llama3's window for a long prompt, and unloaded phi3 for lack of memory
+    client.loaded = {"llama3": 8192}
+    client.calls.clear()
+
+    asyncio.run(warmup.ping())
+
+    assert client.calls == [("llama3", 8192)]
+    hosts = warmup.readiness()["models"]
+    assert hosts["llama3"]["hosts"]["http://a"]["loaded"]
+    assert not hosts["phi3"]["hosts"]["http://a"]["loaded"]
+    # A model that warmed once stays ready
+    assert warmup.readiness()["ready"]
+
+
+def test_full_reasoning_call_fits_the_warmed_window(monkeypatch):
+    import core.agents.reasoning_agent as reasoning_agent
+
+    sizer = ContextSizer()
+    monkeypatch.setattr(model_warmup, "context_sizer", sizer)
+    monkeypatch.setenv("REASONING_AGENT_MODEL", "llama3")
+    client = FakeClient()
+    warmup = make_warmup(monkeypatch, {"http://a": client}, ["llama3"])
+    monkeypatch.setattr(model_warmup, "OLLAMA_NUM_CTX", "auto")
+    asyncio.run(warmup.warm())
+    warmed = sizer.stats()["llama3"]
+
+    # Evidence filling the whole compression budget
+    sentences = " ".join(f"Record {i} lists alpha{i} beta{i} gamma{i} delta{i} and epsilon{i}." for i in range(2000))
+    state = {"claim": "The Eiffel Tower is in Paris", "evidence": [Evidence(name="wikipedia", args={}, result=sentences)]}
+    state.update(reasoning_agent.compression(state))
+    messages = reasoning_agent.preprocessing(state)["messages"]
+    needed = needed_tokens(estimate_message_tokens(messages, format_output=reasoning_agent.LLM_OUTPUT_FORMAT))
+
+    assert client.calls == [("llama3", warmed)]
+    assert sizer.num_ctx("llama3", needed, max(OLLAMA_CTX_BUCKETS)) == warmed
+    assert warmed > min(OLLAMA_CTX_BUCKETS)
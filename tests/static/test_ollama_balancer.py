@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from core.agents.utils import ollama_balancer
+from core.agents.utils.ollama_balancer import BalancedChatOllama, OllamaBalancer
+
+URLS = ["http://ollama-a:11434", "http://ollama-b:11434", "http://ollama-c:11434"]
+
+
+@pytest.fixture
+def balancer():
+    return OllamaBalancer(URLS)
+
+
+def test_prefers_backend_with_model_loaded(balancer):
+    balancer.backends[2].loaded_models["mistral-nemo"] = time.monotonic() + 60
+    assert all(balancer.choose("mistral-nemo") is balancer.backends[2] for _ in range(5))
+
+
+def test_prefers_least_loaded_backend(balancer):
+    balancer.backends[0].in_flight = 2
+    balancer.backends[1].in_flight = 1
+    balancer.backends[2].in_flight = 3
+    assert balancer.choose("mistral-nemo") is balancer.backends[1]
+
+
+def test_saturated_backend_with_model_loses_to_idle_backend(balancer):
+    balancer.backends[0].loaded_models["mistral-nemo"] = time.monotonic() + 60
+    balancer.backends[0].in_flight = 100
+    assert balancer.choose("mistral-nemo") is not balancer.backends[0]
+
+
+def test_failing_backend_is_ejected(balancer):
+    with pytest.raises(httpx.ConnectError):
+        with balancer.route("mistral-nemo") as backend:
+            raise httpx.ConnectError("refused")
+    assert backend.in_flight == 0
+    assert backend.failures == 1
+    assert all(balancer.choose("mistral-nemo") is not backend for _ in range(5))
+
+
+def test_request_errors_do_not_eject(balancer):
+    with pytest.raises(ValueError):
+        with balancer.route("mistral-nemo") as backend:
+            raise ValueError("bad request")
+    assert not backend.is_ejected(time.monotonic())
+
+
+def test_successful_call_marks_model_loaded(balancer):
+    with balancer.route("mistral-nemo") as backend:
+        pass
+    assert backend.has_model("mistral-nemo", time.monotonic())
+    assert balancer.choose("mistral-nemo") is backend
+
+
+def test_all_ejected_falls_back_to_longest_ejected(balancer):
+    now = time.monotonic()
+    for offset, backend in zip([30, 10, 20], balancer.backends):
+        backend.ejected_until = now + offset
+    assert balancer.choose("mistral-nemo") is balancer.backends[1]
+    assert balancer.choose("mistral-nemo", exclude=tuple(balancer.backends)) is None
+
+
+def test_calls_waiting_for_their_model_are_not_load(balancer, monkeypatch):
+    monkeypatch.setattr(ollama_balancer, "OLLAMA_MODEL_AFFINITY", True)
+    loaded = balancer.backends[0]
+    loaded.loaded_models["mistral-nemo"] = time.monotonic() + 60
+
+    # Routed calls queued in the host's model scheduler keep the host with the model first
+    with balancer.route("mistral-nemo") as first, balancer.route("mistral-nemo") as second:
+        assert first is second is loaded
+        assert loaded.in_flight == 0
+        assert balancer.choose("mistral-nemo") is loaded
+        # Once admitted, a call counts
+        with balancer.running(loaded):
+            assert loaded.in_flight == 1
+    assert loaded.in_flight == 0
+
+
+def test_admitted_calls_count_against_the_host(monkeypatch):
+    monkeypatch.setattr(ollama_balancer, "OLLAMA_MODEL_AFFINITY", True)
+    llm = BalancedChatOllama(model="mistral-nemo", base_urls=["http://ollama-slot:11434"])
+    backend = llm.balancer.backends[0]
+
+    async def run():
+        async with llm._amodel_slot(backend) as call:
+            assert backend.in_flight == 1
+            assert backend.scheduler.stats()["running"] == 1
+            call["response"] = {"done": True}
+
+    asyncio.run(run())
+    with llm._model_slot(backend):
+        assert backend.in_flight == 1
+    assert backend.in_flight == 0
@@ -0,0 +1,149 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core import processing
+from core.agents.utils.common_types import Evidence
+
+
+class FakeResearch:
+    """
+    Stands in for research_claim, taking `delays[claim]` seconds per claim.
+    """
+
+    def __init__(self, delays: dict, fail: str = None, termination_reasons: dict = None):
+        self.delays = delays
+        self.fail = fail
+        self.termination_reasons = termination_reasons or {}
+        self.running = 0
+        self.max_running = 0
+        self.cancelled = []
+
+    async def __call__(self, claim: str, research_agent, on_evidence) -> dict:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delays[claim])
+            if claim == self.fail:
+                raise RuntimeError("research failed")
+            evidence = [Evidence(name="wikipedia", args={"query_str": claim}, result=f"page {claim}")]
+            await on_evidence(evidence[0])
+            return {"claim": claim, "evidence": evidence,
+                    "termination_reason": self.termination_reasons.get(claim, "complete")}
+        except asyncio.CancelledError:
+            self.cancelled.append(claim)
+            raise
+        finally:
+            self.running -= 1
+
+
+def async_agent(func):
+    async def ainvoke(state, config=None):
+        return func(state)
+    return SimpleNamespace(ainvoke=ainvoke)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """
+    Stubs every agent of the pipeline, returning a function that sets the claims and the
+    fake research step.
+    """
+    monkeypatch.setattr(processing, "get_research_agent", lambda **kwargs: object())
+    monkeypatch.setattr(processing, "get_cached_verdict", lambda *args: None)
+    monkeypatch.setattr(processing, "cache_verdict", lambda *args: None)
+    monkeypatch.setattr(processing, "reasoning_agent", async_agent(
+        lambda state: {"label": "unknown" if "unsure" in state["claim"] else "true",
+                       "justification": f"about {state['claim']}", "messages": [],
+                       "evidence_audit": [{"name": "wikipedia", "reason": "sentences"}]}))
+    monkeypatch.setattr(processing, "verdict_agent", async_agent(
+        lambda state: {"final_label": "true", "final_justification": " / ".join(state["claims"]), "messages": []}))
+
+    def setup(claims: list[str], research: FakeResearch):
+        monkeypatch.setattr(processing, "claim_decomposer", async_agent(lambda state: {"claims": claims}))
+        monkeypatch.setattr(processing, "research_claim", research)
+
+    return setup
+
+
+def test_analyses_keep_claim_order(pipeline):
+    claims = ["slow claim", "fast claim", "middle claim"]
+    pipeline(claims, FakeResearch({"slow claim": 0.06, "fast claim": 0.0, "middle claim": 0.03}))
+
+    async def run():
+        return [event async for event in processing.stream_query("text", ["wikipedia"])]
+
+    events = asyncio.run(run())
+
+    # Analyses stream as claims finish, but the verdict lists them in claim order
+    streamed = [event["data"]["index"] for event in events if event["event"] == "analysis"]
+    assert streamed == [1, 2, 0]
+    verdict = events[-1]
+    assert verdict["event"] == "verdict"
+    assert [analysis["claim"] for analysis in verdict["data"]["analyses"]] == claims
+    assert verdict["data"]["final_justification"] == "slow claim / fast claim / middle claim"
+
+
+def test_max_concurrency_is_respected(pipeline):
+    claims = [f"claim {i}" for i in range(6)]
+    research = FakeResearch({claim: 0.02 for claim in claims})
+    pipeline(claims, research)
+
+    result = asyncio.run(processing.process_query("text", ["wikipedia"], max_concurrency=2))
+
+    assert research.max_running == 2
+    assert len(result["analyses"]) == 6
+
+
+def test_failed_claim_cancels_the_others(pipeline):
+    claims = ["bad claim", "long claim", "other long claim"]
+    research = FakeResearch({"bad claim": 0.01, "long claim": 5, "other long claim": 5}, fail="bad claim")
+    pipeline(claims, research)
+
+    with pytest.raises(RuntimeError, match="research failed"):
+        asyncio.run(processing.process_query("text", ["wikipedia"]))
+
+    assert sorted(research.cancelled) == ["long claim", "other long claim"]
+
+
+def test_only_complete_and_settled_verdicts_are_cached(pipeline, monkeypatch):
+    claims = ["settled claim", "unsure claim", "cut short claim"]
+    pipeline(claims, FakeResearch({claim: 0.0 for claim in claims},
+                                  termination_reasons={"cut short claim": "max_rounds"}))
+    cached = []
+    monkeypatch.setattr(processing, "cache_verdict", lambda claim, *args: cached.append(claim))
+
+    asyncio.run(processing.process_query("text", ["wikipedia"]))
+
+    assert cached == ["settled claim"]
+
+
+def test_settings_changing_the_answers_are_in_the_cache_key(pipeline, monkeypatch):
+    pipeline(["a claim"], FakeResearch({"a claim": 0.0}))
+    keys = []
+    monkeypatch.setattr(processing, "get_cached_verdict", lambda claim, tools, models: keys.append(models))
+
+    asyncio.run(processing.process_query("text", ["wikipedia"]))
+    monkeypatch.setattr(processing.research_module, "RESEARCH_MODE", "retrieval")
+    monkeypatch.setattr(processing.wikipedia_module, "WIKIPEDIA_MODE", "summary")
+    monkeypatch.setattr(processing.evidence_compression, "EVIDENCE_COMPRESSION", "none")
+    asyncio.run(processing.process_query("text", ["wikipedia"]))
+
+    assert set(keys[0]) == {"research", "reasoning"}
+    assert {key: keys[1][key] for key in ("research_mode", "wikipedia_mode", "evidence_compression")} == \
+        {"research_mode": "retrieval", "wikipedia_mode": "summary", "evidence_compression": "none"}
+
+
+def test_analysis_events_carry_the_evidence_audit(pipeline, monkeypatch):
+    pipeline(["fresh claim", "known claim"], FakeResearch({"fresh claim": 0.0, "known claim": 0.0}))
+    monkeypatch.setattr(processing, "get_cached_verdict", lambda claim, *args: {
+        "label": "true", "justification": "seen before", "evidence": []} if claim == "known claim" else None)
+
+    async def run():
+        return [event async for event in processing.stream_query("text", ["wikipedia"])]
+
+    analyses = {event["data"]["claim"]: event["data"] for event in asyncio.run(run()) if event["event"] == "analysis"}
+
+    assert analyses["fresh claim"]["evidence_audit"] == [{"name": "wikipedia", "reason": "sentences"}]
+    assert analyses["known claim"]["evidence_audit"] == []
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# app.py imports its siblings as top-level modules, like uvicorn running from core/
+sys.path.insert(0, str(Path(__file__).parents[2] / "core"))
+import app as api  # noqa: E402
+
+USER = {"id": 1, "username": "tester", "is_staff": False}
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_user_tools(user_id, tools):
+        return []
+
+    monkeypatch.setattr(api, "get_user_tool_params", no_user_tools)
+    api.app.dependency_overrides[api.get_current_user] = lambda: USER
+    yield TestClient(api.app)
+    api.app.dependency_overrides.clear()
+
+
+def test_events_are_framed_as_sse(client, monkeypatch):
+    async def stream_query(text, builtin_tools, user_tool_kwargs, user_id):
+        yield {"event": "claims", "data": {"claims": [text]}}
+        yield {"event": "analysis", "data": {"index": 0, "cached": False, "claim": text, "label": "true"}}
+        yield {"event": "verdict", "data": {"final_label": "true", "analyses": []}}
+
+    monkeypatch.setattr(api, "stream_query", stream_query)
+
+    response = client.post("/query/stream", json={"body": "The sky is blue", "sources": ["wikipedia"]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert parse_events(response.text) == [
+        ("claims", {"claims": ["The sky is blue"]}),
+        ("analysis", {"index": 0, "cached": False, "claim": "The sky is blue", "label": "true"}),
+        ("verdict", {"final_label": "true", "analyses": []}),
+    ]
+
+
+def test_failure_sends_an_error_event(client, monkeypatch):
+    async def stream_query(text, builtin_tools, user_tool_kwargs, user_id):
+        yield {"event": "claims", "data": {"claims": [text]}}
+        raise RuntimeError("reasoning failed")
+
+    monkeypatch.setattr(api, "stream_query", stream_query)
+
+    response = client.post("/query/stream", json={"body": "The sky is blue", "sources": ["wikipedia"]})
+
+    assert parse_events(response.text) == [
+        ("claims", {"claims": ["The sky is blue"]}),
+        ("error", {"detail": "reasoning failed"}),
+    ]
+
+
+def test_bad_request_is_rejected_before_streaming(client):
+    response = client.post("/query/stream", json={"body": "", "sources": ["wikipedia"]})
+    assert response.status_code == 400
+
+
+def test_disconnect_cancels_the_pipeline(monkeypatch):
+    closed = asyncio.Event()
+
+    async def stream_query(text, builtin_tools, user_tool_kwargs, user_id):
+        try:
+            yield {"event": "claims", "data": {"claims": [text]}}
+            await asyncio.sleep(30)
+            yield {"event": "verdict", "data": {}}
+        finally:
+            closed.set()
+
+    async def parse_query_request(request, user):
+        return "The sky is blue", ["wikipedia"], []
+
+    monkeypatch.setattr(api, "stream_query", stream_query)
+    monkeypatch.setattr(api, "parse_query_request", parse_query_request)
+
+    async def run() -> list[dict]:
+        response = await api.query_stream(request=None, user=USER)
+        first_event = asyncio.Event()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body"):
+                first_event.set()
+
+        async def receive():
+            # The client goes away once it has the first event
+            await first_event.wait()
+            return {"type": "http.disconnect"}
+
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 5)
+        await asyncio.wait_for(closed.wait(), 5)
+        return sent
+
+    sent = asyncio.run(run())
+
+    bodies = b"".join(message.get("body", b"") for message in sent).decode()
+    assert "event: claims" in bodies and "event: verdict" not in bodies
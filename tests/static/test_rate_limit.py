@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.middlewares.rate_limit import (
+    MemoryRateLimitStore,
+    RateLimitMiddleware,
+    SQLiteRateLimitStore,
+    create_rate_limit_store,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRateLimitStore()
+    return SQLiteRateLimitStore(path=str(tmp_path / "rate_limit.sqlite3"))
+
+
+def test_allows_up_to_limit_then_rejects(store):
+    results = [store.hit("key", 3, 60, 0.0 + i) for i in range(4)]
+    assert [allowed for allowed, _, _ in results] == [True, True, True, False]
+    assert [remaining for _, remaining, _ in results[:3]] == [2, 1, 0]
+    assert results[3][2] > 0
+
+
+def test_keys_are_limited_independently(store):
+    assert store.hit("a", 1, 60, 0.0)[0]
+    assert not store.hit("a", 1, 60, 1.0)[0]
+    assert store.hit("b", 1, 60, 1.0)[0]
+
+
+def test_previous_window_is_weighted(store):
+    for i in range(4):
+        store.hit("key", 4, 60, 50.0 + i)
+    # 15s into the next window, 3 of the previous 4 requests still count
+    allowed, remaining, _ = store.hit("key", 4, 60, 75.0)
+    assert allowed and remaining == 0
+    assert not store.hit("key", 4, 60, 76.0)[0]
+    # Two windows later nothing counts any more
+    assert store.hit("key", 4, 60, 200.0) == (True, 3, 0.0)
+
+
+def test_retry_after_points_to_when_a_request_fits(store):
+    for i in range(2):
+        store.hit("key", 2, 60, 0.0 + i)
+    allowed, _, retry_after = store.hit("key", 2, 60, 10.0)
+    assert not allowed
+    assert store.hit("key", 2, 60, 10.0 + retry_after + 0.01)[0]
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    first = SQLiteRateLimitStore(path=path)
+    second = SQLiteRateLimitStore(path=path)
+    assert first.hit("key", 1, 60, 0.0)[0]
+    assert not second.hit("key", 1, 60, 1.0)[0]
+
+
+def test_memory_store_evicts_idle_and_excess_keys():
+    store = MemoryRateLimitStore(max_keys=2)
+    store.hit("a", 5, 60, 0.0)
+    store.hit("b", 5, 60, 1.0)
+    store.hit("c", 5, 60, 2.0)
+    assert len(store) == 2
+    store.hit("d", 5, 60, 500.0)
+    assert len(store) == 1
+
+
+def test_create_rate_limit_store_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        create_rate_limit_store("redis")
+
+
+def test_sqlite_store_hits_run_off_the_event_loop(tmp_path):
+    class RecordingStore(SQLiteRateLimitStore):
+        def hit(self, *args):
+            threads.append(threading.current_thread())
+            return super().hit(*args)
+
+    threads = []
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=1,
+                       store=RecordingStore(path=str(tmp_path / "rate_limit.sqlite3")))
+
+    @app.post("/query")
+    async def query():
+        loop_threads.append(threading.current_thread())
+        return {}
+
+    loop_threads = []
+    client = TestClient(app)
+    assert client.post("/query", headers={"X-API-Key": "k"}).status_code == 200
+    assert client.post("/query", headers={"X-API-Key": "k"}).status_code == 429
+    assert len(threads) == 2 and loop_threads[0] not in threads
@@ -0,0 +1,11 @@
+import core.agents.reasoning_agent as reasoning_agent
+
+
+def test_prefix_layout_keeps_system_prompt_identical(monkeypatch):
+    monkeypatch.setattr(reasoning_agent, "REASONING_PROMPT_LAYOUT", "prefix")
+    first = reasoning_agent.preprocessing({"claim": "Claim one", "evidence": [{"name": "wikipedia", "result": "r1"}]})
+    second = reasoning_agent.preprocessing({"claim": "Claim two", "evidence": []})
+
+    assert first["messages"][0].content == second["messages"][0].content == reasoning_agent.static_system_prompt
+    assert "{evidence}" not in reasoning_agent.static_system_prompt
+    assert first["messages"][1].content == "## EVIDENCE:\n* wikipedia: r1\n\nClaim: Claim one"
@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import time
+import unittest.mock
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+import core.agents.research_agent as research_agent
+
+
+def make_agent(monkeypatch, responses, tool_calls_log: list):
+    def search(query: str) -> str:
+        tool_calls_log.append(query)
+        return f"results for {query}"
+
+    tool = StructuredTool.from_function(func=search, name="search", description="Search")
+    llm = unittest.mock.MagicMock()
+    llm.bind_tools.return_value = llm
+    responses = iter(responses)
+    llm.invoke.side_effect = lambda messages: next(responses)
+    llm.ainvoke = unittest.mock.AsyncMock(side_effect=lambda messages: next(responses))
+    monkeypatch.setattr(research_agent, "get_chat_model", lambda model_name: llm)
+    monkeypatch.setattr(research_agent, "import_builtin", lambda module: tool)
+    return research_agent.create_agent(model="mistral-nemo", builtin_tools=["search"], user_tool_kwargs=[])
+
+
+def search_call(query: str, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": query}, "id": call_id}])
+
+
+def test_finished_research_is_complete(monkeypatch):
+    calls = []
+    agent = make_agent(monkeypatch, [search_call("a", "1"), AIMessage(content="done")], calls)
+
+    state = agent.invoke({"claim": "claim"})
+
+    assert state["termination_reason"] == "complete"
+    assert state["tool_rounds"] == 1
+    assert [ev["result"] for ev in state["evidence"]] == ["results for a"]
+
+
+def test_repeated_calls_are_replayed_and_stop_research(monkeypatch):
+    calls = []
+    agent = make_agent(monkeypatch, [search_call("a", "1"), search_call(" a ", "2")], calls)
+
+    state = agent.invoke({"claim": "claim"})
+
+    assert calls == ["a"]
+    assert state["termination_reason"] == "repeated_calls"
+    assert state["replayed_calls"] == 1
+    replayed = state["messages"][-1]
+    assert replayed.tool_call_id == "2" and replayed.content == "results for a"
+    # The replayed answer is not counted as new evidence
+    assert len(state["evidence"]) == 1
+
+
+def test_max_rounds(monkeypatch):
+    calls = []
+    responses = (search_call(str(i), str(i)) for i in itertools.count())
+    monkeypatch.setattr(research_agent, "RESEARCH_MAX_TOOL_ROUNDS", 3)
+    agent = make_agent(monkeypatch, responses, calls)
+
+    state = asyncio.run(agent.ainvoke({"claim": "claim"}))
+
+    assert state["termination_reason"] == "max_rounds"
+    assert calls == ["0", "1", "2"]
+
+
+def test_time_budget(monkeypatch):
+    calls = []
+    responses = (search_call(str(i), str(i)) for i in itertools.count())
+    monkeypatch.setattr(research_agent, "RESEARCH_TIME_BUDGET", 1e-9)
+    agent = make_agent(monkeypatch, responses, calls)
+
+    state = agent.invoke({"claim": "claim"})
+
+    assert state["termination_reason"] == "time_budget"
+    assert calls == ["0"]
+
+
+def test_time_budget_bounds_the_model_call(monkeypatch):
+    calls = []
+    monkeypatch.setattr(research_agent, "RESEARCH_TIME_BUDGET", 0.2)
+    agent = make_agent(monkeypatch, [search_call("a", "1")], calls)
+    llm = research_agent.get_chat_model("mistral-nemo")
+    responses = iter([search_call("a", "1")])
+
+    async def ainvoke(messages):
+        if calls:
+            # The model hangs after the first round of tool calls
+            await asyncio.sleep(30)
+        return next(responses)
+
+    llm.ainvoke = ainvoke
+    started = time.monotonic()
+
+    state = asyncio.run(agent.ainvoke({"claim": "claim"}))
+
+    assert time.monotonic() - started < 5
+    assert state["termination_reason"] == "time_budget"
+    assert [ev["result"] for ev in state["evidence"]] == ["results for a"]
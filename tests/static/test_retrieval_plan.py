@@ -0,0 +1,56 @@
+import unittest.mock
+
+from langchain_core.tools import StructuredTool
+
+import core.agents.research_agent as research_agent
+from core.agents.utils import retrieval_plan
+
+
+def test_subject_query_finds_the_named_subject():
+    assert retrieval_plan.subject_query("Freddie Mercury's final resting place was a Tower of Silence") == "Freddie Mercury"
+    assert retrieval_plan.subject_query("The Great Wall of China is visible from the Moon") == "Great Wall of China"
+    assert retrieval_plan.subject_query("In 1969, Neil Armstrong walked on the Moon") == "Neil Armstrong"
+    assert retrieval_plan.subject_query("the earth is flat") == "earth flat"
+
+
+def test_search_topic():
+    assert retrieval_plan.search_topic("Tesla stock fell yesterday") == "finance"
+    assert retrieval_plan.search_topic("The senator resigned yesterday") == "news"
+    assert retrieval_plan.search_topic("Water boils at 100 degrees Celsius") == "general"
+
+
+def test_routing_heuristic():
+    tools = {"wikipedia", "web_search", "calculator"}
+    assert not retrieval_plan.needs_tool_routing("Python was created by Guido van Rossum", tools)
+    assert retrieval_plan.needs_tool_routing("GDP grew 3% this year, down from 3.6%", tools)
+    # Without a math tool the plan is still the best we can do
+    assert not retrieval_plan.needs_tool_routing("GDP grew 3% this year", {"web_search"})
+    assert retrieval_plan.needs_tool_routing("Pikachu is yellow", tools, has_user_tools=True)
+    assert retrieval_plan.needs_tool_routing("Pikachu is yellow", {"calculator"})
+
+
+def test_retrieval_mode_skips_the_llm(monkeypatch):
+    def wikipedia(query_str: str) -> str:
+        return f"page {query_str}"
+
+    def web_search(query: str, topic: str) -> list[dict]:
+        return [{"content": f"{topic}: {query}", "source": "s"}]
+
+    tools = {func.__name__: StructuredTool.from_function(func=func, name=func.__name__, description=func.__name__)
+             for func in (wikipedia, web_search)}
+    llm = unittest.mock.MagicMock()
+    llm.bind_tools.return_value = llm
+    monkeypatch.setattr(research_agent, "get_chat_model", lambda model_name: llm)
+    monkeypatch.setattr(research_agent, "import_builtin", tools.get)
+    agent = research_agent.create_agent(model="mistral-nemo", builtin_tools=list(tools),
+                                        user_tool_kwargs=[], mode="retrieval")
+
+    state = agent.invoke({"claim": "Python was created by Guido van Rossum"})
+
+    llm.invoke.assert_not_called()
+    assert state["research_mode"] == "retrieval"
+    assert state["termination_reason"] == "complete"
+    assert [(ev["name"], ev["args"]) for ev in state["evidence"]] == [
+        ("wikipedia", {"query_str": "Python"}),
+        ("web_search", {"query": "Python was created by Guido van Rossum", "topic": "general"}),
+    ]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from core.agents.utils import tokens
+from core.agents.utils.tokens import ContextSizedChatOllama, ContextSizer, context_bucket, estimate_message_tokens
+
+
+def test_context_bucket_picks_smallest_fit_within_limit():
+    buckets = [4096, 8192, 16384]
+    assert context_bucket(300, buckets=buckets) == 4096
+    assert context_bucket(4097, buckets=buckets) == 8192
+    assert context_bucket(50000, buckets=buckets) == 16384
+    assert context_bucket(6000, limit=8192, buckets=buckets) == 8192
+    assert context_bucket(50000, limit=8192, buckets=buckets) == 8192
+    assert context_bucket(50000, limit=2048, buckets=buckets) == 2048
+
+
+def test_estimate_counts_messages_and_schemas():
+    messages = [SystemMessage(content="x" * 400), HumanMessage(content="y" * 40)]
+    base = estimate_message_tokens(messages)
+    assert base == 100 + 10 + 2 * tokens.MESSAGE_OVERHEAD_TOKENS
+    assert estimate_message_tokens(messages, format_output={"type": "object"}) > base
+
+
+def test_sizer_keeps_loaded_bucket_until_model_unloads(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tokens.time, "monotonic", lambda: now[0])
+    sizer = ContextSizer([4096, 8192, 32768], keep_alive=300)
+
+    assert sizer.num_ctx("model", 1000) == 4096
+    assert sizer.num_ctx("model", 9000) == 32768
+    # Smaller prompts stay on the loaded bucket instead of forcing a reload
+    assert sizer.num_ctx("model", 1000) == 32768
+    assert sizer.num_ctx("other", 1000) == 4096
+
+    now[0] += 301
+    assert sizer.num_ctx("model", 1000) == 4096
+    assert sizer.stats() == {"model": 4096}
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def _response(self, params):
+        self.calls.append(params)
+        return {"model": params["model"], "done": True, "message": {"role": "assistant", "content": "ok"},
+                "prompt_eval_count": 12, "eval_count": 3}
+
+    def chat(self, **params):
+        return self._response(params)
+
+
+class FakeAsyncClient(FakeClient):
+    async def chat(self, **params):
+        return self._response(params)
+
+
+@pytest.fixture
+def sized_llm(monkeypatch):
+    monkeypatch.setattr(tokens, "context_sizer", ContextSizer([4096, 8192, 128000]))
+    llm = ContextSizedChatOllama(model="mistral-nemo", num_ctx=128000, context_buckets=[4096, 8192, 128000],
+                                 disable_streaming=True)
+    llm._client, llm._async_client = FakeClient(), FakeAsyncClient()
+    return llm
+
+
+def test_calls_get_sized_context_and_log_usage(sized_llm, capsys):
+    sized_llm.invoke("short prompt", stream=False)
+    asyncio.run(sized_llm.ainvoke([HumanMessage(content="z" * 20000)], stream=False))
+
+    assert sized_llm._client.calls[0]["options"].num_ctx == 4096
+    assert sized_llm._async_client.calls[0]["options"].num_ctx == 8192
+    assert "LLM call mistral-nemo: 12 prompt tokens (~" in capsys.readouterr().out
+
+
+def test_fixed_context_without_buckets(sized_llm):
+    fixed = sized_llm.model_copy(update={"context_buckets": None})
+    fixed._client = sized_llm._client
+    fixed.invoke("short prompt", stream=False)
+    assert fixed._client.calls[-1]["options"].num_ctx == 128000
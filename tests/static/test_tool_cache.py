@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+from langchain_core.tools import tool
+
+from core.agents.tools import tool_cache
+from core.agents.tools.builtins import web_search, wikipedia as wikipedia_tool
+
+
+def make_tool(results: dict, policy):
+    calls = []
+
+    @tool("lookup")
+    def lookup(query: str) -> str:
+        """Looks something up."""
+        calls.append(query)
+        return results[query]
+
+    async def alookup(query: str) -> str:
+        calls.append(query)
+        return results[query]
+
+    lookup.coroutine = alookup
+    return tool_cache.cache_tool_results(lookup, policy), calls
+
+
+def test_results_are_reused_across_calls_and_sync_async():
+    lookup, calls = make_tool({"Eiffel Tower": "324 m"}, lambda args, result: 60)
+
+    assert lookup.invoke({"query": "Eiffel Tower"}) == "324 m"
+    assert lookup.invoke({"query": "Eiffel  Tower "}) == "324 m"
+    assert asyncio.run(lookup.ainvoke({"query": "Eiffel Tower"})) == "324 m"
+    assert calls == ["Eiffel Tower"]
+    assert tool_cache.tool_cache.stats()["hits"] == 2
+
+
+def test_async_calls_use_the_cache_off_the_event_loop(monkeypatch):
+    lookup, calls = make_tool({"Eiffel Tower": "324 m"}, lambda args, result: 60)
+    cache = tool_cache.tool_cache
+    threads = []
+
+    class RecordingCache:
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return cache.get(key)
+
+        def set(self, key, value, ttl=None):
+            threads.append(threading.get_ident())
+            cache.set(key, value, ttl=ttl)
+
+    monkeypatch.setattr(tool_cache, "tool_cache", RecordingCache())
+
+    async def run():
+        loop_thread = threading.get_ident()
+        results = [await lookup.ainvoke({"query": "Eiffel Tower"}) for _ in range(2)]
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(run())
+
+    assert results == ["324 m", "324 m"] and calls == ["Eiffel Tower"]
+    # get, set, then get again, none of them on the loop's thread
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+def test_policy_decides_what_is_kept():
+    results = {"ok": "fine", "missing": "No page found for missing!", "broken": "Could not search"}
+    ttls = {"fine": 60, "No page found for missing!": 1e-9, "Could not search": None}
+    lookup, calls = make_tool(results, lambda args, result: ttls[result])
+
+    for _ in range(2):
+        for query in results:
+            lookup.invoke({"query": query})
+
+    # Only the positive result outlived its first call
+    assert calls == ["ok", "missing", "broken", "missing", "broken"]
+
+
+def test_purge_by_tool():
+    lookup, calls = make_tool({"a": "1"}, lambda args, result: 60)
+    lookup.invoke({"query": "a"})
+
+    assert tool_cache.purge_tool_results("other") == 0
+    assert tool_cache.purge_tool_results("lookup") == 1
+    lookup.invoke({"query": "a"})
+    assert calls == ["a", "a"]
+
+
+def test_builtin_policies():
+    assert wikipedia_tool.cache_ttl({}, "No page found for Xyzzy!") == tool_cache.TOOL_CACHE_NEGATIVE_TTL
+    assert wikipedia_tool.cache_ttl({}, "Could not fetch page title X from Wikipedia!") is None
+    assert wikipedia_tool.cache_ttl({}, "[X]\nText") == wikipedia_tool.WIKIPEDIA_CACHE_TTL
+
+    results = [{"content": "c", "source": "s"}]
+    assert web_search.cache_ttl({"topic": "news"}, results) == web_search.WEB_SEARCH_NEWS_CACHE_TTL
+    assert web_search.cache_ttl({"topic": "general"}, results) == web_search.WEB_SEARCH_CACHE_TTL
+    assert web_search.cache_ttl({"topic": "general"}, []) is None
+
+
+def test_wikipedia_settings_are_part_of_the_key(monkeypatch):
+    key = tool_cache.tool_cache_key("wikipedia", {"query_str": "Pikachu"}, wikipedia_tool.cache_variant())
+    monkeypatch.setattr(wikipedia_tool, "WIKIPEDIA_MODE", "passages")
+    assert key != tool_cache.tool_cache_key("wikipedia", {"query_str": "pikachu"}, wikipedia_tool.cache_variant())
@@ -0,0 +1,128 @@
+import asyncio
+import contextvars
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+
+from core.agents.utils.tool_memo import ToolCallMemo, tool_call_key, use_tool_call_memo
+from core.agents.utils.tool_node import ConcurrentToolNode
+
+
+def counting_tool(name: str, delay: float = 0.1, fail: bool = False):
+    calls = []
+
+    def func(query: str) -> str:
+        calls.append(query)
+        time.sleep(delay)
+        if fail:
+            raise ValueError("upstream failed")
+        return f"{name}: {query}"
+
+    async def coroutine(query: str) -> str:
+        calls.append(query)
+        await asyncio.sleep(delay)
+        if fail:
+            raise ValueError("upstream failed")
+        return f"{name}: {query}"
+
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=name, description=name), calls
+
+
+def state(name: str, query: str, call_id: str) -> dict:
+    return {"messages": [AIMessage(content="", tool_calls=[{"name": name, "args": {"query": query}, "id": call_id}])]}
+
+
+def test_key_canonicalizes_args():
+    assert tool_call_key({"name": "wikipedia", "args": {"query_str": " Eiffel  Tower"}, "id": "1"}) == \
+        tool_call_key({"name": "wikipedia", "args": {"query_str": "eiffel tower"}, "id": "2"})
+    # Custom tools keep case, their APIs may care
+    assert tool_call_key({"name": "pokeapi", "args": {"name": "Pikachu"}, "id": "1"}) != \
+        tool_call_key({"name": "pokeapi", "args": {"name": "pikachu"}, "id": "2"})
+
+
+def test_claims_of_one_request_share_calls():
+    tool, calls = counting_tool("wikipedia")
+    node = ConcurrentToolNode([tool])
+    memo = ToolCallMemo()
+
+    async def claim(query: str, call_id: str):
+        use_tool_call_memo(memo)
+        return await node.ainvoke(state("wikipedia", query, call_id))
+
+    async def request():
+        concurrent = await asyncio.gather(claim("Eiffel Tower", "a"), claim("eiffel tower", "b"))
+        later = await asyncio.create_task(claim("Eiffel Tower ", "c"))
+        return [*concurrent, later]
+
+    results = asyncio.run(request())
+
+    assert calls == ["Eiffel Tower"]
+    assert [r["messages"][0].tool_call_id for r in results] == ["a", "b", "c"]
+    assert {r["messages"][0].content for r in results} == {"wikipedia: Eiffel Tower"}
+    assert memo.stats == {"calls": 3, "reused": 1, "coalesced": 1}
+
+
+def test_failed_calls_are_not_reused():
+    tool, calls = counting_tool("web_search", delay=0, fail=True)
+    node = ConcurrentToolNode([tool])
+    memo = ToolCallMemo()
+
+    async def claim(call_id: str):
+        use_tool_call_memo(memo)
+        return await node.ainvoke(state("web_search", "q", call_id))
+
+    async def request():
+        return [await asyncio.create_task(claim(call_id)) for call_id in ("a", "b")]
+
+    results = asyncio.run(request())
+    assert len(calls) == 2
+    assert all(r["messages"][0].status == "error" for r in results)
+
+
+def test_cancelled_waiter_leaves_the_others_alone():
+    memo = ToolCallMemo()
+    call = {"name": "wikipedia", "args": {"query": "Paris"}, "id": "a"}
+
+    async def run_call():
+        await asyncio.sleep(0.05)
+        return ToolMessage(content="wikipedia: Paris", tool_call_id="a")
+
+    async def request():
+        owner = asyncio.create_task(memo.arun(call, run_call))
+        await asyncio.sleep(0)
+        impatient = asyncio.create_task(asyncio.wait_for(memo.arun({**call, "id": "b"}, run_call), 0.01))
+        patient = asyncio.create_task(memo.arun({**call, "id": "c"}, run_call))
+        return await asyncio.gather(owner, impatient, patient, return_exceptions=True)
+
+    owner, impatient, patient = asyncio.run(request())
+
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert owner.content == patient.content == "wikipedia: Paris"
+    assert patient.tool_call_id == "c"
+    assert memo.stats == {"calls": 3, "reused": 0, "coalesced": 2}
+
+
+def test_sync_path_uses_memo():
+    tool, calls = counting_tool("wikipedia", delay=0)
+    node = ConcurrentToolNode([tool])
+    memo = ToolCallMemo()
+
+    def claim(call_id: str):
+        use_tool_call_memo(memo)
+        return node.invoke(state("wikipedia", "Paris", call_id))
+
+    first = contextvars.copy_context().run(claim, "a")
+    second = contextvars.copy_context().run(claim, "b")
+
+    assert calls == ["Paris"]
+    assert second["messages"][0].tool_call_id == "b"
+    assert second["messages"][0].content == first["messages"][0].content
+
+
+def test_no_memo_outside_requests():
+    tool, calls = counting_tool("wikipedia", delay=0)
+    node = ConcurrentToolNode([tool])
+    node.invoke(state("wikipedia", "Paris", "a"))
+    node.invoke(state("wikipedia", "Paris", "b"))
+    assert len(calls) == 2
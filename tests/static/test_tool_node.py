@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from core.agents.utils.tool_node import ConcurrentToolNode
+
+
+def make_tool(name: str, delay: float) -> StructuredTool:
+    def func(query: str) -> str:
+        time.sleep(delay)
+        return f"{name}: {query}"
+
+    async def coroutine(query: str) -> str:
+        await asyncio.sleep(delay)
+        return f"{name}: {query}"
+
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=name, description=name)
+
+
+def tool_call_state(*names: str) -> dict:
+    tool_calls = [{"name": name, "args": {"query": "q"}, "id": f"call_{i}"} for i, name in enumerate(names)]
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def test_async_calls_run_concurrently_and_keep_order():
+    node = ConcurrentToolNode([make_tool("slow", 0.3), make_tool("fast", 0.05), make_tool("medium", 0.2)])
+    start = time.perf_counter()
+    result = asyncio.run(node.ainvoke(tool_call_state("slow", "fast", "medium")))
+    elapsed = time.perf_counter() - start
+
+    assert [message.content for message in result["messages"]] == ["slow: q", "fast: q", "medium: q"]
+    assert elapsed < 0.45
+
+
+def test_sync_calls_run_concurrently_and_keep_order():
+    node = ConcurrentToolNode([make_tool("slow", 0.3), make_tool("fast", 0.05)])
+    start = time.perf_counter()
+    result = node.invoke(tool_call_state("slow", "fast"))
+    elapsed = time.perf_counter() - start
+
+    assert [message.tool_call_id for message in result["messages"]] == ["call_0", "call_1"]
+    assert elapsed < 0.45
+
+
+def test_slow_call_times_out_without_failing_the_step():
+    node = ConcurrentToolNode([make_tool("hangs", 1), make_tool("fast", 0)], timeout=0.1)
+    for result in [asyncio.run(node.ainvoke(tool_call_state("hangs", "fast"))),
+                   node.invoke(tool_call_state("hangs", "fast"))]:
+        timed_out, answered = result["messages"]
+        assert timed_out.status == "error"
+        assert "did not respond" in timed_out.content
+        assert answered.content == "fast: q"
@@ -15,7 +15,7 @@ def test_create_tool_handles_non_json_response(monkeypatch):
     def mock_request(*args, **kwargs):
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     my_tool = create_tool(
         name="non_json_tool",
@@ -39,7 +39,7 @@ def test_create_tool_basic_get(monkeypatch):
         assert url == "https://api.com/item/42"
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="basic_get_tool",
@@ -61,7 +61,7 @@ def test_create_tool_with_default_params(monkeypatch):
         assert params == {"q": "news"}
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="default_params_tool",
@@ -84,7 +84,7 @@ def test_create_tool_merges_headers(monkeypatch):
         assert headers["x_test"] == "override"
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="merge_headers_tool",
@@ -106,7 +106,7 @@ def test_create_tool_with_target_fields(monkeypatch):
     def mock_request(*args, **kwargs):
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="target_fields_tool",
@@ -128,7 +128,7 @@ def test_create_tool_with_multiple_target_fields(monkeypatch):
     def mock_request(*args, **kwargs):
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="multiple_target_fields_tool",
@@ -152,7 +152,7 @@ def test_create_tool_with_post_and_json_payload(monkeypatch):
         assert json == {"name": "test"}
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="post_json_tool",
@@ -174,7 +174,7 @@ def test_create_tool_custom_signature(monkeypatch):
         assert params == {"query": "climate"}
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="custom_signature_tool",
@@ -198,7 +198,7 @@ def test_create_tool_returns_full_response(monkeypatch):
     def mock_request(*args, **kwargs):
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="full_response_tool",
@@ -228,7 +228,7 @@ def test_create_tool_with_json_and_data_conflict(monkeypatch):
         assert data == {}
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="json_vs_data_tool",
@@ -249,7 +249,7 @@ def test_create_tool_with_nested_json_path(monkeypatch):
     def mock_request(*args, **kwargs):
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     tool = create_tool(
         name="nested_json_tool",
@@ -335,7 +335,7 @@ def test_create_tool_with_data_payload(monkeypatch):
         assert data == {"foo": "bar"}
         return MockResponse()
 
-    monkeypatch.setattr("requests.request", mock_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", mock_request)
 
     param_mapping = {
         "foo": {"type": "str", "for": "data"},
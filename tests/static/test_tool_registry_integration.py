@@ -37,7 +37,7 @@ def _deserialize_tool_result(result_str: str | Any) -> Any:
 
 @pytest.fixture
 def capture_requests(monkeypatch):  # noqa: D401 – pytest fixture
-    """Capture arguments to *requests.request* and allow the test body to inspect them."""
+    """Capture arguments to *http_client.request_sync* and allow the test body to inspect them."""
 
     captured: Dict[str, Any] = {}
 
@@ -46,7 +46,7 @@ def capture_requests(monkeypatch):  # noqa: D401 – pytest fixture
         # Echo the JSON payload back so the test can assert on it if required.
         return _MockHTTPResponse(kwargs.get("json", {"ok": True}))
 
-    monkeypatch.setattr("requests.request", _fake_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", _fake_request)
     return captured
 
 
@@ -129,7 +129,7 @@ def test_multiple_user_tools_register_and_execute_sequentially(monkeypatch):
     def _fake_request(*_args, **_kwargs):
         return _MockHTTPResponse({"field1": "value‑one", "field2": "value‑two"})
 
-    monkeypatch.setattr("requests.request", _fake_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", _fake_request)
 
     def _tool(name: str, field: str):
         kw = {
@@ -174,7 +174,7 @@ def test_agent_list_index_extract_fields(monkeypatch):
     def _fake_request(*_args, **_kwargs):
         return _MockHTTPResponse([{"value": "alpha"}, {"value": "bravo"}])
 
-    monkeypatch.setattr("requests.request", _fake_request)
+    monkeypatch.setattr("core.agents.tools.http_client.request_sync", _fake_request)
 
     tool_def = {
         "name": "list_tool",
@@ -213,7 +213,7 @@ def test_agent_object_attribute_extract_fields(monkeypatch):
             self.answer = 42
 
     monkeypatch.setattr(
-        "requests.request", lambda *_a, **_kw: _MockHTTPResponse(_Obj())
+        "core.agents.tools.http_client.request_sync", lambda *_a, **_kw: _MockHTTPResponse(_Obj())
     )
 
     tool_def = {
@@ -0,0 +1,45 @@
+import pytest
+
+from core import verdict_cache
+from core.cache import TTLCache
+
+MODELS = {"research": "mistral-nemo", "reasoning": "mistral-nemo"}
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(verdict_cache, "verdict_cache", TTLCache(max_size=10, ttl=60))
+    monkeypatch.setattr(verdict_cache, "VERDICT_CACHE_ENABLED", True)
+
+
+def test_normalize_claim_ignores_case_spacing_and_trailing_punctuation():
+    assert verdict_cache.normalize_claim("  The Earth   is ROUND. ") == "the earth is round"
+    assert verdict_cache.normalize_claim("The earth is round!") == "the earth is round"
+
+
+def test_key_depends_on_tools_and_models_but_not_tool_order():
+    key = verdict_cache.verdict_cache_key("claim", ["wikipedia", "calculator"], MODELS)
+    assert key == verdict_cache.verdict_cache_key("Claim.", ["calculator", "wikipedia"], MODELS)
+    assert key != verdict_cache.verdict_cache_key("claim", ["wikipedia"], MODELS)
+    assert key != verdict_cache.verdict_cache_key("claim", ["wikipedia", "calculator"],
+                                                  {**MODELS, "reasoning": "llama3"})
+
+
+def test_round_trip_and_purge():
+    evidence = [{"name": "wikipedia", "args": {"query": "earth"}, "result": "round"}]
+    verdict_cache.cache_verdict("Earth is round", ["wikipedia"], MODELS, evidence, "true", "because")
+    verdict_cache.cache_verdict("Earth is round", ["web_search"], MODELS, evidence, "true", "because")
+    verdict_cache.cache_verdict("Sky is green", ["wikipedia"], MODELS, [], "false", "it is blue")
+
+    cached = verdict_cache.get_cached_verdict("earth is round.", ["wikipedia"], MODELS)
+    assert cached == {"evidence": evidence, "label": "true", "justification": "because"}
+
+    assert verdict_cache.purge_verdicts("Earth is round") == 2
+    assert verdict_cache.get_cached_verdict("Earth is round", ["wikipedia"], MODELS) is None
+    assert verdict_cache.purge_verdicts() == 1
+
+
+def test_disabled_cache_is_bypassed(monkeypatch):
+    monkeypatch.setattr(verdict_cache, "VERDICT_CACHE_ENABLED", False)
+    verdict_cache.cache_verdict("claim", [], MODELS, [], "true", "")
+    assert verdict_cache.get_cached_verdict("claim", [], MODELS) is None
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from core.agents.tools.builtins import wikipedia as wikipedia_tool
+
+CONTENT = """Pikachu is a Pokémon species. It is an electric type.
+It was designed by Atsuko Nishida.
+
+
+== Design ==
+Pikachu are small rodent-like creatures. Their cheeks store electricity.
+
+
+=== Color ===
+Yellow fur with brown stripes.
+
+
+== Reception ==
+Pikachu is regarded as a cultural icon. """ + "It is very popular. " * 80 + """
+
+
+== References ==
+Pikachu electricity cheeks 2020."""
+
+
+def test_split_passages_tracks_sections_and_skips_references():
+    passages = wikipedia_tool.split_passages("Pikachu", CONTENT)
+
+    sections = [section for section, _ in passages]
+    assert sections[:4] == ["Pikachu", "Pikachu", "Design", "Design > Color"]
+    assert "References" not in sections
+    assert all(len(text) <= wikipedia_tool.WIKIPEDIA_PASSAGE_CHARS for _, text in passages)
+
+
+def test_select_passages_keeps_lead_and_best_match_within_budget():
+    excerpt = wikipedia_tool.select_passages("electricity cheeks", "Pikachu", CONTENT, top_k=2, char_budget=300)
+
+    assert excerpt.startswith("[Pikachu]\nPikachu is a Pokémon species.")
+    assert "[Design]\nPikachu are small rodent-like creatures." in excerpt
+    assert "Reception" not in excerpt
+    assert len(excerpt) < 300
+
+
+def test_tool_returns_passages_or_full_page(monkeypatch):
+    page = SimpleNamespace(title="Pikachu", content=CONTENT)
+    monkeypatch.setattr(wikipedia_tool.wikipedia, "search", lambda *args, **kwargs: (["Pikachu"], None))
+    monkeypatch.setattr(wikipedia_tool.wikipedia, "page", lambda *args, **kwargs: page)
+
+    # The whole article by default
+    assert wikipedia_tool.tool_function.invoke({"query_str": "Pikachu"}) == CONTENT
+
+    monkeypatch.setattr(wikipedia_tool, "WIKIPEDIA_MODE", "passages")
+    passages = wikipedia_tool.tool_function.invoke({"query_str": "Pikachu design"})
+    assert len(passages) <= wikipedia_tool.WIKIPEDIA_CHAR_BUDGET + 100
+    assert "[Design]" in passages